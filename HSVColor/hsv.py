@@ -1,10 +1,55 @@
+import threading
 import cv2
 import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, QSlider, QPushButton, QFileDialog, QWidget, QSpinBox
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage
+from hsv_range import HSVHistogram, MaskRenderer, load_preset, save_preset, suggest_range
+
+
+class MaskPreviewWorker(QThread):
+    """
+    Computes mask previews off the GUI thread.
+
+    Only the newest request is kept: if the sliders move while a preview is being
+    computed, all requests in between are dropped and the worker continues with
+    the latest one.
+    """
+    result_ready = pyqtSignal(int, object)
+
+    def __init__(self):
+        super().__init__()
+        self._condition = threading.Condition()
+        self._request = None
+        self._running = True
+
+    def submit(self, request_id, bgr, hsv, lower, upper):
+        with self._condition:
+            self._request = (request_id, bgr, hsv, lower, upper)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._request is None and self._running:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                request_id, bgr, hsv, lower, upper = self._request
+                self._request = None
+
+            # Mask on the small preview image, result directly as RGB for QImage
+            mask = cv2.inRange(hsv, lower, upper)
+            preview = cv2.bitwise_and(bgr, bgr, mask=mask)
+            self.result_ready.emit(request_id, cv2.cvtColor(preview, cv2.COLOR_BGR2RGB))
 
 
 class HSVColorPicker(QMainWindow):
@@ -19,6 +64,15 @@ class HSVColorPicker(QMainWindow):
         self.hsv_image = None
         self.display_image = None
 
+        # Downscaled copies sized to the label, used for the live preview
+        self.preview_image = None
+        self.preview_hsv = None
+        self.preview_size = None
+        self.preview_request = 0
+
+        # Summed-volume table for O(1) range coverage
+        self.histogram = None
+
         # HSV range variables
         self.hue_min = 0
         self.hue_max = 179
@@ -30,6 +84,16 @@ class HSVColorPicker(QMainWindow):
         # Create GUI elements
         self.init_ui()
 
+        # Coalesce slider events: the preview is computed at most once per frame (~60 Hz)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(16)
+        self.preview_timer.timeout.connect(self.update_mask_preview)
+
+        self.preview_worker = MaskPreviewWorker()
+        self.preview_worker.result_ready.connect(self.show_mask_preview)
+        self.preview_worker.start()
+
     def init_ui(self):
         # Main layout
         main_layout = QVBoxLayout()
@@ -37,8 +101,13 @@ class HSVColorPicker(QMainWindow):
         # Image display
         self.image_label = QLabel("No image loaded")
         self.image_label.setAlignment(Qt.AlignCenter)
+        self.image_label.mousePressEvent = self.image_clicked
         main_layout.addWidget(self.image_label)
 
+        # Share of pixels inside the current range
+        self.coverage_label = QLabel("Coverage: -  (click the image to suggest a range)")
+        main_layout.addWidget(self.coverage_label)
+
         # Controls layout
         controls_layout = QVBoxLayout()
 
@@ -48,18 +117,28 @@ class HSVColorPicker(QMainWindow):
         controls_layout.addWidget(load_button)
 
         # HSV sliders
-        self.add_slider(controls_layout, "Hue Min", 0, 179, self.hue_min, self.update_mask_preview)
-        self.add_slider(controls_layout, "Hue Max", 0, 179, self.hue_max, self.update_mask_preview)
-        self.add_slider(controls_layout, "Sat Min", 0, 255, self.sat_min, self.update_mask_preview)
-        self.add_slider(controls_layout, "Sat Max", 0, 255, self.sat_max, self.update_mask_preview)
-        self.add_slider(controls_layout, "Val Min", 0, 255, self.val_min, self.update_mask_preview)
-        self.add_slider(controls_layout, "Val Max", 0, 255, self.val_max, self.update_mask_preview)
+        self.add_slider(controls_layout, "Hue Min", 0, 179, self.hue_min, self.schedule_mask_preview)
+        self.add_slider(controls_layout, "Hue Max", 0, 179, self.hue_max, self.schedule_mask_preview)
+        self.add_slider(controls_layout, "Sat Min", 0, 255, self.sat_min, self.schedule_mask_preview)
+        self.add_slider(controls_layout, "Sat Max", 0, 255, self.sat_max, self.schedule_mask_preview)
+        self.add_slider(controls_layout, "Val Min", 0, 255, self.val_min, self.schedule_mask_preview)
+        self.add_slider(controls_layout, "Val Max", 0, 255, self.val_max, self.schedule_mask_preview)
 
         # Apply mask button
         apply_button = QPushButton("Apply Mask")
         apply_button.clicked.connect(self.apply_mask)
         controls_layout.addWidget(apply_button)
 
+        # Presets for the headless batch mode (hsv_batch.py)
+        preset_layout = QHBoxLayout()
+        save_preset_button = QPushButton("Save Preset")
+        save_preset_button.clicked.connect(self.save_preset)
+        preset_layout.addWidget(save_preset_button)
+        load_preset_button = QPushButton("Load Preset")
+        load_preset_button.clicked.connect(self.load_preset)
+        preset_layout.addWidget(load_preset_button)
+        controls_layout.addLayout(preset_layout)
+
         # Add controls to main layout
         main_layout.addLayout(controls_layout)
 
@@ -117,6 +196,9 @@ class HSVColorPicker(QMainWindow):
             if self.original_image is not None:
                 # Convert to HSV
                 self.hsv_image = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2HSV)
+                self.update_preview_cache()
+                self.histogram = HSVHistogram(self.hsv_image)
+                self.update_coverage()
 
                 # Display original image
                 self.display_image = self.original_image.copy()
@@ -138,45 +220,110 @@ class HSVColorPicker(QMainWindow):
             pixmap = QPixmap.fromImage(q_image)
             self.image_label.setPixmap(pixmap.scaled(self.image_label.width(), self.image_label.height(), Qt.KeepAspectRatio))
 
+    def update_preview_cache(self):
+        # Downscale once to the label size; the HSV conversion happens on the small image
+        self.preview_size = (self.image_label.width(), self.image_label.height())
+        height, width = self.original_image.shape[:2]
+        scale = min(1.0, self.image_label.width() / width, self.image_label.height() / height)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        self.preview_image = cv2.resize(self.original_image, size, interpolation=cv2.INTER_AREA)
+        self.preview_hsv = cv2.cvtColor(self.preview_image, cv2.COLOR_BGR2HSV)
+
+    def current_range(self):
+        lower = np.array([self.hue_min_slider.value(), self.sat_min_slider.value(), self.val_min_slider.value()])
+        upper = np.array([self.hue_max_slider.value(), self.sat_max_slider.value(), self.val_max_slider.value()])
+        return lower, upper
+
+    def schedule_mask_preview(self):
+        # Coverage is a table lookup and can follow every slider tick
+        self.update_coverage()
+        # (Re)start the timer, so a burst of slider events results in one preview
+        self.preview_timer.start()
+
+    def update_coverage(self):
+        if self.histogram is not None:
+            lower, upper = self.current_range()
+            count = self.histogram.count(lower, upper)
+            # Coarse bins count whole bins at the box edges: an upper bound
+            bound = "" if self.histogram.exact else "\u2264 "
+            self.coverage_label.setText(
+                f"Coverage: {bound}{count} px ({bound}{100.0 * count / self.histogram.total:.1f} %)")
+
+    def image_clicked(self, event):
+        # Suggest the tightest range around the clicked colour region
+        pixmap = self.image_label.pixmap()
+        if self.hsv_image is None or pixmap is None or pixmap.isNull():
+            return
+        # The pixmap is centered in the label; map the click to image coordinates
+        x0 = (self.image_label.width() - pixmap.width()) / 2
+        y0 = (self.image_label.height() - pixmap.height()) / 2
+        height, width = self.hsv_image.shape[:2]
+        x = int((event.x() - x0) * width / pixmap.width())
+        y = int((event.y() - y0) * height / pixmap.height())
+        if not (0 <= x < width and 0 <= y < height):
+            return
+
+        (lower, upper), region = suggest_range(self.hsv_image, x, y)
+        for slider, value in zip((self.hue_min_slider, self.sat_min_slider, self.val_min_slider,
+                                  self.hue_max_slider, self.sat_max_slider, self.val_max_slider),
+                                 lower + upper):
+            slider.setValue(value)
+        self.statusBar().showMessage(f"Range suggested from {region} px region at ({x}, {y})")
+
     def update_mask_preview(self):
         if self.hsv_image is not None:
-            # Get current HSV range values
-            lower = np.array([self.hue_min_slider.value(), self.sat_min_slider.value(), self.val_min_slider.value()])
-            upper = np.array([self.hue_max_slider.value(), self.sat_max_slider.value(), self.val_max_slider.value()])
+            # Label was resized: rebuild the preview image
+            if self.preview_size != (self.image_label.width(), self.image_label.height()):
+                self.update_preview_cache()
 
-            # Create mask
-            mask = cv2.inRange(self.hsv_image, lower, upper)
+            # Get current HSV range values
+            lower, upper = self.current_range()
 
-            # Apply mask to original image (standard preview)
-            self.display_image = cv2.bitwise_and(self.original_image, self.original_image, mask=mask)
+            # Mask and preview are computed on the worker thread
+            self.preview_request += 1
+            self.preview_worker.submit(self.preview_request, self.preview_image, self.preview_hsv, lower, upper)
 
-            # Update display
-            self.update_image_display()
+    def show_mask_preview(self, request_id, preview_rgb):
+        # Results of outdated requests are dropped
+        if request_id != self.preview_request:
+            return
+        height, width, channel = preview_rgb.shape
+        q_image = QImage(preview_rgb.data, width, height, 3 * width, QImage.Format_RGB888)
+        self.image_label.setPixmap(QPixmap.fromImage(q_image))
 
     def apply_mask(self):
         if self.hsv_image is not None:
-            # Get current HSV range values
-            lower = np.array([self.hue_min_slider.value(), self.sat_min_slider.value(), self.val_min_slider.value()])
-            upper = np.array([self.hue_max_slider.value(), self.sat_max_slider.value(), self.val_max_slider.value()])
-
-            # Create mask
-            mask = cv2.inRange(self.hsv_image, lower, upper)
+            # Same mask and gray/colour composite as the batch mode
+            lower, upper = self.current_range()
+            _, composite = MaskRenderer(lower, upper).render(self.original_image)
+            self.display_image = composite
 
-            # Convert original image to grayscale
-            gray_image = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2GRAY)
-            gray_image = cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR)
-
-            # Apply color only where mask is active
-            color_parts = cv2.bitwise_and(self.original_image, self.original_image, mask=mask)
-            inverse_mask = cv2.bitwise_not(mask)
-            gray_parts = cv2.bitwise_and(gray_image, gray_image, mask=inverse_mask)
-
-            # Combine grayscale and color parts
-            self.display_image = cv2.add(gray_parts, color_parts)
+            # Previews that are still running are outdated now
+            self.preview_request += 1
 
             # Update display
             self.update_image_display()
 
+    def save_preset(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Preset", "", "HSV Preset (*.json)")
+        if file_path:
+            lower, upper = self.current_range()
+            save_preset(file_path, lower, upper)
+            self.statusBar().showMessage(f"Preset saved to {file_path}")
+
+    def load_preset(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Load Preset", "", "HSV Preset (*.json)")
+        if file_path:
+            lower, upper = load_preset(file_path)
+            for slider, value in zip((self.hue_min_slider, self.sat_min_slider, self.val_min_slider,
+                                      self.hue_max_slider, self.sat_max_slider, self.val_max_slider),
+                                     list(lower) + list(upper)):
+                slider.setValue(int(value))
+
+    def closeEvent(self, event):
+        self.preview_worker.stop()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
     app = QApplication([])
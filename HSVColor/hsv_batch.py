@@ -0,0 +1,173 @@
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from hsv_range import MaskRenderer, load_preset
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+# One renderer per worker process; its buffers are reused for every frame
+_renderer = None
+
+
+def _init_worker(lower, upper):
+    global _renderer
+    cv2.setNumThreads(1)
+    _renderer = MaskRenderer(lower, upper)
+
+
+def _process_image(task):
+    path, output_dir, write_mask, write_composite = task
+    image = cv2.imread(path)
+    if image is None:
+        return path, False
+    mask, composite = _renderer.render(image, composite=write_composite)
+    name = os.path.splitext(os.path.basename(path))[0]
+    if write_mask:
+        cv2.imwrite(os.path.join(output_dir, f"{name}_mask.png"), mask)
+    if write_composite:
+        cv2.imwrite(os.path.join(output_dir, f"{name}_composite.png"), composite)
+    return path, True
+
+
+def _process_frames(frames, write_composite):
+    results = []
+    for frame in frames:
+        mask, composite = _renderer.render(frame, composite=write_composite)
+        # The buffers belong to the renderer; the copies are sent back to the writer
+        results.append((mask.copy(), None if composite is None else composite.copy()))
+    return results
+
+
+def apply_preset_to_directory(preset, input_dir, output_dir, write_mask=True, write_composite=True, workers=None):
+    """
+    Apply an HSV preset to every image of a directory.
+
+    Reading, masking and writing all happen in the worker processes, only
+    file names are sent between processes.
+
+    Args:
+        preset (str): Preset file saved from HSVColorPicker
+        input_dir (str): Directory with images
+        output_dir (str): Output directory for <name>_mask.png / <name>_composite.png
+        write_mask (bool): Write the binary masks
+        write_composite (bool): Write the gray/colour composites
+        workers (int): Number of processes (default: all cores)
+
+    Returns:
+        tuple: (number of images written, frames per second)
+    """
+    lower, upper = load_preset(preset)
+    os.makedirs(output_dir, exist_ok=True)
+    files = sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir)
+                   if f.lower().endswith(IMAGE_EXTENSIONS))
+    tasks = [(path, output_dir, write_mask, write_composite) for path in files]
+
+    start = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(lower, upper)) as pool:
+        for path, ok in pool.map(_process_image, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count())))):
+            if ok:
+                done += 1
+            else:
+                print(f"Error: Could not read {path}")
+    elapsed = time.perf_counter() - start
+    return done, done / elapsed if elapsed > 0 else 0.0
+
+
+def apply_preset_to_video(preset, input_video, output_prefix, write_mask=True, write_composite=True,
+                          workers=None, chunk_size=8):
+    """
+    Apply an HSV preset to every frame of a video.
+
+    Frames are decoded and encoded in this process and masked in the worker
+    processes; the order of the output frames is kept. At most 2 chunks per
+    worker are in flight, so memory doesn't grow with the length of the video.
+
+    Args:
+        preset (str): Preset file saved from HSVColorPicker
+        input_video (str): Input video (file or anything cv2.VideoCapture opens)
+        output_prefix (str): Output videos are <prefix>_mask.avi / <prefix>_composite.avi
+        write_mask (bool): Write the mask video
+        write_composite (bool): Write the composite video
+        workers (int): Number of processes (default: all cores)
+        chunk_size (int): Frames sent to a worker at once
+
+    Returns:
+        tuple: (number of frames, frames per second)
+    """
+    lower, upper = load_preset(preset)
+    cap = cv2.VideoCapture(input_video)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {input_video}")
+        return 0, 0.0
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+    mask_out = cv2.VideoWriter(f"{output_prefix}_mask.avi", fourcc, fps, (width, height), False) if write_mask else None
+    composite_out = cv2.VideoWriter(f"{output_prefix}_composite.avi", fourcc, fps, (width, height)) if write_composite else None
+
+    def write(results):
+        for mask, composite in results:
+            if mask_out is not None:
+                mask_out.write(mask)
+            if composite_out is not None:
+                composite_out.write(composite)
+        return len(results)
+
+    start = time.perf_counter()
+    count = 0
+    workers = workers or os.cpu_count()
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(lower, upper)) as pool:
+        while True:
+            chunk = []
+            while len(chunk) < chunk_size:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                chunk.append(frame)
+            if chunk:
+                pending.append(pool.submit(_process_frames, chunk, write_composite))
+            # Write the oldest chunk when the pipeline is full (or at the end)
+            while pending and (len(pending) > 2 * workers or not chunk):
+                count += write(pending.popleft().result())
+            if not chunk:
+                break
+    elapsed = time.perf_counter() - start
+
+    cap.release()
+    for writer in (mask_out, composite_out):
+        if writer is not None:
+            writer.release()
+    return count, count / elapsed if elapsed > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply an HSV preset to an image directory or a video")
+    parser.add_argument("preset", help="Preset file (Save Preset in hsv.py)")
+    parser.add_argument("input", help="Image directory or video")
+    parser.add_argument("output", help="Output directory (images) or output prefix (video)")
+    parser.add_argument("--output-type", choices=("mask", "composite", "both"), default="both")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    write_mask = args.output_type in ("mask", "both")
+    write_composite = args.output_type in ("composite", "both")
+    if os.path.isdir(args.input):
+        count, fps = apply_preset_to_directory(args.preset, args.input, args.output,
+                                               write_mask, write_composite, args.workers)
+    else:
+        count, fps = apply_preset_to_video(args.preset, args.input, args.output,
+                                           write_mask, write_composite, args.workers)
+    print(f"{count} frames processed, {fps:.1f} fps")
+
+
+if __name__ == "__main__":
+    # Example usage:
+    #   python hsv_batch.py preset.json images/ masks/ --output-type mask
+    #   python hsv_batch.py preset.json video.mp4 out/video --workers 4
+    main()
@@ -0,0 +1,164 @@
+import json
+import cv2
+import numpy as np
+
+# Value ranges of OpenCV 8-bit HSV
+HSV_LIMITS = (180, 256, 256)
+
+
+class HSVHistogram:
+    """
+    Cumulative 3D histogram (summed-volume table) over H x S x V.
+
+    Built once per image; afterwards the number of pixels inside any box
+    [lower, upper] is answered with 8 table lookups, independent of the image size.
+
+    With bins=HSV_LIMITS the counts equal np.count_nonzero(cv2.inRange(...)).
+    Coarser bins need less memory; a box edge inside a bin then counts the
+    whole bin, so the result is an upper bound.
+    """
+
+    def __init__(self, hsv_image, bins=(180, 64, 64)):
+        """
+        Args:
+            hsv_image (np.ndarray): uint8 HSV image (OpenCV ranges H 0-179, S/V 0-255)
+            bins (tuple): Number of bins for H, S and V
+        """
+        self.bins = tuple(bins)
+        self.step = tuple(limit / b for limit, b in zip(HSV_LIMITS, self.bins))
+        self.total = hsv_image.shape[0] * hsv_image.shape[1]
+
+        # Bin index per channel via lookup tables, then one flat index per pixel
+        flat = np.zeros(hsv_image.shape[:2], np.int32)
+        for channel, (limit, b) in enumerate(zip(HSV_LIMITS, self.bins)):
+            lut = np.minimum(np.arange(256) * b // limit, b - 1).astype(np.uint8)
+            flat = flat * b + cv2.LUT(hsv_image[:, :, channel].copy(), lut)
+        hist = np.bincount(flat.ravel(), minlength=np.prod(self.bins)).reshape(self.bins)
+
+        # Leading zero planes, so that the inclusion-exclusion needs no bounds checks
+        dtype = np.int32 if self.total < 2**31 else np.int64
+        table = np.zeros(tuple(b + 1 for b in self.bins), dtype)
+        table[1:, 1:, 1:] = hist.cumsum(0).cumsum(1).cumsum(2)
+        self.table = table
+
+    @property
+    def exact(self):
+        """
+        True if count() is exact (bins=HSV_LIMITS), False if it is an upper bound.
+        """
+        return self.bins == HSV_LIMITS
+
+    def _bin_range(self, lower, upper):
+        lo = [min(int(l // s), b) for l, s, b in zip(lower, self.step, self.bins)]
+        hi = [min(int(u // s) + 1, b) for u, s, b in zip(upper, self.step, self.bins)]
+        return lo, hi
+
+    def count(self, lower, upper):
+        """
+        Number of pixels with lower <= (h, s, v) <= upper, like cv2.inRange.
+        """
+        if any(l > u for l, u in zip(lower, upper)):
+            return 0
+        (h0, s0, v0), (h1, s1, v1) = self._bin_range(lower, upper)
+        t = self.table
+        return int(t[h1, s1, v1] - t[h0, s1, v1] - t[h1, s0, v1] - t[h1, s1, v0]
+                   + t[h0, s0, v1] + t[h0, s1, v0] + t[h1, s0, v0] - t[h0, s0, v0])
+
+    def fraction(self, lower, upper):
+        """
+        Share of the image inside the box (0..1).
+        """
+        return self.count(lower, upper) / max(1, self.total)
+
+
+def suggest_range(hsv_image, x, y, tolerance=(8, 60, 60), coverage=0.95):
+    """
+    Tightest HSV range covering the colour region around a clicked pixel.
+
+    The region is the connected area of similar colour (flood fill with the
+    given per-channel tolerance relative to the clicked pixel). The range spans
+    the central `coverage` share of the region's pixels per channel, so single
+    outliers don't widen it.
+
+    Args:
+        hsv_image (np.ndarray): uint8 HSV image
+        x, y (int): Clicked pixel
+        tolerance (tuple): Allowed difference to the clicked colour in H, S, V
+        coverage (float): Share of region pixels inside the range (1.0 = min/max)
+
+    Returns:
+        tuple: (lower, upper) as lists [h, s, v], and the region size in pixels
+    """
+    height, width = hsv_image.shape[:2]
+    mask = np.zeros((height + 2, width + 2), np.uint8)
+    flags = 4 | cv2.FLOODFILL_MASK_ONLY | cv2.FLOODFILL_FIXED_RANGE | (255 << 8)
+    cv2.floodFill(hsv_image, mask, (int(x), int(y)), 0, tolerance, tolerance, flags)
+    region = hsv_image[mask[1:-1, 1:-1] > 0]
+
+    tail = (1.0 - coverage) / 2 * 100
+    lower = np.percentile(region, tail, axis=0)
+    upper = np.percentile(region, 100 - tail, axis=0)
+    return ([int(np.floor(v)) for v in lower], [int(np.ceil(v)) for v in upper]), len(region)
+
+
+def save_preset(path, lower, upper):
+    """
+    Save an HSV range as a JSON preset.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"lower": [int(v) for v in lower], "upper": [int(v) for v in upper]}, f, indent=2)
+
+
+def load_preset(path):
+    """
+    Returns:
+        tuple: (lower, upper) as uint8 arrays [h, s, v]
+    """
+    with open(path, encoding="utf-8") as f:
+        preset = json.load(f)
+    return np.array(preset["lower"], np.uint8), np.array(preset["upper"], np.uint8)
+
+
+class MaskRenderer:
+    """
+    The mask and composite of HSVColorPicker.apply_mask, without Qt.
+
+    The composite keeps the colour where the mask is set and shows the rest in
+    grayscale. All intermediate images are allocated once and reused as long as
+    the frame size doesn't change.
+    """
+
+    def __init__(self, lower, upper):
+        self.lower = np.asarray(lower)
+        self.upper = np.asarray(upper)
+        self._shape = None
+
+    def _allocate(self, shape):
+        height, width = shape[:2]
+        self._shape = shape
+        self.hsv = np.empty((height, width, 3), np.uint8)
+        self.mask = np.empty((height, width), np.uint8)
+        self.gray = np.empty((height, width), np.uint8)
+        self.composite = np.empty((height, width, 3), np.uint8)
+
+    def render(self, bgr, composite=True):
+        """
+        Args:
+            bgr (np.ndarray): BGR image
+            composite (bool): Also compute the colour/grayscale composite
+
+        Returns:
+            tuple: (mask, composite or None); both are internal buffers, overwritten
+                by the next call
+        """
+        if bgr.shape != self._shape:
+            self._allocate(bgr.shape)
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV, dst=self.hsv)
+        cv2.inRange(self.hsv, self.lower, self.upper, dst=self.mask)
+        if not composite:
+            return self.mask, None
+        # Grayscale everywhere, then copy the colour pixels under the mask on top
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        cv2.cvtColor(self.gray, cv2.COLOR_GRAY2BGR, dst=self.composite)
+        cv2.copyTo(bgr, self.mask, self.composite)
+        return self.mask, self.composite
@@ -1,43 +1,175 @@
 import numpy as np
 import cv2 as cv
 import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from camera_model import CameraModel
 # termination criteria
 criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-# prepare object points, like (0,0,0), (1,0,0), (2,0,0) ....,(6,5,0)
-objp = np.zeros((6*9,3), np.float32)
-objp[:,:2] = np.mgrid[0:9,0:6].T.reshape(-1,2)
-# Arrays to store object points and image points from all the images.
-objpoints = [] # 3d point in real world space
-imgpoints = [] # 2d points in image plane.
-images = glob.glob('calib/*.jpg')
-for fname in images:
-    img = cv.imread(fname)
-    gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
-    # Find the chess board corners
-    ret, corners = cv.findChessboardCorners(gray, (9,6), None)
-    # If found, add object points, image points (after refining them)
-    if ret == True:
+# inner corners of the chessboard
+PATTERN = (9, 6)
+
+
+def object_points(pattern=PATTERN):
+    # prepare object points, like (0,0,0), (1,0,0), (2,0,0) ....,(8,5,0)
+    objp = np.zeros((pattern[0]*pattern[1],3), np.float32)
+    objp[:,:2] = np.mgrid[0:pattern[0],0:pattern[1]].T.reshape(-1,2)
+    return objp
+
+
+def find_corners(fname, pattern=PATTERN, search_width=640, full_fallback=False):
+    """
+    Chessboard corners of one image.
+
+    The board is searched on a copy downscaled to search_width pixels; the
+    corners found there are scaled back and refined with cornerSubPix at full
+    resolution. Images without a board, where findChessboardCorners is slowest,
+    cost only the search on the small copy.
+
+    Args:
+        fname (str): Image file
+        pattern (tuple): Inner corners (columns, rows)
+        search_width (int): Width of the search copy (0 = search at full resolution)
+        full_fallback (bool): Search the full image if the board is not found on the
+            small copy (for boards that are very small in the image)
+
+    Returns:
+        tuple: (image size (w, h) or None, refined corners (n, 1, 2) float32 or None)
+    """
+    gray = cv.imread(fname, cv.IMREAD_GRAYSCALE)
+    if gray is None:
+        return None, None
+    h, w = gray.shape
+    flags = cv.CALIB_CB_ADAPTIVE_THRESH + cv.CALIB_CB_NORMALIZE_IMAGE + cv.CALIB_CB_FAST_CHECK
+    scale = min(1.0, search_width / w) if search_width else 1.0
+
+    ret, corners = False, None
+    if scale < 1.0:
+        small = cv.resize(gray, None, fx=scale, fy=scale, interpolation=cv.INTER_AREA)
+        ret, corners = cv.findChessboardCorners(small, pattern, flags)
+        if ret:
+            # Pixel centres: x_full = (x_small + 0.5) / scale - 0.5
+            corners = (corners + 0.5) / scale - 0.5
+    if not ret and (scale == 1.0 or full_fallback):
+        scale = 1.0
+        ret, corners = cv.findChessboardCorners(gray, pattern, flags)
+    if not ret:
+        return (w, h), None
+
+    # The search window covers the error of the upscaled corners
+    half = max(5, int(np.ceil(2 / scale)))
+    corners2 = cv.cornerSubPix(gray, np.float32(corners), (half, half), (-1, -1), criteria)
+    return (w, h), corners2
+
+
+def file_hash(fname):
+    with open(fname, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def detect_all(images, pattern=PATTERN, search_width=640, full_fallback=False, cache_file=None, workers=None):
+    """
+    Chessboard corners of all images on a process pool.
+
+    Results are cached per image content (SHA-1) in cache_file, so after
+    adding images to the set only the new ones are processed.
+
+    Args:
+        images (list): Image files
+        cache_file (str): JSON cache (None = no cache)
+        workers (int): Processes (default: all cores)
+
+    Returns:
+        list: (fname, image size (w, h), corners or None) per image
+    """
+    settings = {"pattern": list(pattern), "search_width": search_width, "full_fallback": full_fallback}
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, encoding="utf-8") as f:
+            data = json.load(f)
+        # Results with other settings are not reused
+        if data.get("settings") == settings:
+            cache = data["images"]
+
+    keys = [file_hash(fname) for fname in images]
+    # Copies of the same image are detected once
+    missing = list({key: fname for fname, key in zip(images, keys) if key not in cache}.items())
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(find_corners, [fname for _, fname in missing],
+                               [pattern] * len(missing), [search_width] * len(missing),
+                               [full_fallback] * len(missing))
+            for (key, fname), (size, corners) in zip(missing, results):
+                cache[key] = {"size": size, "corners": corners.reshape(-1, 2).tolist() if corners is not None else None}
+        if cache_file:
+            with open(cache_file, "w", encoding="utf-8") as f:
+                json.dump({"settings": settings, "images": cache}, f)
+    print(f"{len(images)} images, {len(missing)} detected, the rest from cache")
+
+    detections = []
+    for fname, key in zip(images, keys):
+        entry = cache[key]
+        corners = np.float32(entry["corners"]).reshape(-1, 1, 2) if entry["corners"] is not None else None
+        detections.append((fname, tuple(entry["size"]) if entry["size"] else None, corners))
+    return detections
+
+
+def calibrate(detections, pattern=PATTERN):
+    """
+    calibrateCamera on all images with a detected board (see detect_all).
+    All of them must have the same size.
+
+    Returns:
+        tuple: (rms error, camera matrix, distortion coefficients, rvecs, tvecs)
+    """
+    # Arrays to store object points and image points from all the images.
+    objpoints = [] # 3d point in real world space
+    imgpoints = [] # 2d points in image plane.
+    objp = object_points(pattern)
+    sizes = set()
+    for _, size, corners in detections:
+        if corners is None:
+            continue
         objpoints.append(objp)
-        corners2 = cv.cornerSubPix(gray,corners, (11,11), (-1,-1), criteria)
+        # The refined corners (the unrefined ones were used before)
         imgpoints.append(corners)
-        # Draw and display the corners
-        cv.drawChessboardCorners(img, (9,6), corners2, ret)
-        #cv.imshow('img', img)
-        #cv.waitKey(200)
-cv.destroyAllWindows()
-
-ret, mtx, dist, rvecs, tvecs = cv.calibrateCamera(objpoints, imgpoints, gray.shape[::-1], None, None)
-print(ret, mtx, dist)
-print("--------------")
-
-img = cv.imread('calib/left12.jpg')
-h,  w = img.shape[:2]
-newcameramtx, roi = cv.getOptimalNewCameraMatrix(mtx, dist, (w,h), 1, (w,h))
-print(newcameramtx)
-# undistort
-dst = cv.undistort(img, mtx, dist, None, newcameramtx)
-cv.imwrite('undistort.png', dst)
-# crop the image
-x, y, w, h = roi
-dst = dst[y:y+h, x:x+w]
-cv.imwrite('calibresult.png', dst)
\ No newline at end of file
+        sizes.add(size)
+    if not objpoints:
+        raise ValueError("No chessboard found in any image")
+    # One camera matrix is only valid for one resolution
+    if len(sizes) > 1:
+        raise ValueError(f"Images of different sizes: {sorted(sizes)}")
+    image_size = sizes.pop()
+    return cv.calibrateCamera(objpoints, imgpoints, image_size, None, None)
+
+
+if __name__ == "__main__":
+    # Example usage: python calib/calib2.py ["calib/*.jpg"]
+    images = sorted(glob.glob(sys.argv[1] if len(sys.argv) > 1 else 'calib/*.jpg'))
+    start = time.perf_counter()
+    detections = detect_all(images, cache_file=os.path.join(os.path.dirname(images[0]) if images else '.', 'corners_cache.json'))
+    print(f"Corner detection: {time.perf_counter() - start:.2f}s, "
+          f"board found in {sum(c is not None for _, _, c in detections)} images")
+
+    calibration = calibrate(detections)
+    ret, mtx, dist, rvecs, tvecs = calibration
+    print(ret, mtx, dist)
+    print("--------------")
+
+    # Undistortion maps are built once per resolution, every image is one remap
+    image_size = next(size for _, size, corners in detections if corners is not None)
+    model = CameraModel.from_calibration(calibration, image_size)
+    img = cv.imread('calib/left12.jpg')
+    h,  w = img.shape[:2]
+    _, _, newcameramtx, roi = model.maps((w, h), alpha=1)
+    print(newcameramtx)
+    # undistort
+    dst = model.undistort(img, alpha=1)
+    cv.imwrite('undistort.png', dst)
+    # crop the image (maps for the valid region only)
+    dst = model.undistort(img, alpha=1, crop=True)
+    cv.imwrite('calibresult.png', dst)
\ No newline at end of file
@@ -0,0 +1,262 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2 as cv
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+
+class CameraModel:
+    """
+    Pinhole camera with lens distortion, e.g. from calib/intrinsics.yml or calibrateCamera.
+
+    cv.undistort recomputes the distortion model for every pixel of every
+    frame. Here the undistortion maps (initUndistortRectifyMap) are built once
+    per (resolution, alpha, crop, map type) and every frame costs one cv.remap.
+    Fixed-point maps (CV_16SC2) need 6 instead of 8 bytes per pixel and give
+    the same result as cv.undistort; with map_dir the maps are also saved to
+    disk and loaded on the next run.
+
+    Usage:
+        model = CameraModel.from_yaml("calib/intrinsics.yml")
+        dst = model.undistort(img, alpha=1, crop=True)
+    """
+
+    def __init__(self, camera_matrix, dist_coeffs, image_size=None, map_dir=None):
+        """
+        Args:
+            camera_matrix (np.ndarray): 3x3 intrinsic matrix
+            dist_coeffs (np.ndarray): Distortion coefficients (k1, k2, p1, p2[, k3 ...])
+            image_size (tuple): (w, h) of the calibration images; frames with another
+                resolution (same aspect ratio) get a scaled camera matrix. None = use as is
+            map_dir (str): Directory for persisted maps (None = keep them in memory only)
+        """
+        self.camera_matrix = np.float64(camera_matrix).reshape(3, 3)
+        self.dist_coeffs = np.float64(dist_coeffs).ravel()
+        self.image_size = tuple(image_size) if image_size is not None else None
+        self.map_dir = map_dir
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_yaml(cls, path="calib/intrinsics.yml", camera=1, image_size=None, map_dir=None):
+        """
+        Camera camera (M<camera>, D<camera>) of an OpenCV YAML file like calib/intrinsics.yml.
+        The calibration resolution is image_size or, if not given, an optional
+        image_size node ([w, h]) of the file.
+        """
+        fs = cv.FileStorage(path, cv.FILE_STORAGE_READ)
+        if not fs.isOpened():
+            raise IOError(f"Could not read {path}")
+        camera_matrix = fs.getNode(f"M{camera}").mat()
+        dist_coeffs = fs.getNode(f"D{camera}").mat()
+        size_node = fs.getNode("image_size")
+        if image_size is None and not size_node.empty():
+            image_size = tuple(int(v) for v in size_node.mat().ravel())
+        fs.release()
+        if camera_matrix is None or dist_coeffs is None:
+            raise ValueError(f"No M{camera}/D{camera} in {path}")
+        return cls(camera_matrix, dist_coeffs, image_size, map_dir)
+
+    @classmethod
+    def from_calibration(cls, calibration, image_size, map_dir=None):
+        """
+        Model from the result of cv.calibrateCamera: (rms, mtx, dist, rvecs, tvecs).
+        """
+        _, mtx, dist = calibration[:3]
+        return cls(mtx, dist, image_size, map_dir)
+
+    def save_yaml(self, path, camera=1):
+        fs = cv.FileStorage(path, cv.FILE_STORAGE_WRITE)
+        fs.write(f"M{camera}", self.camera_matrix)
+        fs.write(f"D{camera}", self.dist_coeffs.reshape(1, -1))
+        if self.image_size is not None:
+            fs.write("image_size", np.int32(self.image_size).reshape(1, 2))
+        fs.release()
+
+    def camera_matrix_for(self, size):
+        """
+        Camera matrix for frames of size (w, h), scaled from the calibration resolution.
+        """
+        if self.image_size is None or tuple(size) == self.image_size:
+            return self.camera_matrix
+        sx, sy = size[0] / self.image_size[0], size[1] / self.image_size[1]
+        return np.diag([sx, sy, 1.0]) @ self.camera_matrix
+
+    def _map_file(self, key):
+        size, alpha, crop, fixed_point = key
+        h = hashlib.sha1()
+        h.update(self.camera_matrix_for(size).tobytes())
+        h.update(self.dist_coeffs.tobytes())
+        name = (f"undistort_{size[0]}x{size[1]}_a{alpha:g}{'_crop' if crop else ''}"
+                f"_{'16SC2' if fixed_point else '32FC1'}_{h.hexdigest()[:12]}.npz")
+        return os.path.join(self.map_dir, name)
+
+    def maps(self, size, alpha=1.0, crop=False, fixed_point=True):
+        """
+        Undistortion maps for frames of size (w, h), built on the first request.
+
+        Args:
+            alpha (float): 0 = only valid pixels, 1 = all source pixels (getOptimalNewCameraMatrix)
+            crop (bool): Maps only for the valid region (roi), so cropped pixels are never computed
+            fixed_point (bool): CV_16SC2 maps instead of two CV_32FC1 maps
+
+        Returns:
+            tuple: (map1, map2, new camera matrix, roi (x, y, w, h))
+        """
+        key = (tuple(size), float(alpha), bool(crop), bool(fixed_point))
+        entry = self._maps.get(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            # Threads of the streaming functions may ask for the same new maps
+            if key not in self._maps:
+                self._maps[key] = self._build_maps(key)
+            return self._maps[key]
+
+    def _build_maps(self, key):
+        size, alpha, crop, fixed_point = key
+        path = self._map_file(key) if self.map_dir else None
+        if path and os.path.exists(path):
+            data = np.load(path)
+            entry = (data["map1"], data["map2"], data["camera_matrix"], tuple(int(v) for v in data["roi"]))
+        else:
+            camera_matrix = self.camera_matrix_for(size)
+            new_matrix, roi = cv.getOptimalNewCameraMatrix(camera_matrix, self.dist_coeffs, size, alpha, size)
+            out_size = tuple(size)
+            if crop and roi[2] > 0 and roi[3] > 0:
+                # Shift the principal point so the roi starts at (0, 0)
+                new_matrix = new_matrix.copy()
+                new_matrix[0, 2] -= roi[0]
+                new_matrix[1, 2] -= roi[1]
+                out_size = (roi[2], roi[3])
+            map_type = cv.CV_16SC2 if fixed_point else cv.CV_32FC1
+            map1, map2 = cv.initUndistortRectifyMap(camera_matrix, self.dist_coeffs, None, new_matrix,
+                                                    out_size, map_type)
+            entry = (map1, map2, new_matrix, tuple(int(v) for v in roi))
+            if path:
+                os.makedirs(self.map_dir, exist_ok=True)
+                np.savez(path, map1=map1, map2=map2, camera_matrix=new_matrix, roi=np.int32(roi))
+        return entry
+
+    def undistort(self, img, alpha=1.0, crop=False, fixed_point=True, interpolation=cv.INTER_LINEAR):
+        """
+        Undistorted image with one cv.remap (maps from maps()).
+        """
+        h, w = img.shape[:2]
+        map1, map2, _, _ = self.maps((w, h), alpha, crop, fixed_point)
+        return cv.remap(img, map1, map2, interpolation)
+
+
+def undistort_directory(model, input_dir, output_dir, alpha=1.0, crop=False, workers=None):
+    """
+    Undistort all images of a directory on a thread pool (read, remap and
+    write release the GIL). The maps are built once per resolution.
+
+    Returns:
+        int: Number of images written
+    """
+    files = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    os.makedirs(output_dir, exist_ok=True)
+
+    def process(name):
+        img = cv.imread(os.path.join(input_dir, name))
+        if img is None:
+            print(f"Warning: Could not read {name}")
+            return 0
+        cv.imwrite(os.path.join(output_dir, name), model.undistort(img, alpha, crop))
+        return 1
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        return sum(pool.map(process, files))
+
+
+def undistort_video(model, input_video, output_video, alpha=1.0, crop=False, workers=None):
+    """
+    Undistort a video: frames are read and written in order in this thread,
+    the remaps run on a thread pool with a bounded number of frames in flight.
+
+    Returns:
+        int: Number of frames written
+    """
+    cap = cv.VideoCapture(input_video)
+    if not cap.isOpened():
+        print("Error opening video file")
+        return 0
+    width = int(cap.get(cv.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv.CAP_PROP_FRAME_HEIGHT))
+    _, _, _, roi = model.maps((width, height), alpha, crop)
+    out_size = (roi[2], roi[3]) if crop and roi[2] > 0 and roi[3] > 0 else (width, height)
+    out = cv.VideoWriter(output_video, cv.VideoWriter_fourcc(*'mp4v'), cap.get(cv.CAP_PROP_FPS), out_size)
+
+    workers = workers or os.cpu_count()
+    pending = deque()
+    written = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            success, frame = cap.read()
+            if success:
+                pending.append(pool.submit(model.undistort, frame, alpha, crop))
+            # Write the oldest frame when the pipeline is full (or at the end)
+            while pending and (len(pending) > 2 * workers or not success):
+                out.write(pending.popleft().result())
+                written += 1
+            if not success:
+                break
+    cap.release()
+    out.release()
+    return written
+
+
+def benchmark_undistort(model, size=(1280, 720), frames=50, alpha=1.0):
+    """
+    Time per frame of the old path (getOptimalNewCameraMatrix + cv.undistort
+    per image) against remap with float and fixed-point maps, and the largest
+    pixel difference to cv.undistort.
+    """
+    rng = np.random.default_rng(0)
+    img = cv.GaussianBlur(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8), (0, 0), 2)
+    camera_matrix = model.camera_matrix_for(size)
+
+    def old():
+        new_matrix, _ = cv.getOptimalNewCameraMatrix(camera_matrix, model.dist_coeffs, size, alpha, size)
+        return cv.undistort(img, camera_matrix, model.dist_coeffs, None, new_matrix)
+
+    reference = old()
+    print(f"{size[0]}x{size[1]}, alpha {alpha}")
+    for name, fn in (("cv.undistort", old),
+                     ("remap float", lambda: model.undistort(img, alpha, fixed_point=False)),
+                     ("remap 16SC2", lambda: model.undistort(img, alpha, fixed_point=True))):
+        fn()  # builds the maps
+        start = time.perf_counter()
+        for _ in range(frames):
+            dst = fn()
+        elapsed = (time.perf_counter() - start) / frames
+        diff = int(np.abs(dst.astype(np.int16) - reference).max())
+        print(f"  {name:13s} {1000 * elapsed:6.2f} ms/frame   max diff {diff}")
+
+
+if __name__ == "__main__":
+    # Example usage:
+    #   python calib/camera_model.py                          (benchmark with calib/intrinsics.yml)
+    #   python calib/camera_model.py input_dir output_dir     (undistort all images)
+    #   python calib/camera_model.py input.mp4 output.mp4     (undistort a video)
+    # intrinsics.yml holds camera 1 of a 640x480 stereo calibration
+    model = CameraModel.from_yaml(os.path.join(os.path.dirname(os.path.abspath(__file__)), "intrinsics.yml"),
+                                  image_size=(640, 480), map_dir="undistort_maps")
+    if len(sys.argv) < 3:
+        benchmark_undistort(model, (640, 480))
+        benchmark_undistort(model, (1920, 1440))
+    elif os.path.isdir(sys.argv[1]):
+        start = time.perf_counter()
+        count = undistort_directory(model, sys.argv[1], sys.argv[2])
+        print(f"{count} images in {time.perf_counter() - start:.2f}s")
+    else:
+        start = time.perf_counter()
+        count = undistort_video(model, sys.argv[1], sys.argv[2])
+        print(f"{count} frames in {time.perf_counter() - start:.2f}s")
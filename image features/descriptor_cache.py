@@ -0,0 +1,107 @@
+import hashlib
+from collections import OrderedDict
+import cv2
+import numpy as np
+from tiled_detect import detect_tiled
+
+# Rough memory of one cv2.KeyPoint in Python (object + 7 fields)
+KEYPOINT_BYTES = 128
+
+
+def image_key(img):
+    """
+    Identity of an image by content: BLAKE2 hash of the pixel data, shape and dtype.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((img.shape, img.dtype.str)).encode())
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+class DescriptorCache:
+    """
+    In-memory LRU cache for keypoints and descriptors.
+
+    Entries are keyed by (image identity, method, detector parameters), so
+    switching the matcher or going back to an earlier method reuses the
+    detection. Besides the descriptors themselves an entry holds the float32
+    copy needed to match binary descriptors (AKAZE) with a FLANN KD-tree.
+    The least recently used entries are dropped when the cache exceeds
+    max_bytes.
+
+    Usage:
+        cache = DescriptorCache()
+        kp, desc = cache.features(img, "SIFT")
+        desc_f32 = cache.float_descriptors(img, "AKAZE")
+    """
+
+    def __init__(self, max_bytes=512 * 2**20, color_conversion=cv2.COLOR_RGB2GRAY):
+        """
+        Args:
+            max_bytes (int): Memory limit for keypoints and descriptors
+            color_conversion (int): cvtColor code for 3-channel images (the GUIs hold RGB)
+        """
+        self.max_bytes = max_bytes
+        self.color_conversion = color_conversion
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def _entry(self, img, method, key, params):
+        cache_key = (key or image_key(img), method, tuple(sorted(params.items())))
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            self._entries.move_to_end(cache_key)
+            return cache_key, entry
+
+        gray = cv2.cvtColor(img, self.color_conversion) if img.ndim == 3 else img
+        kp, desc = detect_tiled(gray, method, **params)
+        entry = {"keypoints": kp, "descriptors": desc, "float": None,
+                 "nbytes": len(kp) * KEYPOINT_BYTES + (desc.nbytes if desc is not None else 0)}
+        self._entries[cache_key] = entry
+        self.nbytes += entry["nbytes"]
+        self._evict()
+        return cache_key, entry
+
+    def _evict(self):
+        # Oldest first; the newest entry stays even if it alone exceeds the limit
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.nbytes -= entry["nbytes"]
+
+    def features(self, img, method="SIFT", key=None, **params):
+        """
+        Keypoints and descriptors of an image, detected on the first request.
+
+        Args:
+            img (np.ndarray): Grayscale or 3-channel image
+            method (str): "SIFT", "ORB" or "AKAZE"
+            key (hashable): Image identity (e.g. from image_key at load time);
+                if None the content is hashed on every call
+            **params: Detector parameters, part of the cache key
+
+        Returns:
+            tuple: (keypoints, descriptors or None)
+        """
+        _, entry = self._entry(img, method, key, params)
+        return entry["keypoints"], entry["descriptors"]
+
+    def float_descriptors(self, img, method="SIFT", key=None, **params):
+        """
+        Descriptors as float32 (e.g. AKAZE for a FLANN KD-tree), converted once.
+        """
+        _, entry = self._entry(img, method, key, params)
+        if entry["float"] is None and entry["descriptors"] is not None:
+            desc = entry["descriptors"]
+            entry["float"] = desc if desc.dtype == np.float32 else np.float32(desc)
+            if entry["float"] is not desc:
+                entry["nbytes"] += entry["float"].nbytes
+                self.nbytes += entry["float"].nbytes
+                self._evict()
+        return entry["float"]
@@ -0,0 +1,23 @@
+import cv2
+
+
+def create_detector(method="SIFT", **params):
+    """
+    Create an OpenCV feature detector by name.
+
+    Shared by the GUIs in "image features/" and the scripts in video/.
+
+    Args:
+        method (str): "SIFT", "ORB" or "AKAZE"
+        **params: Keyword arguments passed to the OpenCV factory function
+
+    Returns:
+        cv2.Feature2D: Detector instance
+    """
+    if method == "SIFT":
+        return cv2.SIFT_create(**params)
+    elif method == "ORB":
+        return cv2.ORB_create(**params)
+    elif method == "AKAZE":
+        return cv2.AKAZE_create(**params)
+    raise ValueError(f"Unknown feature method: {method}")
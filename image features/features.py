@@ -1,10 +1,96 @@
 import sys
 import cv2
 import numpy as np
-from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox, QFileDialog, QWidget, QStatusBar
+from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox, QFileDialog, QWidget, QStatusBar, QSpinBox, QDoubleSpinBox
 from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtCore import Qt
-from PIL import Image
+from tiled_detect import detect_tiled
+
+# Farbe pro Winkel: Hue 0..179 bei voller Sättigung, als RGB (das Bild wird als RGB angezeigt)
+ANGLE_PALETTE = cv2.cvtColor(np.stack([np.arange(180, dtype=np.uint8),
+                                       np.full(180, 255, np.uint8),
+                                       np.full(180, 255, np.uint8)], axis=1)[None], cv2.COLOR_HSV2RGB)[0]
+NO_ANGLE_COLOR = (0, 255, 0)
+
+# Kreise als Polygone, damit alle Kreise einer Farbe mit einem polylines-Aufruf gezeichnet werden.
+# Eckenzahl nach Radius: (max. Radius, Ecken); kleine Kreise brauchen nur wenige Ecken
+CIRCLE_VERTICES = ((4, 8), (16, 16), (None, 32))
+
+
+def unit_circle(vertices):
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    return np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+
+def filter_keypoints(keypoints, top_n=0, min_size=0.0):
+    """
+    Keep the strongest keypoints.
+
+    Args:
+        keypoints (list): cv2.KeyPoint list
+        top_n (int): Keep the top_n keypoints by response (0 = all)
+        min_size (float): Drop keypoints with a smaller size (diameter)
+
+    Returns:
+        list: Filtered keypoints, strongest first if top_n is set
+    """
+    if not keypoints:
+        return []
+    sizes = np.array([kp.size for kp in keypoints], np.float32)
+    idx = np.flatnonzero(sizes >= min_size)
+    if top_n and len(idx) > top_n:
+        response = np.array([keypoints[i].response for i in idx], np.float32)
+        best = np.argpartition(-response, top_n - 1)[:top_n]
+        idx = idx[best[np.argsort(-response[best])]]
+    return [keypoints[i] for i in idx]
+
+
+def draw_keypoints(img, keypoints, min_radius=3, max_radius=50):
+    """
+    Draw keypoints as circles (radius = scale) with an orientation line, colour = angle.
+
+    Colours come from ANGLE_PALETTE; circles and lines are grouped by colour and
+    drawn with one cv2.polylines call per group instead of one call per keypoint.
+
+    Args:
+        img (np.ndarray): 3-channel image, drawn in place
+        keypoints (list): cv2.KeyPoint list
+
+    Returns:
+        np.ndarray: img
+    """
+    if not keypoints:
+        return img
+    pts = cv2.KeyPoint_convert(keypoints).astype(np.float32)
+    sizes = np.array([kp.size for kp in keypoints], np.float32)
+    angles = np.array([kp.angle for kp in keypoints], np.float32)
+
+    radius = np.clip((sizes / 2).astype(np.int32), min_radius, max_radius)
+    centers = pts.astype(np.int32)
+    circles = [None] * len(keypoints)
+    lower = 0
+    for upper, vertices in CIRCLE_VERTICES:
+        idx = np.flatnonzero((radius > lower) & (radius <= upper if upper else True))
+        polygons = centers[idx, None, :] + radius[idx, None, None] * unit_circle(vertices)[None]
+        for i, polygon in zip(idx, polygons.round().astype(np.int32)):
+            circles[i] = polygon
+        lower = upper
+
+    # Orientierungslinie nur für Keypoints mit Winkel (angle = -1: kein Winkel berechnet)
+    has_angle = angles >= 0
+    theta = np.radians(angles)
+    ends = (pts + radius[:, None] * np.stack([np.cos(theta), np.sin(theta)], axis=1)).astype(np.int32)
+    lines = np.stack([centers, ends], axis=1)
+
+    color_index = np.where(has_angle, angles.astype(np.int32) % 180, -1)
+    for index in np.unique(color_index):
+        group = color_index == index
+        color = NO_ANGLE_COLOR if index < 0 else tuple(int(c) for c in ANGLE_PALETTE[index])
+        cv2.polylines(img, [circles[i] for i in np.flatnonzero(group)], True, color, 1)
+        if index >= 0:
+            cv2.polylines(img, list(lines[group]), False, color, 1)
+    return img
+
 
 class FeatureVisualizer(QMainWindow):
     def __init__(self):
@@ -14,6 +100,9 @@ class FeatureVisualizer(QMainWindow):
         # Variables
         self.image = None
         self.keypoints = None
+        self.gray_bgr = None
+        self.detected_method = None
+        self.display_image = None
         
         # Main layout
         self.central_widget = QWidget()
@@ -40,6 +129,20 @@ class FeatureVisualizer(QMainWindow):
         self.method_combo.addItems(["SIFT", "ORB", "AKAZE"])
         control_layout.addWidget(self.method_combo)
         
+        # Keypoint filter: top N by response (0 = alle) and minimum size
+        control_layout.addWidget(QLabel("Top N:"))
+        self.top_n_spin = QSpinBox()
+        self.top_n_spin.setRange(0, 1000000)
+        self.top_n_spin.setSingleStep(100)
+        self.top_n_spin.valueChanged.connect(self.render_features)
+        control_layout.addWidget(self.top_n_spin)
+        
+        control_layout.addWidget(QLabel("Min. Größe:"))
+        self.min_size_spin = QDoubleSpinBox()
+        self.min_size_spin.setRange(0.0, 500.0)
+        self.min_size_spin.valueChanged.connect(self.render_features)
+        control_layout.addWidget(self.min_size_spin)
+        
         # Detect features button
         detect_btn = QPushButton("Features anzeigen")
         detect_btn.clicked.connect(self.detect_features)
@@ -59,16 +162,17 @@ class FeatureVisualizer(QMainWindow):
                 self.status_bar.showMessage(f"Bild geladen: {file_path}")
     
     def show_image(self, img):
-        img_pil = Image.fromarray(img)
-        
         # Scaling for display
         max_size = 800
-        if img_pil.width > max_size or img_pil.height > max_size:
-            ratio = min(max_size / img_pil.width, max_size / img_pil.height)
-            new_size = (int(img_pil.width * ratio), int(img_pil.height * ratio))
-            img_pil = img_pil.resize(new_size, Image.LANCZOS)
+        height, width = img.shape[:2]
+        if width > max_size or height > max_size:
+            ratio = min(max_size / width, max_size / height)
+            img = cv2.resize(img, (int(width * ratio), int(height * ratio)), interpolation=cv2.INTER_AREA)
         
-        img_qt = QImage(img_pil.tobytes(), img_pil.width, img_pil.height, QImage.Format_RGB888)
+        # QImage uses the numpy buffer directly; keep a reference while the pixmap is created
+        self.display_image = np.ascontiguousarray(img)
+        height, width = self.display_image.shape[:2]
+        img_qt = QImage(self.display_image.data, width, height, self.display_image.strides[0], QImage.Format_RGB888)
         pixmap = QPixmap.fromImage(img_qt)
         self.image_label.setPixmap(pixmap)
     
@@ -79,45 +183,24 @@ class FeatureVisualizer(QMainWindow):
         gray = cv2.cvtColor(self.image, cv2.COLOR_RGB2GRAY)
         method = self.method_combo.currentText()
         
-        # Initialize feature detector
-        if method == "SIFT":
-            detector = cv2.SIFT_create()
-        elif method == "ORB":
-            detector = cv2.ORB_create(nfeatures=200)
-        elif method == "AKAZE":
-            detector = cv2.AKAZE_create()
-        else:
-            detector = cv2.SIFT_create()
-        
-        # Detect keypoints
-        self.keypoints = detector.detect(gray, None)
-        img_with_kp = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
-        
-        for kp in self.keypoints:
-            radius = int(getattr(kp, 'size', 10) / 2)
-            radius = max(3, min(radius, 50))
-            
-            if hasattr(kp, 'angle'):
-                try:
-                    hsv_color = np.uint8([[[kp.angle % 180, 255, 255]]])
-                    bgr_color = cv2.cvtColor(hsv_color, cv2.COLOR_HSV2BGR)
-                    color = (int(bgr_color[0, 0, 2]), int(bgr_color[0, 0, 1]), int(bgr_color[0, 0, 0]))
-                except Exception:
-                    color = (0, 255, 0)
-            else:
-                color = (0, 255, 0)
-            
-            if all(isinstance(c, (int, float)) for c in color):
-                pt = (int(kp.pt[0]), int(kp.pt[1]))
-                cv2.circle(img_with_kp, pt, radius, color, 1)
-                
-                if hasattr(kp, 'angle'):
-                    end_x = int(kp.pt[0] + radius * np.cos(np.radians(kp.angle)))
-                    end_y = int(kp.pt[1] + radius * np.sin(np.radians(kp.angle)))
-                    cv2.line(img_with_kp, pt, (end_x, end_y), color, 1)
+        # Detector parameters; large images are detected tile by tile on all cores
+        params = dict(nfeatures=200) if method == "ORB" else {}
+        
+        # Detect keypoints; filter changes only redraw, without detecting again
+        self.keypoints = detect_tiled(gray, method, compute=False, **params)
+        self.gray_bgr = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        self.detected_method = method
+        self.render_features()
+    
+    def render_features(self):
+        if self.keypoints is None or self.gray_bgr is None:
+            return
+        
+        keypoints = filter_keypoints(self.keypoints, self.top_n_spin.value(), self.min_size_spin.value())
+        img_with_kp = draw_keypoints(self.gray_bgr.copy(), keypoints)
         
         self.show_image(img_with_kp)
-        self.status_bar.showMessage(f"{method}: {len(self.keypoints)} Features - Kreisgröße = Skala")
+        self.status_bar.showMessage(f"{self.detected_method}: {len(keypoints)} von {len(self.keypoints)} Features - Kreisgröße = Skala")
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,259 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from match_arrays import MatchArrays
+
+# Distance of padding rows (no descriptor), larger than any real distance
+NO_DESCRIPTOR = np.iinfo(np.uint16).max
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+
+def _popcount(x, out):
+    # np.bitwise_count needs NumPy >= 2.0; otherwise count per byte with a table
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x, out=out)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(x.shape + (8,)).sum(-1, dtype=np.uint8, out=out)
+
+
+def pack_descriptors(desc):
+    """
+    Binary descriptors (uint8 rows, e.g. ORB 32 bytes, AKAZE 61 bytes) as uint64
+    words, zero padded to a multiple of 8 bytes.
+
+    Returns:
+        np.ndarray: (n, words) uint64
+    """
+    desc = np.asarray(desc, np.uint8)
+    n, nbytes = desc.shape
+    words = (nbytes + 7) // 8
+    packed = np.zeros((n, words * 8), np.uint8)
+    packed[:, :nbytes] = desc
+    return packed.view("<u8")
+
+
+class HammingBlock:
+    """
+    Scratch buffers for Hamming distance blocks, reused for every block of a thread.
+
+    Query rows are processed in sub-blocks of block_rows, so the XOR and
+    popcount buffers (block_rows x cols) stay in the CPU cache.
+    """
+
+    def __init__(self, rows, cols, block_rows=64):
+        self.block_rows = min(rows, block_rows)
+        self.xor = np.empty((self.block_rows, cols), np.uint64)
+        self.count = np.empty((self.block_rows, cols), np.uint8)
+        self.distance = np.empty((rows, cols), np.uint16)
+
+    def compute(self, query, train):
+        """
+        Distance matrix (len(query), len(train)) uint16 of packed descriptors,
+        one XOR + popcount per 64-bit word. The result is a view of the scratch buffer.
+        """
+        rows, cols = len(query), len(train)
+        distance = self.distance[:rows, :cols]
+        # One contiguous row per word instead of a strided column
+        train_words = np.ascontiguousarray(train.T)
+        for r in range(0, rows, self.block_rows):
+            q = query[r:r + self.block_rows]
+            xor, count, out = self.xor[:len(q), :cols], self.count[:len(q), :cols], distance[r:r + len(q)]
+            out[:] = 0
+            for word in range(query.shape[1]):
+                np.bitwise_xor(q[:, word, None], train_words[word][None, :], out=xor)
+                _popcount(xor, count)
+                np.add(out, count, out=out)
+        return distance
+
+
+def hamming_distance(query, train, block_rows=64):
+    """
+    Full Hamming distance matrix of packed descriptors, computed in cache-sized blocks.
+
+    Returns:
+        np.ndarray: (len(query), len(train)) uint16
+    """
+    return HammingBlock(max(1, len(query)), len(train), block_rows).compute(query, train)
+
+
+def match_pair(desc1, desc2, ratio=0.8, cross_check=True):
+    """
+    Match two sets of binary descriptors.
+
+    Args:
+        desc1, desc2 (np.ndarray): uint8 descriptors
+        ratio (float): Lowe's ratio test (None = off)
+        cross_check (bool): Keep only mutual nearest neighbours
+
+    Returns:
+        MatchArrays: Nearest neighbour matches that pass the filters
+    """
+    distance = hamming_distance(pack_descriptors(desc1), pack_descriptors(desc2))
+    return _filter(distance, ratio, cross_check)
+
+
+def _filter(distance, ratio, cross_check):
+    # distance: (n1, n2); nearest neighbour per row, optional ratio test and cross check
+    n1, n2 = distance.shape
+    if n1 == 0 or n2 == 0:
+        return MatchArrays([], [], [])
+    train_idx = np.argmin(distance, axis=1)
+    rows = np.arange(n1)
+    best = distance[rows, train_idx]
+    keep = best < NO_DESCRIPTOR
+    if ratio is not None and n2 > 1:
+        second = np.partition(distance, 1, axis=1)[:, 1]
+        keep &= best < ratio * second
+    if cross_check:
+        keep &= np.argmin(distance, axis=0)[train_idx] == rows
+    return MatchArrays(rows[keep], train_idx[keep], best[keep])
+
+
+class HammingMatcher:
+    """
+    All-pairs matching of binary descriptors for many images.
+
+    All descriptor sets are packed into one (images, rows, words) uint64 array
+    (shorter sets are padded). For one query image the distances to a whole
+    batch of images are computed in one go as a (rows, batch, rows) block, and
+    the nearest/second nearest neighbour, ratio test and cross check are
+    reductions over that block. Batches are processed on a thread pool (NumPy
+    releases the GIL in the XOR/popcount loops), one scratch buffer per thread.
+
+    Usage:
+        matcher = HammingMatcher([store.descriptors(f) for f in files])
+        counts = matcher.match_matrix(ratio=0.8)
+    """
+
+    def __init__(self, descriptor_sets, block_entries=1 << 20):
+        """
+        Args:
+            descriptor_sets (list): uint8 descriptors per image (None = no features)
+            block_entries (int): Distance entries per block; the XOR buffer is 8 bytes per entry
+        """
+        sets = [np.empty((0, 32), np.uint8) if d is None else np.asarray(d, np.uint8) for d in descriptor_sets]
+        self.counts = np.array([len(d) for d in sets], np.int64)
+        self.rows = max(1, int(self.counts.max(initial=0)))
+        nbytes = max((d.shape[1] for d in sets), default=32)
+        self.words = (nbytes + 7) // 8
+        self.packed = np.zeros((len(sets), self.rows, self.words), np.uint64)
+        for i, d in enumerate(sets):
+            if len(d):
+                self.packed[i, :len(d)] = pack_descriptors(d)
+        self.valid = np.arange(self.rows)[None, :] < self.counts[:, None]
+        self.batch = max(1, block_entries // (self.rows * self.rows))
+
+    def __len__(self):
+        return len(self.packed)
+
+    def _counts(self, block, i, j0, j1, ratio, cross_check):
+        # Good match counts of image i against images j0..j1-1
+        n = self.rows
+        distance = block.compute(self.packed[i], self.packed[j0:j1].reshape(-1, self.words))
+        distance = distance.reshape(n, j1 - j0, n)
+        # Padding rows can never be a neighbour (in either direction)
+        distance[:, ~self.valid[j0:j1]] = NO_DESCRIPTOR
+        distance[~self.valid[i]] = NO_DESCRIPTOR
+
+        nearest = np.argmin(distance, axis=2)
+        best = np.take_along_axis(distance, nearest[:, :, None], axis=2)[:, :, 0]
+        keep = (best < NO_DESCRIPTOR) & self.valid[i][:, None]
+        # A single row has no second neighbour: no ratio test, like match_pair (and knnMatch)
+        if ratio is not None and n > 1:
+            second = np.partition(distance, 1, axis=2)[:, :, 1]
+            keep &= best < ratio * second
+        if cross_check:
+            # Nearest query row of every train row, per train image
+            reverse = np.argmin(distance, axis=0)
+            keep &= np.take_along_axis(reverse, nearest.T, axis=1).T == np.arange(n)[:, None]
+        return keep.sum(axis=0)
+
+    def match_counts(self, i, targets=None, ratio=0.8, cross_check=False):
+        """
+        Good match counts of image i against other images.
+
+        Args:
+            i (int): Query image
+            targets (range): Contiguous range of train images (default: all)
+
+        Returns:
+            np.ndarray: Count per target image
+        """
+        targets = targets if targets is not None else range(len(self))
+        block = HammingBlock(self.rows, self.rows * self.batch)
+        result = [self._counts(block, i, j0, min(j0 + self.batch, targets.stop), ratio, cross_check)
+                  for j0 in range(targets.start, targets.stop, self.batch)]
+        return np.concatenate(result) if result else np.zeros(0, np.int64)
+
+    def match_matrix(self, ratio=0.8, cross_check=False, workers=None):
+        """
+        Good match counts for all pairs (i < j), symmetric, like
+        match_matrix.compute_match_matrix for the ratio test in reihenfolge.py.
+
+        Tasks are generated lazily and at most 4 per thread are in flight, so
+        memory doesn't grow with the number of pairs.
+
+        Returns:
+            np.ndarray: (images, images) int32, 0 on the diagonal
+        """
+        n = len(self)
+        workers = workers or os.cpu_count()
+        matrix = np.zeros((n, n), np.int32)
+        tasks = ((i, j0, min(j0 + self.batch, n)) for i in range(n) for j0 in range(i + 1, n, self.batch))
+        local = threading.local()
+
+        def process(task):
+            i, j0, j1 = task
+            if not hasattr(local, "block"):
+                local.block = HammingBlock(self.rows, self.rows * self.batch)
+            return task, self._counts(local.block, i, j0, j1, ratio, cross_check)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = set()
+            while True:
+                for task in tasks:
+                    futures.add(pool.submit(process, task))
+                    if len(futures) >= 4 * workers:
+                        break
+                if not futures:
+                    break
+                finished, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    (i, j0, j1), counts = future.result()
+                    matrix[i, j0:j1] = counts
+                    matrix[j0:j1, i] = counts
+        return matrix
+
+
+def benchmark(frames=200, features=500, workers=None, seed=0):
+    """
+    All-pairs matching of random ORB-sized descriptors: pairs per second of the
+    engine against cv2.BFMatcher knnMatch + ratio loop on a sample of pairs.
+    """
+    import cv2
+    rng = np.random.default_rng(seed)
+    sets = [rng.integers(0, 256, (features, 32), dtype=np.uint8) for _ in range(frames)]
+    pairs = frames * (frames - 1) // 2
+
+    start = time.perf_counter()
+    HammingMatcher(sets).match_matrix(ratio=0.8, workers=workers)
+    engine = pairs / (time.perf_counter() - start)
+
+    sample = min(pairs, 200)
+    start = time.perf_counter()
+    bf = cv2.BFMatcher(cv2.NORM_HAMMING)
+    for k in range(sample):
+        matches = bf.knnMatch(sets[k % frames], sets[(k + 1) % frames], k=2)
+        len([m for m, n in matches if m.distance < 0.8 * n.distance])
+    opencv = sample / (time.perf_counter() - start)
+    print(f"{frames} frames x {features} descriptors, {workers or os.cpu_count()} threads: "
+          f"engine {engine:.0f} pairs/s, BFMatcher {opencv:.0f} pairs/s ({engine / opencv:.1f}x)")
+
+
+if __name__ == "__main__":
+    # Example usage: python hamming.py [frames] [features] [threads]
+    args = [int(a) for a in sys.argv[1:]]
+    benchmark(*args)
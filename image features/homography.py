@@ -0,0 +1,249 @@
+import sys
+import time
+import cv2
+import numpy as np
+from match_arrays import knn_match, ratio_test
+
+# Robust estimators of cv2.findHomography; the USAC variants need OpenCV >= 4.5
+ESTIMATORS = {name: getattr(cv2, name) for name in
+              ("RANSAC", "USAC_DEFAULT", "USAC_FAST", "USAC_ACCURATE", "USAC_MAGSAC", "USAC_PROSAC")
+              if hasattr(cv2, name)}
+
+
+def match_points(kp1, desc1, kp2, desc2, ratio=0.55):
+    """
+    SIFT matches with Lowe's ratio test as point arrays.
+
+    Returns:
+        tuple: (src_pts, dst_pts) as (n, 1, 2) float32, sorted by descriptor distance
+    """
+    if desc1 is None or desc2 is None or len(desc1) < 2 or len(desc2) < 2:
+        return np.empty((0, 1, 2), np.float32), np.empty((0, 1, 2), np.float32)
+    train_idx, distance = knn_match(desc1, desc2, k=2, norm=cv2.NORM_L2)
+    good = ratio_test(train_idx, distance, ratio)
+    # Sorted by distance, so USAC_PROSAC sees the most reliable matches first
+    good = good.best(len(good))
+    return good.points(kp1, kp2)
+
+
+def find_homography(src_pts, dst_pts, estimator="RANSAC", threshold=5.0):
+    """
+    cv2.findHomography with an estimator from ESTIMATORS.
+
+    Returns:
+        tuple: (H or None, inlier mask or None)
+    """
+    if len(src_pts) < 4:
+        return None, None
+    return cv2.findHomography(src_pts, dst_pts, ESTIMATORS[estimator], threshold)
+
+
+def scale_homography(H, scale):
+    """
+    Homography between downscaled images (factor scale) to full resolution.
+    """
+    S = np.diag([scale, scale, 1.0])
+    return np.linalg.inv(S) @ H @ S
+
+
+def homography_full(gray1, gray2, estimator="RANSAC", threshold=5.0, ratio=0.55, features=None):
+    """
+    The original path: SIFT on both full images, ratio test, findHomography.
+
+    Args:
+        features (tuple): Optional ((kp1, desc1), (kp2, desc2)), e.g. from a DescriptorCache
+
+    Returns:
+        tuple: (H or None, src_pts, dst_pts, inlier mask)
+    """
+    if features is None:
+        sift = cv2.SIFT_create()
+        features = (sift.detectAndCompute(gray1, None), sift.detectAndCompute(gray2, None))
+    (kp1, desc1), (kp2, desc2) = features
+    src, dst = match_points(kp1, desc1, kp2, desc2, ratio)
+    H, mask = find_homography(src, dst, estimator, threshold)
+    return H, src, dst, mask
+
+
+def homography_coarse(gray1, gray2, scale=0.25, estimator="RANSAC", threshold=5.0, ratio=0.55):
+    """
+    Homography from SIFT on downscaled images, scaled back to full resolution.
+
+    Returns:
+        tuple: (H or None, src_pts, dst_pts, inlier mask), points in full resolution
+    """
+    small1 = cv2.resize(gray1, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    small2 = cv2.resize(gray2, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    H, src, dst, mask = homography_full(small1, small2, estimator, threshold * scale, ratio)
+    if H is None:
+        return None, src, dst, mask
+    return scale_homography(H, scale), np.float32(src / scale), np.float32(dst / scale), mask
+
+
+def select_spread(points, shape, grid=8, per_cell=1):
+    """
+    Indices of at most grid*grid*per_cell points, spread over the image (first
+    points of every grid cell, i.e. the best ones if points are sorted).
+    """
+    height, width = shape[:2]
+    cells = (np.clip(points[:, 1] * grid // height, 0, grid - 1) * grid
+             + np.clip(points[:, 0] * grid // width, 0, grid - 1)).astype(np.int64)
+    order = np.argsort(cells, kind="stable")
+    rank = np.arange(len(cells)) - np.searchsorted(cells[order], cells[order])
+    return np.sort(order[rank < per_cell])
+
+
+def _crop(gray, center, radius):
+    height, width = gray.shape[:2]
+    x, y = int(round(center[0])), int(round(center[1]))
+    x0, y0 = max(0, x - radius), max(0, y - radius)
+    x1, y1 = min(width, x + radius), min(height, y + radius)
+    return gray[y0:y1, x0:x1], (x0, y0)
+
+
+def homography_coarse_to_fine(gray1, gray2, scale=0.25, estimator="USAC_MAGSAC", threshold=3.0,
+                              ratio=0.55, patch_radius=64, grid=8, max_offset=None):
+    """
+    Coarse-to-fine homography.
+
+    1. Estimate H on the downscaled images (homography_coarse).
+    2. Around up to grid*grid coarse inliers (spread over image 1), run SIFT
+       at full resolution in a patch of image 1 and in the patch of image 2
+       predicted by H. Full resolution SIFT therefore runs on a few small
+       patches instead of both whole images.
+    3. Keep patch matches that pass the ratio test and lie within max_offset
+       of the predicted position, and estimate the final H from all of them.
+
+    Args:
+        scale (float): Scale of the coarse level
+        estimator (str): Key of ESTIMATORS for both levels
+        threshold (float): Inlier threshold in full resolution pixels
+        patch_radius (int): Half size of the full resolution patches
+        grid (int): Patches are picked from a grid x grid layout
+        max_offset (float): Allowed distance to the prediction (default: 2 coarse pixels)
+
+    Returns:
+        tuple: (H or None, src_pts, dst_pts, inlier mask) of the final estimate
+    """
+    H, src, dst, mask = homography_coarse(gray1, gray2, scale, estimator, threshold, ratio)
+    if H is None:
+        return None, src, dst, mask
+    max_offset = max_offset or 2.0 / scale
+
+    inliers = src[mask.ravel() > 0].reshape(-1, 2)
+    centers = inliers[select_spread(inliers, gray1.shape, grid)]
+    predicted = cv2.perspectiveTransform(centers.reshape(-1, 1, 2), H).reshape(-1, 2)
+
+    sift = cv2.SIFT_create()
+    src_fine, dst_fine = [], []
+    for c1, c2 in zip(centers, predicted):
+        patch1, offset1 = _crop(gray1, c1, patch_radius)
+        # The patch in image 2 gets a margin for the coarse error
+        patch2, offset2 = _crop(gray2, c2, patch_radius + int(max_offset))
+        if patch1.size == 0 or patch2.size == 0:
+            continue
+        kp1, desc1 = sift.detectAndCompute(patch1, None)
+        kp2, desc2 = sift.detectAndCompute(patch2, None)
+        s, d = match_points(kp1, desc1, kp2, desc2, ratio)
+        if len(s) == 0:
+            continue
+        s = s.reshape(-1, 2) + offset1
+        d = d.reshape(-1, 2) + offset2
+        # Guided matching: only correspondences close to the coarse prediction
+        near = np.linalg.norm(cv2.perspectiveTransform(s.reshape(-1, 1, 2), H).reshape(-1, 2) - d, axis=1) < max_offset
+        src_fine.append(s[near])
+        dst_fine.append(d[near])
+
+    if not src_fine or sum(len(s) for s in src_fine) < 4:
+        # Not enough fine matches: keep the coarse estimate
+        return H, src, dst, mask
+    src_fine = np.float32(np.vstack(src_fine)).reshape(-1, 1, 2)
+    dst_fine = np.float32(np.vstack(dst_fine)).reshape(-1, 1, 2)
+    H_fine, mask_fine = find_homography(src_fine, dst_fine, estimator, threshold)
+    if H_fine is None:
+        return H, src, dst, mask
+    return H_fine, src_fine, dst_fine, mask_fine
+
+
+def reprojection_error(H, src_pts, dst_pts, mask=None):
+    """
+    RMS distance between H(src) and dst (over the inliers if a mask is given).
+    """
+    if H is None or len(src_pts) == 0:
+        return float("nan")
+    if mask is not None:
+        keep = mask.ravel() > 0
+        src_pts, dst_pts = src_pts[keep], dst_pts[keep]
+    projected = cv2.perspectiveTransform(np.float32(src_pts).reshape(-1, 1, 2), H)
+    return float(np.sqrt(np.mean(np.sum((projected - np.float32(dst_pts).reshape(-1, 1, 2)) ** 2, axis=2))))
+
+
+def grid_error(H, H_true, shape, steps=10):
+    """
+    Mean distance between H and H_true mapping a grid over the image (pixels).
+    """
+    if H is None:
+        return float("nan")
+    height, width = shape[:2]
+    xs, ys = np.meshgrid(np.linspace(0, width - 1, steps), np.linspace(0, height - 1, steps))
+    grid = np.float32(np.stack([xs.ravel(), ys.ravel()], axis=1)).reshape(-1, 1, 2)
+    diff = cv2.perspectiveTransform(grid, H) - cv2.perspectiveTransform(grid, H_true)
+    return float(np.mean(np.linalg.norm(diff, axis=2)))
+
+
+def synthetic_pair(gray, seed=0, shift=0.05):
+    """
+    Warp an image with a random homography (corners moved by up to shift of the
+    image size); returns (warped image, true H).
+    """
+    rng = np.random.default_rng(seed)
+    height, width = gray.shape[:2]
+    corners = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    moved = np.float32(corners + rng.uniform(-shift, shift, (4, 2)) * [width, height])
+    H = cv2.getPerspectiveTransform(corners, moved)
+    return cv2.warpPerspective(gray, H, (width, height)), H
+
+
+def benchmark_homography(path1, path2=None, scale=0.25, estimators=None):
+    """
+    Wall time, inliers and reprojection error of every mode and estimator.
+
+    Without a second image, image 1 is warped with a known random homography
+    and the error against it (grid error) is reported as well.
+    """
+    gray1 = cv2.imread(path1, cv2.IMREAD_GRAYSCALE)
+    if gray1 is None:
+        print(f"Error: Could not read {path1}")
+        return
+    H_true = None
+    if path2:
+        gray2 = cv2.imread(path2, cv2.IMREAD_GRAYSCALE)
+    else:
+        gray2, H_true = synthetic_pair(gray1)
+    print(f"{gray1.shape[1]}x{gray1.shape[0]}, coarse scale {scale}")
+    modes = {
+        "full": lambda est: homography_full(gray1, gray2, est),
+        "coarse": lambda est: homography_coarse(gray1, gray2, scale, est),
+        "coarse_to_fine": lambda est: homography_coarse_to_fine(gray1, gray2, scale, est),
+    }
+    for mode, fn in modes.items():
+        for estimator in estimators or ESTIMATORS:
+            start = time.perf_counter()
+            H, src, dst, mask = fn(estimator)
+            elapsed = time.perf_counter() - start
+            inliers = int(mask.sum()) if mask is not None else 0
+            line = (f"  {mode:15s} {estimator:14s} {elapsed:7.2f}s  {inliers:6d} inliers  "
+                    f"reprojection {reprojection_error(H, src, dst, mask):6.2f}px")
+            if H_true is not None:
+                line += f"  grid error {grid_error(H, H_true, gray1.shape):6.2f}px"
+            print(line)
+
+
+if __name__ == "__main__":
+    # Example usage:
+    #   python homography.py image1.jpg image2.jpg
+    #   python homography.py image.jpg    (synthetic pair with known homography)
+    if len(sys.argv) < 2:
+        print("Usage: python homography.py image1 [image2]")
+    else:
+        benchmark_homography(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,134 @@
+import cv2
+import numpy as np
+
+FLANN_INDEX_KDTREE = 1
+FLANN_INDEX_LSH = 6
+
+
+class MatchArrays:
+    """
+    Descriptor matches as parallel arrays instead of a list of cv2.DMatch.
+
+    query_idx/train_idx index the keypoints of the first/second image,
+    distance is the descriptor distance. Filtering and sorting work on the
+    arrays; DMatch objects are only created for cv2.drawMatches.
+    """
+
+    def __init__(self, query_idx, train_idx, distance):
+        self.query_idx = np.asarray(query_idx, np.int32)
+        self.train_idx = np.asarray(train_idx, np.int32)
+        self.distance = np.asarray(distance, np.float32)
+
+    def __len__(self):
+        return len(self.query_idx)
+
+    def take(self, idx):
+        """
+        Subset by index array or boolean mask.
+        """
+        return MatchArrays(self.query_idx[idx], self.train_idx[idx], self.distance[idx])
+
+    def best(self, k):
+        """
+        The k matches with the smallest distance, sorted (argpartition + sort of k).
+        """
+        if k >= len(self):
+            return self.take(np.argsort(self.distance, kind="stable"))
+        part = np.argpartition(self.distance, k - 1)[:k]
+        return self.take(part[np.argsort(self.distance[part], kind="stable")])
+
+    def points(self, kp1, kp2):
+        """
+        Matched keypoint coordinates.
+
+        Args:
+            kp1, kp2: cv2.KeyPoint lists or (n, 2) point arrays
+
+        Returns:
+            tuple: (src_pts, dst_pts) as (n, 1, 2) float32, as used by findHomography
+        """
+        pts1 = kp1 if isinstance(kp1, np.ndarray) else cv2.KeyPoint_convert(kp1)
+        pts2 = kp2 if isinstance(kp2, np.ndarray) else cv2.KeyPoint_convert(kp2)
+        return (np.float32(pts1[self.query_idx]).reshape(-1, 1, 2),
+                np.float32(pts2[self.train_idx]).reshape(-1, 1, 2))
+
+    def to_dmatches(self):
+        """
+        cv2.DMatch list for cv2.drawMatches.
+        """
+        return [cv2.DMatch(int(q), int(t), float(d))
+                for q, t, d in zip(self.query_idx, self.train_idx, self.distance)]
+
+
+def descriptor_norm(desc):
+    """
+    cv2.NORM_HAMMING for binary (uint8) descriptors like ORB, otherwise cv2.NORM_L2.
+    """
+    return cv2.NORM_HAMMING if desc.dtype == np.uint8 else cv2.NORM_L2
+
+
+def knn_match(desc1, desc2, k=2, norm=None):
+    """
+    Brute force k nearest neighbours as arrays (cv2.batchDistance, the kernel
+    behind BFMatcher, without creating DMatch objects).
+
+    Returns:
+        tuple: (train_idx, distance), both (len(desc1), k); for rows with fewer
+            than k neighbours train_idx is -1
+    """
+    norm = descriptor_norm(desc1) if norm is None else norm
+    dtype = cv2.CV_32S if norm == cv2.NORM_HAMMING else cv2.CV_32F
+    distance, train_idx = cv2.batchDistance(desc1, desc2, dtype, normType=norm, K=k)
+    return train_idx, distance.astype(np.float32)
+
+
+def flann_knn_match(desc1, desc2, k=2, checks=50):
+    """
+    Approximate k nearest neighbours with FLANN as arrays: KD-tree for float
+    descriptors, LSH for binary ones (same parameters as in matching2.py).
+
+    Returns:
+        tuple: (train_idx, distance), both (len(desc1), k)
+    """
+    if desc2.dtype == np.uint8:
+        index_params = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+    else:
+        index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+    index = cv2.flann_Index(desc2, index_params)
+    train_idx, distance = index.knnSearch(desc1, k, params=dict(checks=checks))
+    distance = distance.astype(np.float32)
+    if desc2.dtype != np.uint8:
+        # The KD-tree returns squared L2 distances
+        np.sqrt(distance, out=distance)
+    return train_idx, distance
+
+
+def ratio_test(train_idx, distance, ratio=0.55):
+    """
+    Lowe's ratio test on knn results (k >= 2) as one vectorized comparison.
+
+    Returns:
+        MatchArrays: Nearest neighbour of every query that passes
+    """
+    keep = (distance[:, 0] < ratio * distance[:, 1]) & (train_idx[:, 1] >= 0)
+    query_idx = np.flatnonzero(keep)
+    return MatchArrays(query_idx, train_idx[keep, 0], distance[keep, 0])
+
+
+def nearest(train_idx, distance):
+    """
+    Nearest neighbour of every query (like matcher.match) from knn results.
+    """
+    keep = train_idx[:, 0] >= 0
+    return MatchArrays(np.flatnonzero(keep), train_idx[keep, 0], distance[keep, 0])
+
+
+def cross_check_match(desc1, desc2, norm=None):
+    """
+    Brute force matches that are mutual nearest neighbours, like
+    cv2.BFMatcher(norm, crossCheck=True).match.
+    """
+    norm = descriptor_norm(desc1) if norm is None else norm
+    dtype = cv2.CV_32S if norm == cv2.NORM_HAMMING else cv2.CV_32F
+    distance, train_idx = cv2.batchDistance(desc1, desc2, dtype, normType=norm, K=1, crosscheck=True)
+    return nearest(train_idx, distance.astype(np.float32))
@@ -1,12 +1,13 @@
 import sys
 import cv2
-import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
     QWidget, QFileDialog, QComboBox, QStatusBar
 )
 from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtCore import Qt, QEvent
+from descriptor_cache import DescriptorCache, image_key
+from match_arrays import cross_check_match, flann_knn_match, nearest
 
 
 class FeatureMatcherGUI(QMainWindow):
@@ -19,6 +20,11 @@ class FeatureMatcherGUI(QMainWindow):
         # Variables
         self.img1 = None
         self.img2 = None
+        self.img1_key = None
+        self.img2_key = None
+        
+        # Keypoints/descriptors per (image, method); switching the matcher doesn't detect again
+        self.descriptor_cache = DescriptorCache()
         
         # Main layout
         self.central_widget = QWidget()
@@ -92,9 +98,11 @@ class FeatureMatcherGUI(QMainWindow):
                 
                 if img_num == 1:
                     self.img1 = img
+                    self.img1_key = image_key(img)
                     self.show_image(img, self.img1_label)
                 else:
                     self.img2 = img
+                    self.img2_key = image_key(img)
                     self.show_image(img, self.img2_label)
                 
                 if self.img1 is not None and self.img2 is not None:
@@ -113,68 +121,36 @@ class FeatureMatcherGUI(QMainWindow):
         if self.img1 is None or self.img2 is None:
             return
             
-        # Convert to grayscale
-        gray1 = cv2.cvtColor(self.img1, cv2.COLOR_RGB2GRAY)
-        gray2 = cv2.cvtColor(self.img2, cv2.COLOR_RGB2GRAY)
-        
         method = self.method_combobox.currentText()
         matcher_type = self.matcher_combobox.currentText()
         
-        # Initialize feature detector
-        if method == "SIFT":
-            detector = cv2.SIFT_create()
-        elif method == "ORB":
-            detector = cv2.ORB_create(nfeatures=1000)
-        elif method == "AKAZE":
-            detector = cv2.AKAZE_create()
-        else:
-            detector = cv2.SIFT_create()
-        
-        # Detect keypoints and descriptors
-        kp1, desc1 = detector.detectAndCompute(gray1, None)
-        kp2, desc2 = detector.detectAndCompute(gray2, None)
+        # Keypoints and descriptors from the cache (detected tiled on all cores on the first request)
+        params = dict(nfeatures=1000) if method == "ORB" else {}
+        kp1, desc1 = self.descriptor_cache.features(self.img1, method, self.img1_key, **params)
+        kp2, desc2 = self.descriptor_cache.features(self.img2, method, self.img2_key, **params)
         
         if desc1 is None or desc2 is None:
             self.status_bar.showMessage("Fehler: Keine Features gefunden!")
             return
         
-        # Convert AKAZE descriptors for FLANN if needed
+        # Convert AKAZE descriptors for FLANN if needed (also cached)
         if method == "AKAZE" and matcher_type == "FLANN":
-            desc1 = np.float32(desc1)
-            desc2 = np.float32(desc2)
+            desc1 = self.descriptor_cache.float_descriptors(self.img1, method, self.img1_key, **params)
+            desc2 = self.descriptor_cache.float_descriptors(self.img2, method, self.img2_key, **params)
         
-        # Initialize matcher
+        # Match; results stay arrays until drawMatches
         if matcher_type == "BruteForce":
-            if method in ["SIFT", "AKAZE"]:
-                matcher = cv2.BFMatcher(cv2.NORM_L2, crossCheck=True)
-            else:
-                matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-            matches = matcher.match(desc1, desc2)
-            matches = sorted(matches, key=lambda x: x.distance)[:250]    # Keep only the best 50 matches
-            
-        else:  # FLANN
-            # Set FLANN parameters
-            if method in ["SIFT", "AKAZE"]:
-                FLANN_INDEX_KDTREE = 1
-                index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
-                search_params = dict(checks=50)
-            else:
-                FLANN_INDEX_LSH = 6
-                index_params = dict(algorithm=FLANN_INDEX_LSH,
-                                   table_number=6,
-                                   key_size=12,
-                                   multi_probe_level=1)
-                search_params = dict(checks=50)
-            
-            flann = cv2.FlannBasedMatcher(index_params, search_params)
-            matches = flann.match(desc1, desc2)
-            matches = sorted(matches, key=lambda x: x.distance)[:250]
+            norm = cv2.NORM_L2 if method in ["SIFT", "AKAZE"] else cv2.NORM_HAMMING
+            matches = cross_check_match(desc1, desc2, norm)
+        else:  # FLANN (KD-tree for float, LSH for binary descriptors)
+            matches = nearest(*flann_knn_match(desc1, desc2, k=1, checks=50))
+        matches = matches.best(250)    # Keep only the best 250 matches
         
         # Create result image
         result_img = cv2.drawMatches(
             self.img1, kp1,
             self.img2, kp2,
-            matches, None,
+            matches.to_dmatches(), None,
             flags=cv2.DrawMatchesFlags_NOT_DRAW_SINGLE_POINTS,
             matchColor=(0, 255, 0)
         )
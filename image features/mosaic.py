@@ -0,0 +1,444 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import cv2
+import numpy as np
+from numpy.lib.format import open_memmap
+from tiled_detect import detect_tiled
+from match_arrays import FLANN_INDEX_KDTREE, flann_knn_match, ratio_test
+from homography import find_homography
+from reference_library import list_images
+
+
+def translation(x, y):
+    return np.array([[1.0, 0.0, x], [0.0, 1.0, y], [0.0, 0.0, 1.0]])
+
+
+def feather_weights(height, width):
+    """
+    Blend weight of an image: 1 in the centre, falling linearly to ~0 at the
+    borders, so overlapping images fade into each other.
+    """
+    ramp_x = np.minimum(np.arange(1, width + 1), np.arange(width, 0, -1)) / (width / 2.0)
+    ramp_y = np.minimum(np.arange(1, height + 1), np.arange(height, 0, -1)) / (height / 2.0)
+    return np.outer(np.float32(ramp_y), np.float32(ramp_x))
+
+
+class ImageCache:
+    """
+    Thread-safe LRU of decoded images (BGR), bounded by max_bytes.
+
+    Neighbouring output tiles need mostly the same source images, so each
+    image is decoded once per pass over a tile row instead of once per tile.
+    """
+
+    def __init__(self, max_bytes=1024 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            img = self._images.get(path)
+            if img is not None:
+                self._images.move_to_end(path)
+                return img
+        # Decode outside the lock; two threads may occasionally read the same file
+        img = cv2.imread(path)
+        if img is None:
+            raise IOError(f"Could not read image: {path}")
+        with self._lock:
+            if path not in self._images:
+                self._images[path] = img
+                self.nbytes += img.nbytes
+                while self.nbytes > self.max_bytes and len(self._images) > 1:
+                    _, old = self._images.popitem(last=False)
+                    self.nbytes -= old.nbytes
+        return img
+
+
+class NpyTileWriter:
+    """
+    Writes tiles into a memory-mapped .npy file (height, width, 3) uint8 BGR.
+
+    Tiles cover disjoint regions, so threads can write in parallel. Only
+    written pages are backed by disk blocks; the file can be read lazily with
+    np.load(path, mmap_mode="r").
+    """
+
+    def __init__(self, path, width, height, tile_size):
+        self.path = path
+        self.array = open_memmap(path, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+
+    def write(self, x0, y0, tile):
+        self.array[y0:y0 + tile.shape[0], x0:x0 + tile.shape[1]] = tile
+
+    def close(self):
+        self.array.flush()
+        del self.array
+
+
+class DirectoryTileWriter:
+    """
+    Writes every tile as <row>_<col>.png into a directory, plus meta.json with
+    the canvas size and tile size. Empty tiles are not written.
+    """
+
+    def __init__(self, path, width, height, tile_size):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.tile_size = tile_size
+        self.meta = {"width": width, "height": height, "tile_size": tile_size}
+
+    def write(self, x0, y0, tile):
+        name = f"{y0 // self.tile_size}_{x0 // self.tile_size}.png"
+        cv2.imwrite(os.path.join(self.path, name), tile)
+
+    def close(self):
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+
+
+class Mosaic:
+    """
+    Mosaic of many overlapping images (e.g. survey shots).
+
+    1. SIFT features of every image on a downscaled copy (work_scale).
+    2. Match graph: candidate pairs from one FLANN index over the strongest
+       descriptors of all images (votes per image pair, like ReferenceLibrary),
+       then ratio test + findHomography per candidate pair; pairs with at
+       least min_inliers inliers become edges weighted by the inlier count.
+    3. Maximum spanning tree of the match graph; the homographies are chained
+       along the tree to the reference image.
+    4. Canvas bounds from the projected image corners.
+    5. The canvas is rendered in fixed-size tiles on a thread pool: each tile
+       warps only the images that overlap it (warpPerspective into the tile)
+       and blends them with feather weights. Tiles are written to disk as soon
+       as they are done, so the full canvas is never held in memory.
+
+    Usage:
+        mosaic = Mosaic(list_images("shots"))
+        mosaic.build()
+        mosaic.render("mosaic.npy")
+    """
+
+    def __init__(self, paths, work_scale=0.5, nfeatures=4000, ratio=0.7, estimator="RANSAC",
+                 threshold=5.0, min_inliers=30, candidates=6, vote_features=500, workers=None):
+        """
+        Args:
+            paths (list): Image files
+            work_scale (float): Scale of the copies used for feature detection
+            nfeatures (int): SIFT features per image
+            ratio (float): Lowe's ratio for pair matching
+            estimator (str): Key of homography.ESTIMATORS
+            threshold (float): Inlier threshold in full resolution pixels
+            min_inliers (int): Inliers needed for an edge of the match graph
+            candidates (int): Candidate partners per image that are verified
+            vote_features (int): Strongest descriptors per image used for the candidate votes
+            workers (int): Threads (default: all cores)
+        """
+        self.paths = list(paths)
+        self.work_scale = work_scale
+        self.nfeatures = nfeatures
+        self.ratio = ratio
+        self.estimator = estimator
+        self.threshold = threshold
+        self.min_inliers = min_inliers
+        self.candidates = candidates
+        self.vote_features = vote_features
+        self.workers = workers or os.cpu_count()
+
+        self.shapes = [None] * len(self.paths)
+        self.points = [None] * len(self.paths)
+        self.descriptors = [None] * len(self.paths)
+        self.edges = {}
+        self.reference = None
+        self.to_reference = {}
+        self.canvas_transforms = {}
+        self.bounds = {}
+        self.width = self.height = 0
+
+    def _detect(self, i):
+        gray = cv2.imread(self.paths[i], cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            print(f"Warning: Could not read {self.paths[i]}")
+            return
+        self.shapes[i] = gray.shape[:2]
+        if self.work_scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.work_scale, fy=self.work_scale, interpolation=cv2.INTER_AREA)
+        kp, desc = detect_tiled(gray, "SIFT", workers=1, nfeatures=self.nfeatures)
+        if desc is None or len(kp) < 4:
+            print(f"Warning: No features in {self.paths[i]}")
+            return
+        # Strongest first (for the candidate votes), points in full resolution
+        order = np.argsort([-k.response for k in kp], kind="stable")
+        self.points[i] = cv2.KeyPoint_convert(kp)[order] / self.work_scale
+        self.descriptors[i] = desc[order]
+
+    def detect(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self._detect, range(len(self.paths))))
+
+    def candidate_pairs(self, k=5, checks=32):
+        """
+        Image pairs worth verifying: every image votes with the k nearest
+        neighbours of its strongest descriptors in an index over all images,
+        and keeps its `candidates` partners with the most votes.
+
+        Returns:
+            list: Sorted (i, j) pairs with i < j
+        """
+        images = [i for i, d in enumerate(self.descriptors) if d is not None]
+        if len(images) <= self.candidates + 1:
+            return [(a, b) for n, a in enumerate(images) for b in images[n + 1:]]
+
+        sets = [self.descriptors[i][:self.vote_features] for i in images]
+        owner = np.concatenate([np.full(len(d), n, np.int32) for n, d in enumerate(sets)])
+        index = cv2.flann_Index(np.vstack(sets), dict(algorithm=FLANN_INDEX_KDTREE, trees=4))
+        votes = np.zeros((len(images), len(images)), np.int64)
+        for n, desc in enumerate(sets):
+            train_idx, _ = index.knnSearch(desc, k, params=dict(checks=checks))
+            hits = owner[train_idx[train_idx >= 0]]
+            votes[n] = np.bincount(hits, minlength=len(images))
+        np.fill_diagonal(votes, 0)
+        votes += votes.T
+
+        pairs = set()
+        for n in range(len(images)):
+            for m in np.argsort(-votes[n], kind="stable")[:self.candidates]:
+                if votes[n, m] > 0:
+                    pairs.add((images[min(n, m)], images[max(n, m)]))
+        return sorted(pairs)
+
+    def _verify(self, pair):
+        # Homography mapping image j into image i, with its inlier count
+        i, j = pair
+        # FLANN instead of brute force: a few hundred pairs with thousands of features each
+        train_idx, distance = flann_knn_match(self.descriptors[j], self.descriptors[i], k=2)
+        good = ratio_test(train_idx, distance, self.ratio)
+        good = good.best(len(good))
+        src, dst = good.points(self.points[j], self.points[i])
+        H, mask = find_homography(src, dst, self.estimator, self.threshold)
+        if H is None:
+            return pair, None, 0
+        return pair, H, int(mask.sum())
+
+    def match_graph(self):
+        """
+        Verify the candidate pairs on the thread pool.
+
+        Returns:
+            dict: (i, j) -> (H mapping j into i, inliers) for pairs with at least min_inliers
+        """
+        self.edges = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for (i, j), H, inliers in pool.map(self._verify, self.candidate_pairs()):
+                if H is not None and inliers >= self.min_inliers:
+                    self.edges[(i, j)] = (H, inliers)
+        return self.edges
+
+    def spanning_tree(self, reference=None):
+        """
+        Maximum spanning tree of the match graph (Kruskal on inlier counts)
+        and homographies of all connected images to the reference.
+
+        Args:
+            reference (int): Reference image; default: the image with the most
+                inliers to its tree neighbours in the largest component
+
+        Returns:
+            dict: image -> 3x3 homography into the reference image
+        """
+        parent = list(range(len(self.paths)))
+
+        def find(a):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            return a
+
+        neighbours = {}
+        for (i, j), (H, inliers) in sorted(self.edges.items(), key=lambda e: -e[1][1]):
+            ri, rj = find(i), find(j)
+            if ri == rj:
+                continue
+            parent[ri] = rj
+            # H maps j into i; the inverse maps i into j
+            neighbours.setdefault(i, []).append((j, H, inliers))
+            neighbours.setdefault(j, []).append((i, np.linalg.inv(H), inliers))
+
+        if reference is None:
+            if not neighbours:
+                reference = next(i for i, d in enumerate(self.descriptors) if d is not None)
+            else:
+                sizes = np.bincount([find(i) for i in neighbours])
+                largest = int(np.argmax(sizes))
+                reference = max((i for i in neighbours if find(i) == largest),
+                                key=lambda i: sum(w for _, _, w in neighbours[i]))
+        self.reference = reference
+
+        # Chain the homographies from the reference outwards
+        self.to_reference = {reference: np.eye(3)}
+        queue = deque([reference])
+        while queue:
+            i = queue.popleft()
+            for j, H, _ in neighbours.get(i, []):
+                if j not in self.to_reference:
+                    self.to_reference[j] = self.to_reference[i] @ H
+                    queue.append(j)
+
+        skipped = [self.paths[i] for i, d in enumerate(self.descriptors)
+                   if d is not None and i not in self.to_reference]
+        if skipped:
+            print(f"Warning: {len(skipped)} images not connected to the reference: {', '.join(skipped)}")
+        return self.to_reference
+
+    def canvas(self):
+        """
+        Canvas size and per image transform into canvas pixels and bounding box.
+        Images whose corners would be projected behind the camera (degenerate
+        chained homography) are left out.
+
+        Returns:
+            tuple: (width, height)
+        """
+        corners = {}
+        for i, H in self.to_reference.items():
+            height, width = self.shapes[i]
+            c = np.float64([[0, 0, 1], [width, 0, 1], [width, height, 1], [0, height, 1]]) @ H.T
+            if np.any(c[:, 2] <= 1e-8):
+                print(f"Warning: Degenerate homography for {self.paths[i]}, skipped")
+                continue
+            corners[i] = c[:, :2] / c[:, 2:]
+        if not corners:
+            raise ValueError("No image could be placed")
+        points = np.vstack(list(corners.values()))
+        x_min, y_min = np.floor(points.min(axis=0))
+        x_max, y_max = np.ceil(points.max(axis=0))
+        self.width, self.height = int(x_max - x_min), int(y_max - y_min)
+
+        offset = translation(-x_min, -y_min)
+        self.canvas_transforms, self.bounds = {}, {}
+        for i, c in corners.items():
+            self.canvas_transforms[i] = offset @ self.to_reference[i]
+            c = c - (x_min, y_min)
+            self.bounds[i] = (*np.floor(c.min(axis=0)).astype(int), *np.ceil(c.max(axis=0)).astype(int))
+        return self.width, self.height
+
+    def build(self, reference=None):
+        """
+        Features, match graph, spanning tree and canvas; prints the timing of every step.
+        """
+        steps = (("features", self.detect), ("match graph", self.match_graph),
+                 ("spanning tree", lambda: self.spanning_tree(reference)), ("canvas", self.canvas))
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            print(f"{name}: {time.perf_counter() - start:.2f}s")
+        print(f"{len(self.edges)} edges, {len(self.canvas_transforms)}/{len(self.paths)} images placed, "
+              f"canvas {self.width}x{self.height}, reference {self.paths[self.reference]}")
+
+    def render_region(self, x0, y0, x1, y1, scale=1.0, cache=None, weights=None):
+        """
+        Blend of all images overlapping a canvas region.
+
+        Args:
+            x0, y0, x1, y1 (int): Region in canvas pixels
+            scale (float): Output scale (e.g. for a preview of the whole canvas)
+            cache (ImageCache): Decoded source images
+            weights (dict): Feather weights per image shape (filled on demand)
+
+        Returns:
+            np.ndarray: uint8 BGR region, or None if no image overlaps it
+        """
+        cache = cache if cache is not None else ImageCache()
+        weights = weights if weights is not None else {}
+        size = (max(1, int(round((x1 - x0) * scale))), max(1, int(round((y1 - y0) * scale))))
+        region = np.diag([scale, scale, 1.0]) @ translation(-x0, -y0)
+        acc = weight_sum = None
+        for i, (bx0, by0, bx1, by1) in self.bounds.items():
+            if bx1 <= x0 or bx0 >= x1 or by1 <= y0 or by0 >= y1:
+                continue
+            img = cache.get(self.paths[i])
+            shape = img.shape[:2]
+            if shape not in weights:
+                weights[shape] = feather_weights(*shape)
+            M = region @ self.canvas_transforms[i]
+            warped = cv2.warpPerspective(img, M, size, flags=cv2.INTER_LINEAR)
+            weight = cv2.warpPerspective(weights[shape], M, size, flags=cv2.INTER_LINEAR)
+            if acc is None:
+                acc = np.zeros((size[1], size[0], 3), np.float32)
+                weight_sum = np.zeros((size[1], size[0]), np.float32)
+            acc += warped * weight[:, :, None]
+            weight_sum += weight
+        if acc is None:
+            return None
+        acc /= np.maximum(weight_sum, 1e-6)[:, :, None]
+        return np.uint8(np.clip(acc + 0.5, 0, 255))
+
+    def render(self, output, tile_size=1024, cache_bytes=1024 * 2**20):
+        """
+        Render the canvas tile by tile on the thread pool.
+
+        Args:
+            output (str): .npy file (memory-mapped array) or a directory of PNG tiles
+            tile_size (int): Edge length of the output tiles
+            cache_bytes (int): Memory for decoded source images
+
+        Returns:
+            int: Number of non-empty tiles written
+        """
+        writer_class = NpyTileWriter if output.lower().endswith(".npy") else DirectoryTileWriter
+        writer = writer_class(output, self.width, self.height, tile_size)
+        cache = ImageCache(cache_bytes)
+        # Feather weights per image shape, created once and shared by all threads
+        weights = {}
+        for i in self.bounds:
+            if self.shapes[i] not in weights:
+                weights[self.shapes[i]] = feather_weights(*self.shapes[i])
+        tiles = [(x0, y0, min(x0 + tile_size, self.width), min(y0 + tile_size, self.height))
+                 for y0 in range(0, self.height, tile_size) for x0 in range(0, self.width, tile_size)]
+
+        def process(tile):
+            img = self.render_region(*tile, cache=cache, weights=weights)
+            if img is None:
+                return False
+            writer.write(tile[0], tile[1], img)
+            return True
+
+        start = time.perf_counter()
+        written = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for n, future in enumerate(as_completed([pool.submit(process, t) for t in tiles]), 1):
+                written += future.result()
+                if n % 50 == 0 or n == len(tiles):
+                    print(f"Tiles {n}/{len(tiles)} ({time.perf_counter() - start:.1f}s)")
+        writer.close()
+        return written
+
+    def preview(self, max_side=1200):
+        """
+        The whole mosaic downscaled to at most max_side pixels (BGR).
+        """
+        scale = min(1.0, max_side / float(max(self.width, self.height)))
+        img = self.render_region(0, 0, self.width, self.height, scale)
+        return img if img is not None else np.zeros((1, 1, 3), np.uint8)
+
+
+if __name__ == "__main__":
+    # Example usage:
+    #   python mosaic.py shots/ mosaic.npy     (memory-mapped array)
+    #   python mosaic.py shots/ mosaic_tiles   (directory of PNG tiles)
+    if len(sys.argv) < 3:
+        print("Usage: python mosaic.py <image dir> <output.npy | output dir> [tile size]")
+    else:
+        mosaic = Mosaic(list_images(sys.argv[1]))
+        mosaic.build()
+        start = time.perf_counter()
+        tiles = mosaic.render(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 1024)
+        print(f"{tiles} tiles written in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,303 @@
+import sys
+import time
+import cv2
+import numpy as np
+from match_arrays import FLANN_INDEX_KDTREE, ratio_test
+from homography import find_homography, reprojection_error, select_spread
+
+
+class PlanarTracker:
+    """
+    Homography from a planar reference image to every frame of a video.
+
+    The first frame (and every frame after the target was lost) goes through
+    the transform.py path: SIFT on the frame, matching against the reference,
+    robust homography. The inliers are then followed from frame to frame with
+    pyramidal LK optical flow (as MotionEstimator in video/stabilize.py), and
+    the homography is estimated from the tracked points and their fixed
+    reference positions, so errors don't accumulate over the frames.
+
+    SIFT re-detection runs only when tracking gets weak: fewer than
+    min_inliers tracked inliers or an inlier reprojection error above
+    max_error pixels.
+
+    Usage:
+        tracker = PlanarTracker(cv2.imread("target.png", cv2.IMREAD_GRAYSCALE))
+        for frame in frames:
+            H, mode = tracker.update(frame)
+    """
+
+    def __init__(self, reference, estimator="RANSAC", threshold=3.0, ratio=0.7, min_inliers=25,
+                 max_error=2.0, max_points=100, grid=10, tracking=True, win_size=15, max_level=3):
+        """
+        Args:
+            reference (np.ndarray): Grayscale image of the planar target
+            estimator (str): Key of homography.ESTIMATORS for the detection step
+            threshold (float): Inlier threshold in frame pixels
+            ratio (float): Lowe's ratio for matching against the reference
+            min_inliers (int): Re-detect when fewer tracked points are inliers
+            max_error (float): Re-detect when the RMS reprojection error of the inliers is larger
+            max_points (int): Tracked points, picked spread over the target
+            grid (int): Grid for spreading the tracked points (grid x grid cells)
+            tracking (bool): False = SIFT detection on every frame (the transform.py behaviour)
+            win_size (int): LK window size
+            max_level (int): LK pyramid levels
+        """
+        self.estimator = estimator
+        self.threshold = threshold
+        self.ratio = ratio
+        self.min_inliers = min_inliers
+        self.max_error = max_error
+        self.max_points = max_points
+        self.grid = grid
+        self.tracking = tracking
+        self.win_size = (win_size, win_size)
+        self.max_level = max_level
+        # The tracked points are previous inliers, so a fast USAC variant suffices
+        self.track_method = getattr(cv2, "USAC_FAST", cv2.RANSAC)
+
+        # Reference features and their FLANN index are computed once
+        self.sift = cv2.SIFT_create()
+        self.reference_shape = reference.shape[:2]
+        kp, self.reference_desc = self.sift.detectAndCompute(reference, None)
+        if self.reference_desc is None or len(kp) < 4:
+            raise ValueError("Not enough features in the reference image")
+        self.reference_pts = cv2.KeyPoint_convert(kp)
+        self.index = cv2.flann_Index(self.reference_desc, dict(algorithm=FLANN_INDEX_KDTREE, trees=5))
+
+        self.prev_gray = None
+        self.ref_pts = None
+        self.curr_pts = None
+        self.H = None
+        self.inliers = 0
+        self.error = float("nan")
+        self.redetections = 0
+
+    def _to_gray(self, frame):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    def _keep_tracks(self, ref_pts, curr_pts, mask):
+        # Inliers become the tracks for the next frame, at most max_points spread over the target
+        keep = mask.ravel() > 0
+        ref_pts, curr_pts = ref_pts[keep].reshape(-1, 2), curr_pts[keep].reshape(-1, 2)
+        if len(ref_pts) > self.max_points:
+            idx = select_spread(ref_pts, self.reference_shape, self.grid,
+                                per_cell=max(1, self.max_points // (self.grid * self.grid)))
+            ref_pts, curr_pts = ref_pts[idx], curr_pts[idx]
+        self.ref_pts = np.float32(ref_pts).reshape(-1, 1, 2)
+        self.curr_pts = np.float32(curr_pts).reshape(-1, 1, 2)
+
+    def detect(self, gray):
+        """
+        Homography from SIFT matches between the reference and the frame.
+
+        Returns:
+            bool: True if the target was found
+        """
+        self.redetections += 1
+        kp, desc = self.sift.detectAndCompute(gray, None)
+        self.H, self.inliers, self.ref_pts, self.curr_pts = None, 0, None, None
+        if desc is None or len(kp) < 4:
+            return False
+        train_idx, distance = self.index.knnSearch(desc, 2, params=dict(checks=50))
+        # The KD-tree returns squared L2 distances
+        good = ratio_test(train_idx, np.sqrt(np.float32(distance)), self.ratio)
+        good = good.best(len(good))
+        ref_pts = np.float32(self.reference_pts[good.train_idx]).reshape(-1, 1, 2)
+        curr_pts = np.float32(cv2.KeyPoint_convert(kp)[good.query_idx]).reshape(-1, 1, 2)
+        H, mask = find_homography(ref_pts, curr_pts, self.estimator, self.threshold)
+        if H is None or mask.sum() < self.min_inliers:
+            return False
+        self.H, self.inliers = H, int(mask.sum())
+        self.error = reprojection_error(H, ref_pts, curr_pts, mask)
+        self._keep_tracks(ref_pts, curr_pts, mask)
+        return True
+
+    def track(self, gray):
+        """
+        Follow the tracked points with LK and update the homography from them.
+
+        Returns:
+            bool: True if tracking is still good (inliers and reprojection error)
+        """
+        if self.curr_pts is None or len(self.curr_pts) < 4:
+            return False
+        curr_pts, status, _ = cv2.calcOpticalFlowPyrLK(
+            self.prev_gray, gray, self.curr_pts, None, winSize=self.win_size, maxLevel=self.max_level,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+        found = status.ravel() == 1
+        if found.sum() < self.min_inliers:
+            return False
+        ref_pts, curr_pts = self.ref_pts[found], curr_pts[found]
+        H, mask = cv2.findHomography(ref_pts, curr_pts, self.track_method, self.threshold)
+        if H is None:
+            return False
+        self.inliers = int(mask.sum())
+        self.error = reprojection_error(H, ref_pts, curr_pts, mask)
+        if self.inliers < self.min_inliers or self.error > self.max_error:
+            return False
+        self.H = H
+        self._keep_tracks(ref_pts, curr_pts, mask)
+        return True
+
+    def update(self, frame):
+        """
+        Args:
+            frame (np.ndarray): Next BGR or grayscale frame
+
+        Returns:
+            tuple: (H reference -> frame or None, mode) with mode "track", "detect" or "lost"
+        """
+        gray = self._to_gray(frame)
+        if self.tracking and self.prev_gray is not None and self.track(gray):
+            mode = "track"
+        elif self.detect(gray):
+            mode = "detect"
+        else:
+            mode = "lost"
+        self.prev_gray = gray
+        return self.H, mode
+
+
+def draw_overlay(frame, H, overlay=None, reference_shape=None):
+    """
+    Draw the tracked target into the frame: the overlay image warped with H,
+    or the outline of the reference if no overlay is given.
+    """
+    if H is None:
+        return frame
+    if overlay is not None:
+        height, width = frame.shape[:2]
+        warped = cv2.warpPerspective(overlay, H, (width, height))
+        mask = cv2.warpPerspective(np.full(overlay.shape[:2], 255, np.uint8), H, (width, height))
+        cv2.copyTo(warped, mask, frame)
+    else:
+        h, w = reference_shape
+        corners = cv2.perspectiveTransform(np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2), H)
+        cv2.polylines(frame, [np.int32(corners)], True, (0, 255, 0), 3)
+    return frame
+
+
+def track_video(reference_path, input_video, output_video=None, overlay_path=None, tracking=True):
+    """
+    Track a planar target through a video and print per-frame latency.
+
+    Args:
+        reference_path (str): Image of the planar target
+        input_video (str): Video file
+        output_video (str): Optional output with the overlay drawn
+        overlay_path (str): Image warped onto the target (default: outline only)
+        tracking (bool): False = SIFT detection on every frame
+    """
+    reference = cv2.imread(reference_path, cv2.IMREAD_GRAYSCALE)
+    if reference is None:
+        print(f"Error: Could not read {reference_path}")
+        return
+    overlay = cv2.imread(overlay_path) if overlay_path else None
+    if overlay is not None:
+        overlay = cv2.resize(overlay, (reference.shape[1], reference.shape[0]))
+
+    cap = cv2.VideoCapture(input_video)
+    if not cap.isOpened():
+        print("Error opening video file")
+        return
+    out = None
+    if output_video:
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        out = cv2.VideoWriter(output_video, cv2.VideoWriter_fourcc(*'mp4v'), cap.get(cv2.CAP_PROP_FPS), (width, height))
+
+    tracker = PlanarTracker(reference, tracking=tracking)
+    latency, modes = [], []
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        start = time.perf_counter()
+        H, mode = tracker.update(frame)
+        latency.append(time.perf_counter() - start)
+        modes.append(mode)
+        if out is not None:
+            out.write(draw_overlay(frame, H, overlay, reference.shape[:2]))
+    cap.release()
+    if out is not None:
+        out.release()
+    print_latency(latency, modes)
+
+
+def print_latency(latency, modes):
+    latency = 1000 * np.array(latency)
+    tracked = np.array([m == "track" for m in modes])
+    print(f"{len(latency)} frames: median {np.median(latency):.1f} ms, mean {latency.mean():.1f} ms "
+          f"({1000 / latency.mean():.0f} fps), {modes.count('detect')} detections, {modes.count('lost')} lost")
+    if tracked.any():
+        print(f"  tracked frames: median {np.median(latency[tracked]):.1f} ms, "
+              f"95th percentile {np.percentile(latency[tracked], 95):.1f} ms")
+
+
+def synthetic_video(reference, frames=120, size=(1280, 720), seed=0):
+    """
+    Frames with the reference moving smoothly over a noisy background, and the
+    true homography reference -> frame of every frame.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    h, w = reference.shape[:2]
+    background = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (0, 0), 3)
+    src = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    scale = 0.6 * min(width / w, height / h)
+    video, truth = [], []
+    for t in range(frames):
+        phase = 2 * np.pi * t / frames
+        center = np.array([width / 2 + 0.15 * width * np.sin(phase), height / 2 + 0.1 * height * np.sin(2 * phase)])
+        angle = 0.2 * np.sin(phase)
+        R = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        dst = (src - (w / 2, h / 2)) * scale @ R.T + center
+        # Perspective: one side of the target moves towards the camera
+        dst[1:3, 1] += np.array([-1, 1]) * 0.04 * h * scale * np.sin(phase)
+        H = cv2.getPerspectiveTransform(src, np.float32(dst))
+        frame = cv2.warpPerspective(reference, H, size, dst=background.copy(), borderMode=cv2.BORDER_TRANSPARENT)
+        noise = rng.normal(0, 2, frame.shape)
+        video.append(np.uint8(np.clip(frame + noise, 0, 255)))
+        truth.append(H)
+    return video, truth
+
+
+def benchmark_tracker(reference_path, frames=120, size=(1280, 720)):
+    """
+    Latency and corner error of track mode against SIFT on every frame, on a
+    synthetic video with known homographies.
+    """
+    reference = cv2.imread(reference_path, cv2.IMREAD_GRAYSCALE)
+    if reference is None:
+        print(f"Error: Could not read {reference_path}")
+        return
+    video, truth = synthetic_video(reference, frames, size)
+    h, w = reference.shape[:2]
+    corners = np.float32([[0, 0], [w, 0], [w, h], [0, h]]).reshape(-1, 1, 2)
+    print(f"{frames} frames {size[0]}x{size[1]}, reference {w}x{h}")
+    for tracking in (False, True):
+        tracker = PlanarTracker(reference, tracking=tracking)
+        latency, modes, errors = [], [], []
+        for frame, H_true in zip(video, truth):
+            start = time.perf_counter()
+            H, mode = tracker.update(frame)
+            latency.append(time.perf_counter() - start)
+            modes.append(mode)
+            if H is not None:
+                diff = cv2.perspectiveTransform(corners, H) - cv2.perspectiveTransform(corners, H_true)
+                errors.append(np.linalg.norm(diff, axis=2).mean())
+        print("track + redetect" if tracking else "detect every frame")
+        print_latency(latency, modes)
+        print(f"  corner error: mean {np.mean(errors):.2f} px, max {np.max(errors):.2f} px")
+
+
+if __name__ == "__main__":
+    # Example usage:
+    #   python planar_tracker.py target.png video.mp4 [output.mp4] [overlay.png]
+    #   python planar_tracker.py target.png     (benchmark on a synthetic 720p video)
+    if len(sys.argv) == 2:
+        benchmark_tracker(sys.argv[1])
+    elif len(sys.argv) >= 3:
+        track_video(sys.argv[1], sys.argv[2], *sys.argv[3:5])
+    else:
+        print("Usage: python planar_tracker.py reference.png [video [output [overlay]]]")
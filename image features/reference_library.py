@@ -0,0 +1,181 @@
+import json
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from tiled_detect import detect_tiled
+from match_arrays import FLANN_INDEX_KDTREE, FLANN_INDEX_LSH, ratio_test
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+
+class ReferenceLibrary:
+    """
+    One FLANN index over the descriptors of all reference images.
+
+    Incoming frames are matched against the whole library with a single knn
+    search; every descriptor that passes the ratio test votes for the reference
+    image it came from. The library is saved as a directory:
+
+        meta.json        method, detector parameters, reference names
+        descriptors.npy  all reference descriptors (row i belongs to owner[i])
+        owner.npy        reference index per descriptor row
+        index.flann      the KD-tree (SIFT/AKAZE)
+
+    KD-trees are loaded from index.flann instead of being rebuilt. LSH indices
+    (ORB) are rebuilt when loading, because OpenCV can't load a saved LSH
+    index; hashing the descriptors again takes well under a second for
+    a million descriptors.
+
+    Usage:
+        library = ReferenceLibrary("SIFT")
+        library.build(reference_files)
+        library.save("library")
+        ...
+        library = ReferenceLibrary.load("library")
+        name, counts = library.query_image("frame.png")
+    """
+
+    def __init__(self, method="SIFT", **params):
+        """
+        Args:
+            method (str): "SIFT", "AKAZE" (KD-tree on float32 descriptors) or "ORB" (LSH)
+            **params: Detector parameters, e.g. nfeatures=2000 for ORB
+        """
+        self.method = method
+        self.params = params
+        self.names = []
+        self.descriptors = None
+        self.owner = None
+        self.index = None
+
+    @property
+    def binary(self):
+        return self.method == "ORB"
+
+    def index_params(self):
+        if self.binary:
+            return dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+        return dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+
+    def compute(self, image):
+        """
+        Descriptors of an image (file name or grayscale array), in the index dtype.
+        """
+        gray = cv2.imread(image, cv2.IMREAD_GRAYSCALE) if isinstance(image, str) else image
+        if gray is None:
+            raise IOError(f"Could not read image: {image}")
+        _, desc = detect_tiled(gray, self.method, **self.params)
+        if desc is not None and not self.binary:
+            desc = np.float32(desc)
+        return desc
+
+    def build(self, references):
+        """
+        Detect all reference images and build the index.
+
+        Args:
+            references (list): Image file names; the names identify the references in query results
+        """
+        names, descriptors, owner = [], [], []
+        for path in references:
+            desc = self.compute(path)
+            if desc is None:
+                print(f"Warning: No features in {path}")
+                continue
+            owner.append(np.full(len(desc), len(names), np.int32))
+            descriptors.append(desc)
+            names.append(path)
+        if not descriptors:
+            raise ValueError("No reference image with features")
+        self.names = names
+        self.descriptors = np.vstack(descriptors)
+        self.owner = np.concatenate(owner)
+        self.index = cv2.flann_Index(self.descriptors, self.index_params())
+
+    def save(self, library_dir):
+        os.makedirs(library_dir, exist_ok=True)
+        np.save(os.path.join(library_dir, "descriptors.npy"), self.descriptors)
+        np.save(os.path.join(library_dir, "owner.npy"), self.owner)
+        if not self.binary:
+            self.index.save(os.path.join(library_dir, "index.flann"))
+        with open(os.path.join(library_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"method": self.method, "params": self.params, "names": self.names}, f, indent=2)
+
+    @classmethod
+    def load(cls, library_dir):
+        with open(os.path.join(library_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        library = cls(meta["method"], **meta["params"])
+        library.names = meta["names"]
+        library.descriptors = np.load(os.path.join(library_dir, "descriptors.npy"))
+        library.owner = np.load(os.path.join(library_dir, "owner.npy"))
+        if library.binary:
+            library.index = cv2.flann_Index(library.descriptors, library.index_params())
+        else:
+            library.index = cv2.flann_Index()
+            if not library.index.load(library.descriptors, os.path.join(library_dir, "index.flann")):
+                raise IOError(f"Could not load {library_dir}/index.flann")
+        return library
+
+    def query(self, desc, ratio=0.7, checks=50):
+        """
+        Match query descriptors against the library.
+
+        Args:
+            desc (np.ndarray): Query descriptors (see compute)
+            ratio (float): Lowe's ratio over the two nearest library descriptors
+            checks (int): FLANN search effort
+
+        Returns:
+            tuple: (name of the best reference or None, good match count per reference)
+        """
+        counts = np.zeros(len(self.names), np.int64)
+        if desc is None or len(desc) == 0:
+            return None, counts
+        train_idx, distance = self.index.knnSearch(desc, 2, params=dict(checks=checks))
+        distance = distance.astype(np.float32)
+        if not self.binary:
+            # The KD-tree returns squared L2 distances
+            np.sqrt(distance, out=distance)
+        good = ratio_test(train_idx, distance, ratio)
+        counts += np.bincount(self.owner[good.train_idx], minlength=len(self.names))
+        best = int(np.argmax(counts))
+        return (self.names[best] if counts[best] > 0 else None), counts
+
+    def query_image(self, image, ratio=0.7, checks=50):
+        """
+        Best reference for an image file or grayscale array, see query.
+        """
+        return self.query(self.compute(image), ratio, checks)
+
+
+def list_images(directory):
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                  if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+if __name__ == "__main__":
+    # Example usage:
+    #   python reference_library.py build references/ library [SIFT|ORB|AKAZE]
+    #   python reference_library.py query library frames/
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        start = time.perf_counter()
+        library = ReferenceLibrary(sys.argv[4] if len(sys.argv) > 4 else "SIFT")
+        library.build(list_images(sys.argv[2]))
+        library.save(sys.argv[3])
+        print(f"{len(library.names)} references, {len(library.descriptors)} descriptors "
+              f"in {time.perf_counter() - start:.1f}s")
+    elif len(sys.argv) == 4 and sys.argv[1] == "query":
+        start = time.perf_counter()
+        library = ReferenceLibrary.load(sys.argv[2])
+        print(f"Library loaded in {time.perf_counter() - start:.2f}s")
+        for path in list_images(sys.argv[3]):
+            start = time.perf_counter()
+            name, counts = library.query_image(path)
+            print(f"{os.path.basename(path)}: {name} ({counts.max()} matches, "
+                  f"{1000 * (time.perf_counter() - start):.0f} ms)")
+    else:
+        print("Usage: python reference_library.py build <reference dir> <library dir> [method]")
+        print("       python reference_library.py query <library dir> <image dir>")
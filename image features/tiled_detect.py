@@ -0,0 +1,155 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from detectors import create_detector
+
+
+def tile_grid(width, height, tile_size, overlap):
+    """
+    Overlapping tiles covering an image.
+
+    Every pixel belongs to the core of exactly one tile; the tile itself extends
+    the core by `overlap` pixels on every side (clipped to the image), so the
+    detector sees enough context around keypoints near the core border.
+
+    Returns:
+        list: (x0, y0, x1, y1, cx0, cy0, cx1, cy1) per tile: tile and core rectangle
+    """
+    tiles = []
+    for cy0 in range(0, height, tile_size):
+        cy1 = min(cy0 + tile_size, height)
+        for cx0 in range(0, width, tile_size):
+            cx1 = min(cx0 + tile_size, width)
+            tiles.append((max(0, cx0 - overlap), max(0, cy0 - overlap),
+                          min(width, cx1 + overlap), min(height, cy1 + overlap),
+                          cx0, cy0, cx1, cy1))
+    return tiles
+
+
+def detect_tiled(gray, method="SIFT", compute=True, tile_size=2048, overlap=64, workers=None, **params):
+    """
+    Feature detection on overlapping tiles with a thread pool.
+
+    Each thread creates its own detector once. Keypoints are shifted back to
+    image coordinates, and a keypoint is kept only by the tile whose core
+    contains it, so detections in the overlaps are not duplicated. If params
+    contain nfeatures (ORB, SIFT), the strongest nfeatures keypoints of the
+    whole image are kept, like for a single detector call.
+
+    Images not larger than one tile are processed with a single call.
+
+    Args:
+        gray (np.ndarray): Grayscale image
+        method (str): "SIFT", "ORB" or "AKAZE"
+        compute (bool): Compute descriptors (detectAndCompute) or only detect
+        tile_size (int): Core size of a tile in pixels
+        overlap (int): Context around the core; should exceed the descriptor radius
+        workers (int): Number of threads (default: all cores)
+        **params: Parameters for the detector's create function
+
+    Returns:
+        tuple: (keypoints, descriptors) like detector.detectAndCompute, or the
+            keypoint list only if compute is False
+    """
+    height, width = gray.shape[:2]
+    if width <= tile_size and height <= tile_size:
+        detector = create_detector(method, **params)
+        return detector.detectAndCompute(gray, None) if compute else detector.detect(gray, None)
+
+    # Per tile a share of the feature budget by core area, with headroom for
+    # tiles with more structure than average; the global budget is applied below
+    nfeatures = params.get("nfeatures", 0)
+    tile_params = dict(params)
+    if nfeatures:
+        share = min(1.0, tile_size * tile_size / float(width * height))
+        tile_params["nfeatures"] = max(1, int(np.ceil(2 * nfeatures * share)))
+
+    local = threading.local()
+
+    def process(tile):
+        x0, y0, x1, y1, cx0, cy0, cx1, cy1 = tile
+        if not hasattr(local, "detector"):
+            local.detector = create_detector(method, **tile_params)
+        roi = gray[y0:y1, x0:x1]
+        if compute:
+            kps, desc = local.detector.detectAndCompute(roi, None)
+        else:
+            kps, desc = local.detector.detect(roi, None), None
+        kept = []
+        for i, kp in enumerate(kps):
+            x, y = kp.pt[0] + x0, kp.pt[1] + y0
+            if cx0 <= x < cx1 and cy0 <= y < cy1:
+                kp.pt = (x, y)
+                kept.append(i)
+        return [kps[i] for i in kept], (desc[kept] if desc is not None and kept else None)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        results = list(pool.map(process, tile_grid(width, height, tile_size, overlap)))
+
+    keypoints = [kp for kps, _ in results for kp in kps]
+    descriptors = [desc for _, desc in results if desc is not None]
+    descriptors = np.vstack(descriptors) if descriptors else None
+
+    # Feature budget for the whole image, not per tile
+    if nfeatures and len(keypoints) > nfeatures:
+        response = np.array([kp.response for kp in keypoints], np.float32)
+        best = np.sort(np.argpartition(-response, nfeatures - 1)[:nfeatures])
+        keypoints = [keypoints[i] for i in best]
+        if descriptors is not None:
+            descriptors = descriptors[best]
+
+    return (keypoints, descriptors) if compute else keypoints
+
+
+def benchmark_tiled(image_path, methods=("SIFT", "ORB", "AKAZE"), tile_size=2048, overlap=64, workers=None):
+    """
+    Compare tiled detection with a single detectAndCompute call.
+
+    Prints time, keypoint count and the share of tiled keypoints that the
+    single call also found (within 1 pixel).
+    """
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        print(f"Error: Could not read {image_path}")
+        return
+    print(f"{image_path}: {gray.shape[1]}x{gray.shape[0]}, tiles {tile_size}+{overlap}, "
+          f"{workers or os.cpu_count()} threads")
+    for method in methods:
+        params = dict(nfeatures=20000) if method == "ORB" else {}
+        try:
+            create_detector(method, **params)
+        except (AttributeError, cv2.error):
+            print(f"  {method:6s} not available in this OpenCV build")
+            continue
+
+        start = time.perf_counter()
+        kp_single, _ = create_detector(method, **params).detectAndCompute(gray, None)
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        kp_tiled, _ = detect_tiled(gray, method, tile_size=tile_size, overlap=overlap,
+                                   workers=workers, **params)
+        tiled_time = time.perf_counter() - start
+
+        found = 0.0
+        if kp_single and kp_tiled:
+            matcher = cv2.BFMatcher(cv2.NORM_L2)
+            pts_single = cv2.KeyPoint_convert(kp_single)
+            pts_tiled = cv2.KeyPoint_convert(kp_tiled)
+            nearest = matcher.match(pts_tiled, pts_single)
+            found = np.mean([m.distance <= 1.0 for m in nearest])
+        print(f"  {method:6s} single {single_time:6.2f}s {len(kp_single):7d} kps | "
+              f"tiled {tiled_time:6.2f}s {len(kp_tiled):7d} kps | "
+              f"speedup {single_time / tiled_time:4.2f}x | {100 * found:5.1f}% also in single")
+
+
+if __name__ == "__main__":
+    # Example usage: python tiled_detect.py image.jpg [tile_size]
+    if len(sys.argv) < 2:
+        print("Usage: python tiled_detect.py image.jpg [tile_size]")
+    else:
+        benchmark_tiled(sys.argv[1], tile_size=int(sys.argv[2]) if len(sys.argv) > 2 else 2048)
@@ -1,8 +1,12 @@
 import cv2
-import numpy as np
-from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QLabel, QFileDialog, QVBoxLayout, QHBoxLayout, QWidget
+from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QLabel, QFileDialog, QVBoxLayout, QHBoxLayout, QWidget, QComboBox
 from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtCore import Qt
+from match_arrays import knn_match, ratio_test
+from descriptor_cache import DescriptorCache, image_key
+from homography import ESTIMATORS, find_homography, homography_coarse_to_fine
+from mosaic import Mosaic
+from reference_library import list_images
 
 class HomographyApp(QMainWindow):
     def __init__(self):
@@ -15,6 +19,11 @@ class HomographyApp(QMainWindow):
         self.img1_gray = None
         self.img2_gray = None
         self.result_img = None
+        self.img1_key = None
+        self.img2_key = None
+        
+        # SIFT features per image; repeated transforms don't detect again
+        self.descriptor_cache = DescriptorCache()
         
         # GUI elements
         self.init_ui()
@@ -35,11 +44,26 @@ class HomographyApp(QMainWindow):
         self.btn_load2.clicked.connect(self.load_image2)
         self.button_layout.addWidget(self.btn_load2)
         
+        # Mode: full resolution SIFT or coarse-to-fine (fast on large images)
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(["Full", "Coarse-to-fine"])
+        self.button_layout.addWidget(self.mode_combo)
+        
+        # Robust estimator of findHomography
+        self.estimator_combo = QComboBox()
+        self.estimator_combo.addItems(list(ESTIMATORS))
+        self.button_layout.addWidget(self.estimator_combo)
+        
         self.btn_transform = QPushButton("Transform")
         self.btn_transform.setEnabled(False)
         self.btn_transform.clicked.connect(self.compute_homography)
         self.button_layout.addWidget(self.btn_transform)
         
+        # Mosaic of a whole directory, written to disk tile by tile
+        self.btn_mosaic = QPushButton("Build Mosaic")
+        self.btn_mosaic.clicked.connect(self.build_mosaic)
+        self.button_layout.addWidget(self.btn_mosaic)
+        
         self.main_layout.addLayout(self.button_layout)
         
         # Image layout (side by side)
@@ -66,6 +90,7 @@ class HomographyApp(QMainWindow):
         if file_path:
             self.img1 = cv2.imread(file_path)
             self.img1_gray = cv2.cvtColor(self.img1, cv2.COLOR_BGR2GRAY)
+            self.img1_key = image_key(self.img1_gray)
             self.display_image(self.img1, self.label_img1)
             self.check_images_loaded()
     
@@ -74,6 +99,7 @@ class HomographyApp(QMainWindow):
         if file_path:
             self.img2 = cv2.imread(file_path)
             self.img2_gray = cv2.cvtColor(self.img2, cv2.COLOR_BGR2GRAY)
+            self.img2_key = image_key(self.img2_gray)
             self.display_image(self.img2, self.label_img2)
             self.check_images_loaded()
     
@@ -90,36 +116,64 @@ class HomographyApp(QMainWindow):
         label.setPixmap(pixmap)
     
     def compute_homography(self):
-        # Feature Matching with SIFT
-        sift = cv2.SIFT_create()
-        kp1, desc1 = sift.detectAndCompute(self.img1_gray, None)
-        kp2, desc2 = sift.detectAndCompute(self.img2_gray, None)
-        
-        # BFMatcher with L2 norm
-        bf = cv2.BFMatcher(cv2.NORM_L2)
-        matches = bf.knnMatch(desc1, desc2, k=2)
-        
-        # Lowe's Ratio Test
-        good_matches = []
-        for m, n in matches:
-            if m.distance < 0.55 * n.distance:
-                good_matches.append(m)
-        
-        # Compute Homography (at least 4 points)
-        if len(good_matches) >= 4:
-            src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-            dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+        estimator = self.estimator_combo.currentText()
+        if self.mode_combo.currentText() == "Coarse-to-fine":
+            # Initial H on a downscaled level, refined with full resolution SIFT in patches
+            H, _, _, _ = homography_coarse_to_fine(self.img1_gray, self.img2_gray, estimator=estimator)
+            if H is None:
+                self.show_error("Not enough matches for homography (at least 4 required)!")
+                return
+        else:
+            # Feature Matching with SIFT (cached per image)
+            kp1, desc1 = self.descriptor_cache.features(self.img1_gray, "SIFT", self.img1_key)
+            kp2, desc2 = self.descriptor_cache.features(self.img2_gray, "SIFT", self.img2_key)
             
-            H, _ = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+            # Brute force knn with L2 norm, results as arrays
+            train_idx, distance = knn_match(desc1, desc2, k=2, norm=cv2.NORM_L2)
             
-            # Apply transformation
-            height, width = self.img2.shape[:2]
-            self.result_img = cv2.warpPerspective(self.img1, H, (width, height))
+            # Lowe's Ratio Test (vectorized)
+            good_matches = ratio_test(train_idx, distance, 0.55)
             
-            # Display result
-            self.display_image(self.result_img, self.label_result)
-        else:
-            self.show_error("Not enough matches for homography (at least 4 required)!")
+            # Compute Homography (at least 4 points)
+            if len(good_matches) < 4:
+                self.show_error("Not enough matches for homography (at least 4 required)!")
+                return
+            src_pts, dst_pts = good_matches.points(kp1, kp2)
+            H, _ = find_homography(src_pts, dst_pts, estimator, 5.0)
+            if H is None:
+                self.show_error("Homography estimation failed!")
+                return
+        
+        # Apply transformation
+        height, width = self.img2.shape[:2]
+        self.result_img = cv2.warpPerspective(self.img1, H, (width, height))
+        
+        # Display result
+        self.display_image(self.result_img, self.label_result)
+    
+    def build_mosaic(self):
+        image_dir = QFileDialog.getExistingDirectory(self, "Select Image Directory")
+        if not image_dir:
+            return
+        output, _ = QFileDialog.getSaveFileName(self, "Save Mosaic", "mosaic.npy", "NumPy Array (*.npy)")
+        if not output:
+            return
+        paths = list_images(image_dir)
+        if len(paths) < 2:
+            self.show_error("At least 2 images required for a mosaic!")
+            return
+        
+        mosaic = Mosaic(paths, estimator=self.estimator_combo.currentText())
+        try:
+            mosaic.build()
+        except ValueError as e:
+            self.show_error(str(e))
+            return
+        mosaic.render(output)
+        
+        # Downscaled overview of the whole canvas
+        self.result_img = mosaic.preview(max_side=1200)
+        self.display_image(self.result_img, self.label_result)
     
     def show_error(self, message):
         error_dialog = QFileDialog(self)
@@ -128,7 +182,8 @@ class HomographyApp(QMainWindow):
         error_dialog.exec_()
 
 # Main application
-app = QApplication([])
-window = HomographyApp()
-window.show()
-app.exec_()
\ No newline at end of file
+if __name__ == "__main__":
+    app = QApplication([])
+    window = HomographyApp()
+    window.show()
+    app.exec_()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import sys
+import time
+import cv2
+import numpy as np
+from stabilize import MotionEstimator
+
+
+def estimate_transforms(frames, max_corners=1000, motion_scale=1.0, roi=None):
+    """
+    Per-frame (dx, dy, da) for a list of frames and the time spent on it.
+    """
+    estimator = MotionEstimator(max_corners, motion_scale, roi)
+    estimator.update(frames[0])
+    start = time.perf_counter()
+    transforms = np.array([estimator.update(frame) for frame in frames[1:]], np.float64)
+    return transforms, time.perf_counter() - start
+
+
+def benchmark_motion_scale(input_video, scales=(1.0, 0.5, 0.25), max_frames=300, roi=None):
+    """
+    Compare reduced-resolution motion estimation against the full-resolution path.
+
+    Accuracy is the RMS difference of dx/dy (pixels) and da (degrees) to
+    motion_scale=1.0, both per frame and for the accumulated trajectory, since
+    small per-frame errors add up over time.
+    """
+    cap = cv2.VideoCapture(input_video)
+    frames = []
+    while len(frames) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    if len(frames) < 2:
+        print("Error reading video")
+        return None
+
+    reference, reference_time = estimate_transforms(frames, motion_scale=1.0, roi=roi)
+    print(f"{len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]}, roi={roi}")
+    print(f"{'scale':>6} {'ms/frame':>9} {'speedup':>8} {'rms dx/dy':>10} {'rms da':>8} {'rms traj':>9}")
+    results = {}
+    for scale in scales:
+        if scale == 1.0:
+            transforms, elapsed = reference, reference_time
+        else:
+            transforms, elapsed = estimate_transforms(frames, motion_scale=scale, roi=roi)
+        error = transforms - reference
+        trajectory_error = np.cumsum(error, axis=0)
+        results[scale] = {
+            "ms_per_frame": 1000 * elapsed / len(transforms),
+            "speedup": reference_time / elapsed,
+            "rms_translation": float(np.sqrt(np.mean(error[:, :2] ** 2))),
+            "rms_angle_deg": float(np.degrees(np.sqrt(np.mean(error[:, 2] ** 2)))),
+            "rms_trajectory": float(np.sqrt(np.mean(trajectory_error[:, :2] ** 2))),
+        }
+        r = results[scale]
+        print(f"{scale:>6} {r['ms_per_frame']:>9.2f} {r['speedup']:>7.1f}x {r['rms_translation']:>9.2f}px "
+              f"{r['rms_angle_deg']:>7.3f}° {r['rms_trajectory']:>8.2f}px")
+    return results
+
+
+if __name__ == "__main__":
+    # Example usage: python benchmark_motion.py short2.mp4
+    benchmark_motion_scale(sys.argv[1] if len(sys.argv) > 1 else "short2.mp4")
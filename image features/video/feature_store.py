@@ -0,0 +1,158 @@
+import hashlib
+import os
+from collections import OrderedDict
+import cv2
+import numpy as np
+# detectors.py is in "image features/"; scripts put it on sys.path (see reihenfolge.py)
+from detectors import create_detector
+
+
+def keypoints_to_arrays(keypoints):
+    """
+    Convert a list of cv2.KeyPoint into a dict of NumPy arrays.
+    """
+    n = len(keypoints)
+    pts = np.empty((n, 2), np.float32)
+    size = np.empty(n, np.float32)
+    angle = np.empty(n, np.float32)
+    response = np.empty(n, np.float32)
+    octave = np.empty(n, np.int32)
+    for i, kp in enumerate(keypoints):
+        pts[i] = kp.pt
+        size[i] = kp.size
+        angle[i] = kp.angle
+        response[i] = kp.response
+        octave[i] = kp.octave
+    return {"pts": pts, "size": size, "angle": angle,
+            "response": response, "octave": octave}
+
+
+def arrays_to_keypoints(kps):
+    """
+    Convert keypoint arrays (see keypoints_to_arrays) back into cv2.KeyPoint objects,
+    e.g. for cv2.drawKeypoints or cv2.drawMatches.
+    """
+    return [cv2.KeyPoint(float(x), float(y), float(s), float(a), float(r), int(o))
+            for (x, y), s, a, r, o in zip(kps["pts"], kps["size"], kps["angle"],
+                                         kps["response"], kps["octave"])]
+
+
+class FeatureStore:
+    """
+    On-disk cache for keypoints and descriptors.
+
+    Each image is read, blurred and detected only once per detector configuration.
+    The result is saved as one .npz file per frame, named after the SHA-1 of the
+    file content and of the detector parameters, so renamed or copied frames hit
+    the cache and changed parameters never return stale features.
+    """
+
+    def __init__(self, cache_dir="feature_cache", method="SIFT", blur=5, max_memory=256, **params):
+        """
+        Args:
+            cache_dir (str): Directory for the .npz files (created if missing)
+            method (str): Feature method, "SIFT", "ORB" or "AKAZE"
+            blur (int): Box blur kernel size applied before detection (0 = no blur)
+            max_memory (int): Number of recently used frames kept in RAM
+            **params: Detector parameters, e.g. nfeatures=4000 for ORB
+        """
+        self.cache_dir = cache_dir
+        self.method = method
+        self.blur = blur
+        self.params = params
+        self.max_memory = max_memory
+        os.makedirs(cache_dir, exist_ok=True)
+
+        config = repr((method, blur, sorted(params.items())))
+        self.config_hash = hashlib.sha1(config.encode()).hexdigest()[:12]
+
+        # In-memory state, rebuilt lazily (the detector can't be pickled for worker processes)
+        self._detector = None
+        self._hashes = {}
+        self._memory = OrderedDict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_detector"] = None
+        state["_memory"] = OrderedDict()
+        return state
+
+    def content_hash(self, file_path):
+        """
+        SHA-1 of the file content, memoized per (path, size, mtime).
+        """
+        st = os.stat(file_path)
+        memo_key = (file_path, st.st_size, st.st_mtime_ns)
+        digest = self._hashes.get(memo_key)
+        if digest is None:
+            h = hashlib.sha1()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self._hashes[memo_key] = digest
+        return digest
+
+    def cache_path(self, file_path):
+        return os.path.join(self.cache_dir, f"{self.content_hash(file_path)}-{self.config_hash}.npz")
+
+    def detect(self, file_path):
+        """
+        Run detection on an image file without touching the cache.
+
+        Returns:
+            tuple: (keypoint arrays dict, descriptors or None)
+        """
+        if self._detector is None:
+            self._detector = create_detector(self.method, **self.params)
+        img = cv2.imread(file_path)
+        if img is None:
+            raise IOError(f"Could not read image: {file_path}")
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if self.blur:
+            gray = cv2.blur(gray, (self.blur, self.blur))
+        kp, desc = self._detector.detectAndCompute(gray, None)
+        return keypoints_to_arrays(kp), desc
+
+    def get(self, file_path):
+        """
+        Keypoints and descriptors for an image, from cache if possible.
+
+        Returns:
+            tuple: (keypoint arrays dict, descriptors or None if nothing was found)
+        """
+        path = self.cache_path(file_path)
+        if path in self._memory:
+            self._memory.move_to_end(path)
+            return self._memory[path]
+
+        if os.path.exists(path):
+            with np.load(path) as data:
+                kps = {name: data[name] for name in ("pts", "size", "angle", "response", "octave")}
+                desc = data["desc"] if data["desc"].size else None
+        else:
+            kps, desc = self.detect(file_path)
+            # Write to a temporary file first, so parallel workers never read half a file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, desc=desc if desc is not None else np.empty((0, 0), np.float32), **kps)
+            os.replace(tmp_path, path)
+
+        self._memory[path] = (kps, desc)
+        if len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+        return kps, desc
+
+    def descriptors(self, file_path):
+        return self.get(file_path)[1]
+
+    def warm(self, file_paths):
+        """
+        Make sure every file has a cache entry. Returns the number of newly detected files.
+        """
+        new = 0
+        for file_path in file_paths:
+            if not os.path.exists(self.cache_path(file_path)):
+                new += 1
+            self.get(file_path)
+        return new
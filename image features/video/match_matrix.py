@@ -0,0 +1,130 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import cv2
+import numpy as np
+
+# Per-process state of the worker pool
+_worker_store = None
+_worker_match = None
+
+
+def _init_worker(feature_store, match_fn):
+    global _worker_store, _worker_match
+    # One OpenCV thread per process, the pool already uses every core
+    cv2.setNumThreads(1)
+    _worker_store = feature_store
+    _worker_match = match_fn
+
+
+def _warm_file(file_path):
+    _worker_store.get(file_path)
+
+
+def _match_chunk(files_i, files_j, rows, cols):
+    counts = np.empty(len(rows), np.int32)
+    for k in range(len(rows)):
+        counts[k] = _worker_match(_worker_store.descriptors(files_i[k]),
+                                  _worker_store.descriptors(files_j[k]))
+    return rows, cols, counts
+
+
+def warm_features(files, feature_store, workers=None):
+    """
+    Detect features of every file without a cache entry on a process pool.
+
+    Returns:
+        int: Number of newly detected files (like FeatureStore.warm)
+    """
+    # The content hashes computed here are pickled to the workers with the store
+    missing = [f for f in files if not os.path.exists(feature_store.cache_path(f))]
+    if missing:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(feature_store, None)) as pool:
+            list(pool.map(_warm_file, missing, chunksize=max(1, len(missing) // (4 * workers))))
+    return len(missing)
+
+
+def open_match_matrix(matrix_path, files):
+    """
+    Open (or create) the symmetric match matrix for a file list as a memory map.
+
+    The matrix is an int32 .npy file, -1 marks pairs that are not computed yet.
+    The file list is stored next to it; if it changed, the matrix starts over.
+    """
+    list_path = matrix_path + ".files.txt"
+    n = len(files)
+    if os.path.exists(matrix_path) and os.path.exists(list_path):
+        with open(list_path, encoding="utf-8") as f:
+            if f.read().splitlines() == list(files):
+                return np.lib.format.open_memmap(matrix_path, mode="r+")
+
+    matrix = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=np.int32, shape=(n, n))
+    matrix[:] = -1
+    np.fill_diagonal(matrix, 0)
+    matrix.flush()
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(files))
+    return matrix
+
+
+def compute_match_matrix(files, feature_store, match_fn, matrix_path="matches.npy",
+                         workers=None, chunk_size=256, flush_every=10):
+    """
+    Good match counts for all unordered pairs, computed on a process pool.
+
+    Every pair (i, j) with i < j is matched once and written to both [i, j] and
+    [j, i]. Results are streamed into a memory-mapped .npy file; after an
+    interruption, calling this again only computes the pairs still marked -1.
+
+    Args:
+        files (list): Image files
+        feature_store (FeatureStore): Descriptor cache shared by all workers via disk
+        match_fn (callable): match_fn(desc1, desc2) -> int, must be picklable
+        matrix_path (str): Output .npy file
+        workers (int): Number of processes (default: all cores)
+        chunk_size (int): Pairs per task
+        flush_every (int): Flush the memory map to disk every n finished tasks
+
+    Returns:
+        np.memmap: (n, n) int32 match count matrix
+    """
+    matrix = open_match_matrix(matrix_path, files)
+    rows, cols = np.triu_indices(len(files), k=1)
+    pending = matrix[rows, cols] < 0
+    rows, cols = rows[pending], cols[pending]
+    if len(rows) == 0:
+        return matrix
+    print(f"{len(rows)} von {len(files)*(len(files)-1)//2} Paaren zu berechnen")
+
+    workers = workers or os.cpu_count()
+    # Detect every file once up front, so workers never compute the same frame twice
+    warm_features(files, feature_store, workers)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(feature_store, match_fn)) as pool:
+        # Only a bounded window of tasks is submitted, so memory doesn't grow with n²
+        blocks = (len(rows) + chunk_size - 1) // chunk_size
+        starts = iter(range(0, len(rows), chunk_size))
+        futures = set()
+        done = 0
+        while True:
+            for s in starts:
+                r, c = rows[s:s + chunk_size], cols[s:s + chunk_size]
+                futures.add(pool.submit(_match_chunk, [files[i] for i in r], [files[j] for j in c], r, c))
+                if len(futures) >= 2 * workers:
+                    break
+            if not futures:
+                break
+            finished, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                r, c, counts = future.result()
+                matrix[r, c] = counts
+                matrix[c, r] = counts
+                done += 1
+                if done % flush_every == 0:
+                    matrix.flush()
+                    print(f"{done}/{blocks} Blöcke, {done * chunk_size / (time.perf_counter() - start):.0f} Paare/s")
+    matrix.flush()
+    return matrix
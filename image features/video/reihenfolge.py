@@ -1,48 +1,178 @@
+import sys
 import cv2
+import numpy as np
 from os import listdir
-from os.path import isfile, join
-
-def compute_matchcount(file_path1, file_path2):
-        img1 = cv2.imread(file_path1)
-        img1_gray = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-        img1_gray = cv2.blur(img1_gray,(5,5))
-        img2 = cv2.imread(file_path2)
-        img2_gray = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-        img2_gray = cv2.blur(img2_gray,(5,5))
-        # Feature Matching mit SIFT
-        sift = cv2.SIFT_create()
-        #sift = cv2.AKAZE_create()
-        #sift = cv2.ORB_create(nfeatures=4000)
-        kp1, desc1 = sift.detectAndCompute(img1_gray, None)
-        kp2, desc2 = sift.detectAndCompute(img2_gray, None)
-        
-        # BFMatcher mit Hamming-Distanz (für binäre Features: ORB/BRIEF würden cv2.NORM_HAMMING nutzen)
-        bf = cv2.BFMatcher(cv2.NORM_L2)
-        #bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-        matches = bf.knnMatch(desc1, desc2, k=2)
-        #matches = bf.match(desc1, desc2)
+from os.path import isfile, join, dirname, abspath
+
+# match_arrays.py und detectors.py liegen in "image features/" (kein Paket wegen des Leerzeichens)
+sys.path.insert(1, dirname(dirname(abspath(__file__))))
+from feature_store import FeatureStore
+from visual_words import VisualWordIndex
+from match_matrix import compute_match_matrix, warm_features
+from match_arrays import knn_match, ratio_test
+from hamming import HammingMatcher, match_pair
+
+# Feature Cache (SIFT mit 5x5 Blur, wie bisher); alternativ:
+#store = FeatureStore(method="AKAZE")
+#store = FeatureStore(method="ORB", nfeatures=4000)
+store = None
+
+# Ratio für Lowe's Test: SIFT (L2) wie bisher, binäre Deskriptoren (ORB) brauchen mehr Spielraum
+RATIO_L2 = 0.55
+RATIO_HAMMING = 0.8
+
+def match_descriptors(desc1, desc2, ratio=None):
+        if desc1 is None or desc2 is None or len(desc1) < 2 or len(desc2) < 2:
+            return 0
+        if desc1.dtype == np.uint8:
+            # Binäre Deskriptoren: Hamming-Distanz über gepackte uint64-Wörter
+            return len(match_pair(desc1, desc2, ratio or RATIO_HAMMING, cross_check=False))
+        ratio = ratio or RATIO_L2
+        # Brute force knn mit L2-Norm, Ergebnis als Arrays statt DMatch-Listen
+        train_idx, distance = knn_match(desc1, desc2, k=2, norm=cv2.NORM_L2)
         
-        # Lowe's Ratio Test
-        good_matches = []
-        for m, n in matches:
-            if m.distance < 0.55 * n.distance:
-                good_matches.append(m)
-        ##bis hier 
-        return len(good_matches)
-        #return len(matches)
+        # Lowe's Ratio Test, vektorisiert
+        return len(ratio_test(train_idx, distance, ratio))
+
+def compute_matchcount(file_path1, file_path2, feature_store=None):
+        # Keypoints/Deskriptoren kommen aus dem Cache, SIFT läuft nur einmal pro Datei
+        global store
+        if feature_store is None:
+            if store is None:
+                store = FeatureStore()
+            feature_store = store
+        desc1 = feature_store.descriptors(file_path1)
+        desc2 = feature_store.descriptors(file_path2)
+        return match_descriptors(desc1, desc2)
+
+def frame_sequence(n, edges, similarity=None):
+    """
+    Order n frames along a path through the similarity graph.
+
+    Greedy path cover: edges are taken strongest first as long as no frame gets
+    more than two neighbours and no cycle is closed. The resulting path pieces
+    are then joined end to end, each time picking the piece whose end is most
+    similar to the current tail.
+
+    Args:
+        n (int): Number of frames
+        edges (list): (score, i, j) tuples, e.g. good match counts
+        similarity (callable): similarity(i, j) used to join the pieces
+
+    Returns:
+        list: Frame indices in sequence order
+    """
+    parent = list(range(n))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    neighbours = [[] for _ in range(n)]
+    for score, i, j in sorted(edges, reverse=True):
+        if score <= 0 or len(neighbours[i]) >= 2 or len(neighbours[j]) >= 2:
+            continue
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            continue
+        parent[root_i] = root_j
+        neighbours[i].append(j)
+        neighbours[j].append(i)
+
+    # Walk every piece from one of its ends
+    pieces = []
+    visited = [False] * n
+    for start in range(n):
+        if visited[start] or len(neighbours[start]) > 1:
+            continue
+        piece, prev, cur = [], -1, start
+        while cur != -1:
+            visited[cur] = True
+            piece.append(cur)
+            nxt = [k for k in neighbours[cur] if k != prev]
+            prev, cur = cur, (nxt[0] if nxt else -1)
+        pieces.append(piece)
+
+    # Join the pieces, starting with the longest one
+    pieces.sort(key=len, reverse=True)
+    sequence = pieces.pop(0) if pieces else []
+    while pieces:
+        tail = sequence[-1]
+        best, flip, best_sim = 0, False, -np.inf
+        for k, piece in enumerate(pieces):
+            for reverse, end in ((False, piece[0]), (True, piece[-1])):
+                sim = similarity(tail, end) if similarity is not None else 0.0
+                if sim > best_sim:
+                    best, flip, best_sim = k, reverse, sim
+        piece = pieces.pop(best)
+        sequence.extend(piece[::-1] if flip else piece)
+    return sequence
+
+def order_frames(files, feature_store, top_k=10, index=None):
+    """
+    Bring shuffled frames into sequence order without matching all pairs.
+
+    A visual word index proposes the top_k candidates per frame; only these
+    pairs are checked with the ratio test, i.e. O(n*top_k) instead of O(n^2)
+    descriptor matches.
+
+    Returns:
+        tuple: (ordered file list, dict {(i, j): good match count} of verified pairs)
+    """
+    if len(files) < 2:
+        return list(files), {}
+    if index is None:
+        index = VisualWordIndex()
+        index.train([feature_store.descriptors(f) for f in files[::max(1, len(files) // index.sample_frames)]])
+    index.build(feature_store.descriptors(f) for f in files)
+    candidates, _ = index.shortlist(top_k)
+
+    counts = {}
+    for i, row in enumerate(candidates):
+        for j in row:
+            pair = (min(i, j), max(i, j))
+            if pair not in counts:
+                counts[pair] = match_descriptors(feature_store.descriptors(files[pair[0]]),
+                                                 feature_store.descriptors(files[pair[1]]))
+    edges = [(count, i, j) for (i, j), count in counts.items()]
+    sequence = frame_sequence(len(files), edges, index.similarity)
+    return [files[i] for i in sequence], counts
 
 if __name__ == "__main__":
     mypath = "c/"
-    onlyfiles = [join(mypath, f) for f in listdir(mypath) if isfile(join(mypath, f))]
-    d={}
-    for file1 in onlyfiles:
-        d1 ={}
-        for file2 in onlyfiles:
-            if not file1 == file2:
-                d1[file2]=compute_matchcount(file1,file2)
-        d[file1]=d1
-    print(d)
-    for file1 in d.keys():
-         d1=d[file1]
-         file2=max(d1, key=d1.get)
-         print(file1+" --> "+file2)
\ No newline at end of file
+    # "retrieval": Kandidaten über Visual Words, nur top_k Paare pro Bild matchen
+    # "allpairs": alle Paare parallel matchen (Match-Matrix, unterbrechbar)
+    mode = "retrieval"
+    # "SIFT" oder "ORB" (binär, Hamming-Engine; macht "allpairs" auch für tausende Bilder machbar)
+    method = "SIFT"
+    onlyfiles = sorted(join(mypath, f) for f in listdir(mypath) if isfile(join(mypath, f)))
+    if method == "ORB":
+        store = FeatureStore(join(mypath, ".features"), method="ORB", nfeatures=4000)
+    else:
+        store = FeatureStore(join(mypath, ".features"))
+    # Neue Dateien parallel auf allen Kernen analysieren
+    print(f"{warm_features(onlyfiles, store)} neue Dateien analysiert, {len(onlyfiles)} im Cache")
+    if mode == "retrieval":
+        sequence, counts = order_frames(onlyfiles, store, top_k=10)
+        print(f"{len(counts)} Paare gematcht statt {len(onlyfiles)*(len(onlyfiles)-1)//2}")
+        for file1, file2 in zip(sequence, sequence[1:]):
+            print(file1+" --> "+file2)
+    else:
+        if method == "ORB":
+            # Alle Paare auf einmal: Distanzblöcke über viele Bilder, Ratio-Test als Array-Operation
+            matcher = HammingMatcher([store.descriptors(f) for f in onlyfiles])
+            matrix = matcher.match_matrix(ratio=RATIO_HAMMING)
+        else:
+            # Jedes Paar nur einmal, parallel auf allen Kernen; Ergebnis in c/.features/matches.npy
+            matrix = compute_match_matrix(onlyfiles, store, match_descriptors,
+                                          matrix_path=join(store.cache_dir, "matches.npy"))
+        for i, file1 in enumerate(onlyfiles):
+             row = matrix[i].copy()
+             row[i] = -1
+             file2 = onlyfiles[int(np.argmax(row))]
+             print(file1+" --> "+file2)
+        rows, cols = np.triu_indices(len(onlyfiles), k=1)
+        edges = list(zip(matrix[rows, cols].tolist(), rows.tolist(), cols.tolist()))
+        sequence = frame_sequence(len(onlyfiles), edges)
+        print(" --> ".join(onlyfiles[i] for i in sequence))
\ No newline at end of file
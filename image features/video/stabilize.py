@@ -1,7 +1,140 @@
 import cv2
 import numpy as np
+from collections import deque
 
-def stabilize_video(input_video, output_video, max_corners=1000, smooth_radius=30):
+
+class MotionEstimator:
+    """
+    Frame-to-frame camera motion from ORB features and pyramidal LK optical flow.
+
+    Feed frames in order with update(); every call after the first returns the
+    rigid motion (dx, dy, da) from the previous frame to the current one, in
+    full-resolution pixel coordinates.
+
+    Global camera motion is well determined at a fraction of the resolution, so
+    the analysis can run on a downscaled frame (motion_scale) and/or on a region
+    of interest only, e.g. to ignore overlays, timestamps or a dashboard.
+    """
+
+    def __init__(self, max_corners=1000, motion_scale=1.0, roi=None):
+        """
+        Args:
+            max_corners (int): Maximum number of ORB features to track
+            motion_scale (float): Analysis resolution relative to the frame (e.g. 0.25)
+            roi (tuple): (x, y, w, h) analysis region in full-resolution pixels, None = whole frame
+        """
+        self.max_corners = max_corners
+        self.motion_scale = motion_scale
+        self.roi = roi
+        # Motion in pixels shrinks with the scale, so fewer pyramid levels are needed
+        self.max_level = max(1, 3 + int(round(np.log2(motion_scale))))
+        self.orb = cv2.ORB_create(nfeatures=max_corners)
+        self.prev_gray = None
+        self.prev_pts = None
+
+    def prepare(self, frame):
+        """
+        Grayscale analysis image: ROI crop first, then downscaling.
+        """
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            frame = frame[y:y+h, x:x+w]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.motion_scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.motion_scale, fy=self.motion_scale,
+                              interpolation=cv2.INTER_AREA)
+        return gray
+
+    def to_full_resolution(self, dx, dy, da):
+        """
+        Convert motion measured on the analysis image to full-resolution coordinates.
+
+        With p = s * (P - o) for scale s and ROI offset o, a rotation R with
+        translation t on the analysis image is P' = R P + t / s + (I - R) o.
+        """
+        dx, dy = dx / self.motion_scale, dy / self.motion_scale
+        if self.roi is not None:
+            ox, oy = self.roi[:2]
+            c, s = np.cos(da), np.sin(da)
+            dx += (1 - c) * ox + s * oy
+            dy += -s * ox + (1 - c) * oy
+        return dx, dy, da
+
+    def detect(self, gray):
+        # Detect ORB features
+        kps = self.orb.detect(gray, None)
+        if not kps:
+            # Flat or tiny frames (fades, small motion_scale/roi): update() returns no motion
+            return np.empty((0, 1, 2), np.float32)
+        pts = cv2.KeyPoint_convert(kps)
+        return pts.reshape(-1, 1, 2).astype(np.float32)
+
+    def update(self, frame):
+        """
+        Args:
+            frame (np.ndarray): Next BGR frame
+
+        Returns:
+            tuple: (dx, dy, da) relative to the previous frame, None for the first frame
+        """
+        curr_gray = self.prepare(frame)
+        if self.prev_gray is None:
+            self.prev_gray = curr_gray
+            self.prev_pts = self.detect(curr_gray)
+            return None
+
+        dx, dy, da = 0, 0, 0
+        curr_pts_refined = np.empty((0, 1, 2), np.float32)
+        if len(self.prev_pts) > 0:
+            # Calculate optical flow
+            curr_pts, status, _ = cv2.calcOpticalFlowPyrLK(
+                self.prev_gray, curr_gray, self.prev_pts, None,
+                winSize=(21, 21), maxLevel=self.max_level,
+                criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+
+            # Select good points
+            idx = np.where(status == 1)[0]
+            prev_pts_refined = self.prev_pts[idx]
+            curr_pts_refined = curr_pts[idx]
+
+            # Estimate affine transformation
+            if len(prev_pts_refined) >= 4:
+                transform, _ = cv2.estimateAffinePartial2D(
+                    prev_pts_refined, curr_pts_refined)
+
+                if transform is not None:
+                    # Extract translation and rotation
+                    dx = transform[0, 2]
+                    dy = transform[1, 2]
+                    da = np.arctan2(transform[1, 0], transform[0, 0])
+
+        # Update previous frame and points
+        self.prev_gray = curr_gray
+        self.prev_pts = curr_pts_refined.reshape(-1, 1, 2)
+
+        # Periodically redetect ORB features
+        if len(self.prev_pts) < self.max_corners//2:
+            self.prev_pts = self.detect(self.prev_gray)
+
+        return self.to_full_resolution(dx, dy, da)
+
+
+def transform_matrix(dx, dy, da):
+    """
+    2x3 rigid transformation matrix from translation and rotation angle.
+    """
+    transform = np.zeros((2, 3), np.float32)
+    transform[0, 0] = np.cos(da)
+    transform[0, 1] = -np.sin(da)
+    transform[1, 0] = np.sin(da)
+    transform[1, 1] = np.cos(da)
+    transform[0, 2] = dx
+    transform[1, 2] = dy
+    return transform
+
+
+def stabilize_video(input_video, output_video, max_corners=1000, smooth_radius=30,
+                    motion_scale=1.0, roi=None):
     """
     Stabilize video using ORB features and optical flow.
     
@@ -10,6 +143,9 @@ def stabilize_video(input_video, output_video, max_corners=1000, smooth_radius=3
         output_video (str): Path to save stabilized video
         max_corners (int): Maximum number of ORB features to track
         smooth_radius (int): Radius for smoothing camera motion (larger = smoother)
+        motion_scale (float): Resolution for motion estimation relative to the frame,
+            e.g. 0.25 for 4K input; warping still happens at full resolution
+        roi (tuple): (x, y, w, h) region used for motion estimation, None = whole frame
     """
     # Initialize video capture
     cap = cv2.VideoCapture(input_video)
@@ -27,21 +163,15 @@ def stabilize_video(input_video, output_video, max_corners=1000, smooth_radius=3
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     out = cv2.VideoWriter(output_video, fourcc, fps, (width, height))
     
-    # Initialize ORB detector
-    orb = cv2.ORB_create(nfeatures=max_corners)
+    # Initialize ORB/optical flow motion estimator
+    estimator = MotionEstimator(max_corners, motion_scale, roi)
     
     # Read first frame
     success, prev_frame = cap.read()
     if not success:
         print("Error reading first frame")
         return
-    
-    prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-    
-    # Detect ORB features in first frame
-    prev_kps = orb.detect(prev_gray, None)
-    prev_pts = cv2.KeyPoint_convert(prev_kps)
-    prev_pts = prev_pts.reshape(-1, 1, 2).astype(np.float32)
+    estimator.update(prev_frame)
     
     # Initialize transformations array
     transforms = np.zeros((frame_count-1, 3), np.float32)
@@ -53,45 +183,7 @@ def stabilize_video(input_video, output_video, max_corners=1000, smooth_radius=3
         if not success:
             break
         
-        curr_gray = cv2.cvtColor(curr_frame, cv2.COLOR_BGR2GRAY)
-        
-        # Calculate optical flow
-        curr_pts, status, _ = cv2.calcOpticalFlowPyrLK(
-            prev_gray, curr_gray, prev_pts, None,
-            winSize=(21, 21), maxLevel=3,
-            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01))
-        
-        # Select good points
-        idx = np.where(status == 1)[0]
-        prev_pts_refined = prev_pts[idx]
-        curr_pts_refined = curr_pts[idx]
-        
-        # Estimate affine transformation
-        if len(prev_pts_refined) >= 4:
-            transform, _ = cv2.estimateAffinePartial2D(
-                prev_pts_refined, curr_pts_refined)
-            
-            if transform is not None:
-                # Extract translation and rotation
-                dx = transform[0, 2]
-                dy = transform[1, 2]
-                da = np.arctan2(transform[1, 0], transform[0, 0])
-            else:
-                dx, dy, da = 0, 0, 0
-        else:
-            dx, dy, da = 0, 0, 0
-        
-        transforms[i] = [dx, dy, da]
-        
-        # Update previous frame and points
-        prev_gray = curr_gray.copy()
-        prev_pts = curr_pts_refined.reshape(-1, 1, 2)
-        
-        # Periodically redetect ORB features
-        if len(prev_pts) < max_corners//2:
-            prev_kps = orb.detect(prev_gray, None)
-            prev_pts = cv2.KeyPoint_convert(prev_kps)
-            prev_pts = prev_pts.reshape(-1, 1, 2).astype(np.float32)
+        transforms[i] = estimator.update(curr_frame)
     
     # Compute cumulative motion
     trajectory = np.cumsum(transforms, axis=0)
@@ -122,13 +214,7 @@ def stabilize_video(input_video, output_video, max_corners=1000, smooth_radius=3
         dx, dy, da = transforms_smooth[i]
         
         # Build transformation matrix
-        transform = np.zeros((2, 3), np.float32)
-        transform[0, 0] = np.cos(da)
-        transform[0, 1] = -np.sin(da)
-        transform[1, 0] = np.sin(da)
-        transform[1, 1] = np.cos(da)
-        transform[0, 2] = dx
-        transform[1, 2] = dy
+        transform = transform_matrix(dx, dy, da)
         
         # Apply affine transformation
         stabilized_frame = cv2.warpAffine(
@@ -148,11 +234,150 @@ def stabilize_video(input_video, output_video, max_corners=1000, smooth_radius=3
     cv2.destroyAllWindows()
     print(f"Stabilized video saved to {output_video}")
 
+class TrajectorySmoother:
+    """
+    Moving-average smoothing of the camera trajectory with bounded look-ahead.
+    
+    Frames are pushed in order together with their motion relative to the
+    previous frame. As soon as the trajectory window around a frame is complete,
+    push() hands it back with its smoothed correction (dx, dy, da), so at most
+    about smooth_radius/2 frames are held back. The window matches
+    np.convolve(..., mode='same') in stabilize_video; at the start and end of
+    the video it is shortened to the available frames instead of zero padded.
+    """
+    
+    def __init__(self, smooth_radius=30):
+        self.behind = smooth_radius // 2
+        self.ahead = (smooth_radius - 1) // 2
+        self.items = deque()                                   # frames not returned yet
+        self.steps = deque()                                   # their frame-to-frame motion
+        self.trajectory = deque(maxlen=self.behind + self.ahead + 1)  # cumulative motion
+        self.trajectory_start = 0                              # frame index of trajectory[0]
+        self.position = np.zeros(3, np.float64)
+        self.latest = -1                                       # index of the newest step
+        self.done = 0                                          # frames returned so far
+    
+    def _pop(self):
+        item = self.items.popleft()
+        step = self.steps.popleft()
+        window = np.array(self.trajectory)
+        i = self.done - self.trajectory_start
+        lo = max(0, i - self.behind)
+        hi = min(self.latest, self.done + self.ahead) - self.trajectory_start + 1
+        difference = window[lo:hi].mean(axis=0) - window[i]
+        self.done += 1
+        return item, step + difference
+    
+    def push(self, item, step):
+        """
+        Args:
+            item: Frame (or any per-frame payload)
+            step: (dx, dy, da) from the previous frame to this one, None for the first frame
+        
+        Returns:
+            list: (item, (dx, dy, da)) pairs whose correction is final
+        """
+        if step is not None:
+            step = np.asarray(step, np.float64)
+            self.position = self.position + step
+            self.latest += 1
+            if len(self.trajectory) == self.trajectory.maxlen:
+                self.trajectory_start += 1
+            self.trajectory.append(self.position)
+            self.steps.append(step)
+        self.items.append(item)
+        
+        # The correction of the oldest frame is final once `ahead` more steps are known
+        ready = []
+        while self.steps and self.latest - self.done >= self.ahead:
+            ready.append(self._pop())
+        return ready
+    
+    def flush(self):
+        """
+        Remaining frames at the end of the video. Like stabilize_video, the last
+        frame has no outgoing motion and is dropped.
+        """
+        ready = []
+        while self.steps:
+            ready.append(self._pop())
+        self.items.clear()
+        return ready
+
+
+def stabilize_video_streaming(input_video, output_video, max_corners=1000, smooth_radius=30,
+                              motion_scale=1.0, roi=None):
+    """
+    Stabilize video in a single decoding pass.
+    
+    Same motion model and moving-average smoothing as stabilize_video, but every
+    frame is written as soon as the trajectory window around it is known (see
+    TrajectorySmoother). Memory stays constant for long videos, and the input is
+    never rewound, so pipes and camera streams work as well.
+    
+    Args:
+        input_video (str or int): Path/URL of the input video or camera index
+        output_video (str): Path to save stabilized video
+        max_corners (int): Maximum number of ORB features to track
+        smooth_radius (int): Length of the smoothing window in frames (larger = smoother)
+        motion_scale (float): Resolution for motion estimation relative to the frame
+        roi (tuple): (x, y, w, h) region used for motion estimation, None = whole frame
+    """
+    # Initialize video capture
+    cap = cv2.VideoCapture(input_video)
+    if not cap.isOpened():
+        print("Error opening video file")
+        return
+    
+    # Get video properties (frame count is not needed, streams may not have one)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    
+    # Initialize video writer
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(output_video, fourcc, fps, (width, height))
+    
+    estimator = MotionEstimator(max_corners, motion_scale, roi)
+    smoother = TrajectorySmoother(smooth_radius)
+    written = 0
+    
+    def write(ready):
+        nonlocal written
+        for frame, (dx, dy, da) in ready:
+            # Apply affine transformation
+            stabilized_frame = cv2.warpAffine(
+                frame, transform_matrix(dx, dy, da), (width, height),
+                borderMode=cv2.BORDER_REPLICATE)
+            out.write(stabilized_frame)
+            written += 1
+            
+            # Display progress
+            if written % 100 == 0:
+                print(f"Processing frame {written}")
+    
+    success, frame = cap.read()
+    if not success:
+        print("Error reading first frame")
+        return
+    
+    while success:
+        write(smoother.push(frame, estimator.update(frame)))
+        success, frame = cap.read()
+    write(smoother.flush())
+    
+    # Release resources
+    cap.release()
+    out.release()
+    print(f"Stabilized video saved to {output_video} ({written} frames)")
+
 if __name__ == "__main__":
     # Example usage
     input_video = "short2.mp4"
     output_video = "stabilized_video.mp4"
     
+    # Single pass with constant memory, also for pipes/cameras:
+    # stabilize_video_streaming(input_video, output_video, max_corners=1000, smooth_radius=30)
     stabilize_video(
         input_video=input_video,
         output_video=output_video,
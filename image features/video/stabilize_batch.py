@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import numpy as np
+from stabilize import MotionEstimator, transform_matrix
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v")
+
+
+def trajectory_path(input_video):
+    """
+    Default sidecar file for a clip: <clip>.motion.npz
+    """
+    return input_video + ".motion.npz"
+
+
+def analyze_video(input_video, output_file=None, max_corners=1000, motion_scale=1.0, roi=None):
+    """
+    Analysis pass: estimate the raw frame-to-frame motion and save it to a sidecar file.
+
+    The file contains the (n-1, 3) array of (dx, dy, da) plus width, height, fps,
+    frame count and the analysis parameters, so render_video can re-smooth and
+    re-render without running the feature tracking again.
+
+    Args:
+        input_video (str): Path to input video file
+        output_file (str): Sidecar .npz file (default: <input>.motion.npz)
+        max_corners (int): Maximum number of ORB features to track
+        motion_scale (float): Resolution for motion estimation relative to the frame
+        roi (tuple): (x, y, w, h) region used for motion estimation, None = whole frame
+
+    Returns:
+        str: Path of the sidecar file, None on error
+    """
+    output_file = output_file or trajectory_path(input_video)
+    cap = cv2.VideoCapture(input_video)
+    if not cap.isOpened():
+        print(f"Error opening video file {input_video}")
+        return None
+
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    estimator = MotionEstimator(max_corners, motion_scale, roi)
+    transforms = []
+    success, frame = cap.read()
+    while success:
+        step = estimator.update(frame)
+        if step is not None:
+            transforms.append(step)
+        success, frame = cap.read()
+    cap.release()
+
+    params = {"max_corners": max_corners, "motion_scale": motion_scale, "roi": roi}
+    np.savez(output_file, transforms=np.array(transforms, np.float32).reshape(-1, 3),
+             width=width, height=height, fps=fps, frames=len(transforms) + 1,
+             source=os.path.abspath(input_video), params=json.dumps(params))
+    return output_file
+
+
+def load_trajectory(trajectory_file):
+    """
+    Returns:
+        tuple: (transforms, metadata dict)
+    """
+    with np.load(trajectory_file) as data:
+        transforms = data["transforms"]
+        meta = {key: data[key].item() for key in ("width", "height", "fps", "frames", "source")}
+        meta["params"] = json.loads(data["params"].item())
+    return transforms, meta
+
+
+def smooth_trajectory(trajectory, method="average", radius=30, sigma=None,
+                      process_noise=4e-3, measurement_noise=0.25):
+    """
+    Smooth a cumulative (n, 3) trajectory.
+
+    Args:
+        trajectory (np.ndarray): Cumulative motion, one row per frame
+        method (str): "average" (moving average over radius frames, as stabilize_video),
+            "gaussian" (Gaussian window, sigma defaults to radius/4) or "kalman"
+            (causal constant-position Kalman filter, radius is ignored)
+        process_noise (float): Kalman process noise, smaller = smoother
+        measurement_noise (float): Kalman measurement noise
+
+    Returns:
+        np.ndarray: Smoothed trajectory, same shape
+    """
+    trajectory = np.asarray(trajectory, np.float64)
+    n = len(trajectory)
+    if n == 0:
+        return trajectory.copy()
+
+    if method == "average":
+        # Same window as np.convolve(..., mode='same'), shortened at the edges
+        behind, ahead = radius // 2, (radius - 1) // 2
+        cs = np.vstack([np.zeros((1, 3)), np.cumsum(trajectory, axis=0)])
+        idx = np.arange(n)
+        lo = np.maximum(0, idx - behind)
+        hi = np.minimum(n, idx + ahead + 1)
+        return (cs[hi] - cs[lo]) / (hi - lo)[:, None]
+
+    elif method == "gaussian":
+        sigma = sigma or radius / 4.0
+        half = int(np.ceil(3 * sigma))
+        kernel = np.exp(-0.5 * (np.arange(-half, half + 1) / sigma) ** 2)
+        # Normalize by the kernel mass inside the video, so the edges are not pulled to zero
+        weight = np.convolve(np.ones(n), kernel, mode="full")[half:half + n]
+        smoothed = np.empty_like(trajectory)
+        for i in range(3):
+            smoothed[:, i] = np.convolve(trajectory[:, i], kernel, mode="full")[half:half + n] / weight
+        return smoothed
+
+    elif method == "kalman":
+        smoothed = np.empty_like(trajectory)
+        x = trajectory[0].copy()
+        p = np.ones(3)
+        for i in range(n):
+            p = p + process_noise
+            gain = p / (p + measurement_noise)
+            x = x + gain * (trajectory[i] - x)
+            p = (1 - gain) * p
+            smoothed[i] = x
+        return smoothed
+
+    raise ValueError(f"Unknown smoothing method: {method}")
+
+
+def render_video(input_video, output_video, trajectory_file=None, method="average", radius=30, **smooth_args):
+    """
+    Render pass: smooth a saved trajectory and only warp and encode.
+
+    Args:
+        input_video (str): Path to input video file
+        output_video (str): Path to save stabilized video
+        trajectory_file (str): Sidecar from analyze_video (default: <input>.motion.npz)
+        method (str): Smoothing method, see smooth_trajectory
+        radius (int): Smoothing window in frames
+        **smooth_args: Further arguments for smooth_trajectory
+    """
+    transforms, meta = load_trajectory(trajectory_file or trajectory_path(input_video))
+    trajectory = np.cumsum(transforms, axis=0)
+    difference = smooth_trajectory(trajectory, method, radius, **smooth_args) - trajectory
+    transforms_smooth = transforms + difference
+
+    cap = cv2.VideoCapture(input_video)
+    if not cap.isOpened():
+        print(f"Error opening video file {input_video}")
+        return
+    width, height = meta["width"], meta["height"]
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(output_video, fourcc, meta["fps"], (width, height))
+
+    for dx, dy, da in transforms_smooth:
+        success, frame = cap.read()
+        if not success:
+            break
+        stabilized_frame = cv2.warpAffine(
+            frame, transform_matrix(dx, dy, da), (width, height),
+            borderMode=cv2.BORDER_REPLICATE)
+        out.write(stabilized_frame)
+
+    cap.release()
+    out.release()
+    print(f"Stabilized video saved to {output_video}")
+
+
+def _analyze_one(args):
+    input_video, kwargs = args
+    cv2.setNumThreads(1)
+    start = time.perf_counter()
+    return input_video, analyze_video(input_video, **kwargs), time.perf_counter() - start
+
+
+def analyze_directory(directory, workers=None, overwrite=False, **kwargs):
+    """
+    Analyse every clip in a directory on a process pool (one clip per process).
+
+    Clips that already have a sidecar file are skipped unless overwrite is set.
+
+    Returns:
+        list: Paths of the written sidecar files
+    """
+    clips = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                   if f.lower().endswith(VIDEO_EXTENSIONS))
+    if not overwrite:
+        clips = [c for c in clips if not os.path.exists(trajectory_path(c))]
+    print(f"{len(clips)} Clips zu analysieren")
+
+    written = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_analyze_one, (clip, kwargs)) for clip in clips]
+        for future in as_completed(futures):
+            clip, sidecar, elapsed = future.result()
+            print(f"{clip}: {'Fehler' if sidecar is None else sidecar} ({elapsed:.1f}s)")
+            if sidecar is not None:
+                written.append(sidecar)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Video stabilization: analyse once, render many times")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    analyze = sub.add_parser("analyze", help="save the motion of a clip or of all clips in a directory")
+    analyze.add_argument("input", help="video file or directory")
+    analyze.add_argument("--workers", type=int, default=None)
+    analyze.add_argument("--max-corners", type=int, default=1000)
+    analyze.add_argument("--motion-scale", type=float, default=1.0)
+    analyze.add_argument("--roi", type=int, nargs=4, metavar=("X", "Y", "W", "H"), default=None)
+    analyze.add_argument("--overwrite", action="store_true")
+
+    render = sub.add_parser("render", help="smooth a saved trajectory and write the stabilized clip")
+    render.add_argument("input", help="video file")
+    render.add_argument("output", help="output video file")
+    render.add_argument("--trajectory", default=None, help="sidecar file (default: <input>.motion.npz)")
+    render.add_argument("--method", choices=["average", "gaussian", "kalman"], default="average")
+    render.add_argument("--radius", type=int, default=30)
+    render.add_argument("--sigma", type=float, default=None)
+    render.add_argument("--process-noise", type=float, default=4e-3)
+    render.add_argument("--measurement-noise", type=float, default=0.25)
+
+    args = parser.parse_args()
+    if args.command == "analyze":
+        kwargs = dict(max_corners=args.max_corners, motion_scale=args.motion_scale,
+                      roi=tuple(args.roi) if args.roi else None)
+        if os.path.isdir(args.input):
+            analyze_directory(args.input, workers=args.workers, overwrite=args.overwrite, **kwargs)
+        else:
+            print(analyze_video(args.input, **kwargs))
+    else:
+        render_video(args.input, args.output, args.trajectory, args.method, args.radius,
+                     sigma=args.sigma, process_noise=args.process_noise,
+                     measurement_noise=args.measurement_noise)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import queue
+import threading
+import time
+import cv2
+from stabilize import MotionEstimator, TrajectorySmoother, transform_matrix
+
+# End-of-stream marker passed through the queues
+_END = object()
+
+
+class Stage:
+    """
+    One pipeline stage: worker threads that take items from an input queue,
+    process them and put the results into an output queue.
+
+    fn(item) returns a list of output items (possibly empty). flush() is called
+    once after the last item and may return more. With several workers, items
+    can leave the stage out of order.
+    """
+
+    def __init__(self, name, fn, inbox, outbox, workers=1, flush=None):
+        self.name = name
+        self.fn = fn
+        self.flush = flush
+        self.inbox = inbox
+        self.outbox = outbox
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.error = None
+        self.stopped = None
+        self._lock = threading.Lock()
+        self._running = workers
+        self._threads = []
+
+    def _put(self, target, item):
+        # Bounded queues block when full; poll so a failure elsewhere can't deadlock us
+        while not self.stopped.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def put(self, item):
+        self._put(self.outbox, item)
+
+    def get(self):
+        while not self.stopped.is_set():
+            try:
+                return self.inbox.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def run(self):
+        try:
+            # After a failure anywhere, stop (the source would keep decoding otherwise)
+            while not self.stopped.is_set():
+                item = self.get() if self.inbox is not None else None
+                if item is _END:
+                    # Let the sibling workers see the end marker as well
+                    if self.inbox is not None:
+                        self._put(self.inbox, _END)
+                    break
+                start = time.perf_counter()
+                results = self.fn(item)
+                if results is _END:
+                    break
+                with self._lock:
+                    self.busy += time.perf_counter() - start
+                    self.items += 1
+                for result in results:
+                    self.put(result)
+        except Exception as e:
+            self.error = e
+            self.stopped.set()
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last and not self.stopped.is_set():
+                if self.flush is not None:
+                    for result in self.flush():
+                        self.put(result)
+                if self.outbox is not None:
+                    self.put(_END)
+
+    def start(self, stopped):
+        self.stopped = stopped
+        for k in range(self.workers):
+            thread = threading.Thread(target=self.run, name=f"{self.name}-{k}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+
+def stabilize_video_pipelined(input_video, output_video, max_corners=1000, smooth_radius=30,
+                              motion_scale=1.0, roi=None, warp_workers=None, queue_size=32,
+                              report_interval=2.0):
+    """
+    Stabilize video with decode, motion estimation, warping and encoding running
+    concurrently on their own threads, connected by bounded queues.
+
+    OpenCV releases the GIL inside read/flow/warp/write, so the stages overlap.
+    Motion estimation and smoothing are inherently sequential and run on one
+    thread; warping is spread over warp_workers threads and the encoder puts
+    the frames back into order. The result is identical to
+    stabilize_video_streaming.
+
+    Args:
+        input_video (str or int): Path/URL of the input video or camera index
+        output_video (str): Path to save stabilized video
+        max_corners (int): Maximum number of ORB features to track
+        smooth_radius (int): Length of the smoothing window in frames (larger = smoother)
+        motion_scale (float): Resolution for motion estimation relative to the frame
+        roi (tuple): (x, y, w, h) region used for motion estimation, None = whole frame
+        warp_workers (int): Threads for warpAffine (default: cores - 3, at least 1)
+        queue_size (int): Capacity of each queue between two stages
+        report_interval (float): Seconds between progress reports (0 = only at the end)
+
+    Returns:
+        dict: Per-stage statistics (frames, busy fps, mean/max input queue occupancy)
+    """
+    cap = cv2.VideoCapture(input_video)
+    if not cap.isOpened():
+        print("Error opening video file")
+        return None
+
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    out = cv2.VideoWriter(output_video, fourcc, fps, (width, height))
+
+    warp_workers = warp_workers or max(1, (os.cpu_count() or 4) - 3)
+    estimator = MotionEstimator(max_corners, motion_scale, roi)
+    smoother = TrajectorySmoother(smooth_radius)
+
+    # Stage functions, items are (frame index, frame[, transform])
+    index = 0
+    def decode(_):
+        nonlocal index
+        success, frame = cap.read()
+        if not success:
+            return _END
+        index += 1
+        return [(index - 1, frame)]
+
+    def estimate(item):
+        step = estimator.update(item[1])
+        return [(i, frame, transform_matrix(*correction))
+                for (i, frame), correction in smoother.push(item, step)]
+
+    def flush_estimate():
+        return [(i, frame, transform_matrix(*correction))
+                for (i, frame), correction in smoother.flush()]
+
+    def warp(item):
+        i, frame, transform = item
+        return [(i, cv2.warpAffine(frame, transform, (width, height),
+                                   borderMode=cv2.BORDER_REPLICATE))]
+
+    pending = {}
+    written = 0
+    def encode(item):
+        nonlocal written
+        # Warp workers finish out of order, write strictly by frame index
+        pending[item[0]] = item[1]
+        while written in pending:
+            out.write(pending.pop(written))
+            written += 1
+        return []
+
+    decoded = queue.Queue(queue_size)
+    estimated = queue.Queue(queue_size)
+    warped = queue.Queue(queue_size)
+    stages = [
+        Stage("decode", decode, None, decoded),
+        Stage("estimate", estimate, decoded, estimated, flush=flush_estimate),
+        Stage("warp", warp, estimated, warped, workers=warp_workers),
+        Stage("encode", encode, warped, None),
+    ]
+
+    stopped = threading.Event()
+    start = time.perf_counter()
+    for stage in stages:
+        stage.start(stopped)
+
+    # Sample queue occupancy while the pipeline runs
+    samples = {stage.name: [] for stage in stages if stage.inbox is not None}
+    last_report = start
+    while any(t.is_alive() for t in stages[-1]._threads):
+        time.sleep(0.01)
+        for stage in stages:
+            if stage.inbox is not None:
+                samples[stage.name].append(stage.inbox.qsize())
+        now = time.perf_counter()
+        if report_interval and now - last_report >= report_interval:
+            last_report = now
+            print(f"{written} frames, {written / (now - start):.1f} fps, queues: " +
+                  ", ".join(f"{name} {q[-1]}/{queue_size}" for name, q in samples.items()))
+
+    for stage in stages:
+        stage.join()
+    cap.release()
+    out.release()
+
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+
+    elapsed = time.perf_counter() - start
+    stats = {}
+    for stage in stages:
+        q = samples.get(stage.name, [0])
+        stats[stage.name] = {
+            "frames": stage.items,
+            "fps": stage.items * stage.workers / stage.busy if stage.busy else 0.0,
+            "queue_mean": sum(q) / max(1, len(q)),
+            "queue_max": max(q, default=0),
+        }
+        print(f"{stage.name:>8}: {stage.items} frames, {stats[stage.name]['fps']:.1f} fps, "
+              f"queue mean {stats[stage.name]['queue_mean']:.1f} max {stats[stage.name]['queue_max']}")
+    print(f"Stabilized video saved to {output_video} ({written} frames, {written / elapsed:.1f} fps)")
+    return stats
+
+
+if __name__ == "__main__":
+    # Example usage
+    stabilize_video_pipelined("short2.mp4", "stabilized_video.mp4", max_corners=1000, smooth_radius=30)
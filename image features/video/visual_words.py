@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+
+
+def descriptors_as_float(desc):
+    """
+    Descriptors as float32 rows for k-means and L2 quantization.
+
+    Binary descriptors (ORB/AKAZE, uint8) are unpacked into single bits, so the
+    L2 distance between the rows equals the square root of the Hamming distance.
+    """
+    if desc.dtype == np.uint8:
+        return np.unpackbits(desc, axis=1).astype(np.float32)
+    return np.asarray(desc, dtype=np.float32)
+
+
+class VisualWordIndex:
+    """
+    Bag-of-visual-words index over many frames.
+
+    A vocabulary is trained with k-means on a sample of descriptors. Every frame
+    is then reduced to a tf-idf weighted, L2-normalized word histogram, so the
+    similarity of two frames is a single dot product. That gives a cheap shortlist
+    of candidate neighbours; only those are verified with full descriptor matching.
+    """
+
+    def __init__(self, n_words=500, sample_frames=200, sample_per_frame=300, seed=0):
+        """
+        Args:
+            n_words (int): Size of the vocabulary (k-means clusters)
+            sample_frames (int): Number of frames used for training the vocabulary
+            sample_per_frame (int): Descriptors sampled per training frame
+            seed (int): Seed for sampling and k-means
+        """
+        self.n_words = n_words
+        self.sample_frames = sample_frames
+        self.sample_per_frame = sample_per_frame
+        self.seed = seed
+        self.words = None
+        self.idf = None
+        self.histograms = None
+        self._matcher = None
+
+    def train(self, descriptor_list):
+        """
+        Train the vocabulary on a list of per-frame descriptor arrays.
+        """
+        rng = np.random.default_rng(self.seed)
+        descriptor_list = [d for d in descriptor_list if d is not None and len(d)]
+        if len(descriptor_list) > self.sample_frames:
+            picks = rng.choice(len(descriptor_list), self.sample_frames, replace=False)
+            descriptor_list = [descriptor_list[i] for i in picks]
+
+        samples = []
+        for desc in descriptor_list:
+            if len(desc) > self.sample_per_frame:
+                desc = desc[rng.choice(len(desc), self.sample_per_frame, replace=False)]
+            samples.append(descriptors_as_float(desc))
+        data = np.vstack(samples)
+
+        k = min(self.n_words, len(data))
+        cv2.setRNGSeed(self.seed)
+        criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+        _, _, centers = cv2.kmeans(data, k, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+        self.words = centers.astype(np.float32)
+        self.n_words = k
+
+        # FLANN KD-tree over the word centers for fast quantization
+        FLANN_INDEX_KDTREE = 1
+        self._matcher = cv2.FlannBasedMatcher(dict(algorithm=FLANN_INDEX_KDTREE, trees=4), dict(checks=32))
+        self._matcher.add([self.words])
+        self._matcher.train()
+
+    def quantize(self, desc):
+        """
+        Visual word id for every descriptor row.
+        """
+        if desc is None or len(desc) == 0:
+            return np.empty(0, np.int32)
+        matches = self._matcher.match(descriptors_as_float(desc))
+        return np.fromiter((m.trainIdx for m in matches), np.int32, len(matches))
+
+    def build(self, descriptor_iter):
+        """
+        Quantize all frames into word histograms.
+
+        Args:
+            descriptor_iter: Iterable of per-frame descriptor arrays (may be a
+                generator, so not all descriptors have to be in memory at once)
+        """
+        counts = []
+        for desc in descriptor_iter:
+            counts.append(np.bincount(self.quantize(desc), minlength=self.n_words).astype(np.float32))
+        counts = np.vstack(counts)
+
+        # tf-idf: words that show up in every frame carry no information
+        df = np.count_nonzero(counts, axis=0)
+        self.idf = np.log(len(counts) / (df + 1.0)).astype(np.float32)
+        hist = counts * self.idf
+        norm = np.linalg.norm(hist, axis=1, keepdims=True)
+        self.histograms = hist / np.maximum(norm, 1e-12)
+        return self
+
+    def similarity(self, i, j):
+        return float(self.histograms[i] @ self.histograms[j])
+
+    def shortlist(self, top_k=10, block=1024):
+        """
+        The top_k most similar other frames for every frame.
+
+        Similarities are computed in blocks of rows, so memory stays at
+        block x n_frames instead of n_frames x n_frames.
+
+        Returns:
+            tuple: (candidates, scores), both of shape (n_frames, top_k), best first
+        """
+        h = self.histograms
+        n = len(h)
+        top_k = min(top_k, n - 1)
+        candidates = np.empty((n, top_k), np.int64)
+        scores = np.empty((n, top_k), np.float32)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            sims = h[start:stop] @ h.T
+            sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+            idx = np.argpartition(-sims, top_k - 1, axis=1)[:, :top_k]
+            part = np.take_along_axis(sims, idx, axis=1)
+            order = np.argsort(-part, axis=1)
+            candidates[start:stop] = np.take_along_axis(idx, order, axis=1)
+            scores[start:stop] = np.take_along_axis(part, order, axis=1)
+        return candidates, scores
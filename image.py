@@ -1,11 +1,11 @@
-import numpy as np
 import cv2
+from pointops import PointOps
 
 dst = cv2.imread('macintosh.png', cv2.IMREAD_COLOR_RGB)
 
 gray = cv2.cvtColor(dst, cv2.COLOR_RGB2GRAY)
-gray = np.clip((gray+64.0), 0, 255)
-gray = gray.astype(np.uint8)
+# aufhellen um 64 (mit Begrenzung auf 255) als Lookup-Tabelle
+PointOps().offset(64).apply(gray, inplace=True)
 
 cv2.imshow('image', gray)
 
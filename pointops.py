@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+class PointOps:
+    """
+    Chain of point operations (gain, offset, gamma, clip, ...) compiled into a
+    lookup table.
+
+    A point operation maps every 8-bit value to a new value independent of its
+    neighbours, so the whole chain can be evaluated once for the 256 possible
+    inputs (per channel if needed) and applied with a single cv2.LUT call. No
+    float copy of the image, no split/merge.
+
+    Example (contrast as in length.ipynb, in place):
+        contrast = PointOps().offset(-64).gain(5).offset(64)
+        contrast.apply(gray, inplace=True)
+    """
+
+    def __init__(self, channels=1):
+        """
+        Args:
+            channels (int): 1 for the same table on every channel, or the number of
+                channels (e.g. 3) if single channels get their own operations
+        """
+        self.channels = channels
+        self.ops = []
+        self._lut = None
+
+    def _add(self, fn, channel):
+        if channel is not None and not 0 <= channel < self.channels:
+            raise ValueError(f"Channel {channel} out of range for {self.channels} channels")
+        self.ops.append((fn, channel))
+        self._lut = None
+        return self
+
+    def gain(self, factor, channel=None):
+        """Multiply values by factor."""
+        return self._add(lambda v: v * factor, channel)
+
+    def offset(self, value, channel=None):
+        """Add value (brightness)."""
+        return self._add(lambda v: v + value, channel)
+
+    def contrast(self, factor, pivot=128.0, channel=None):
+        """Scale the distance to pivot by factor."""
+        return self._add(lambda v: (v - pivot) * factor + pivot, channel)
+
+    def gamma(self, gamma, channel=None):
+        """Gamma correction on the 0..255 range: 255 * (v/255)^(1/gamma)."""
+        return self._add(lambda v: 255.0 * np.power(np.clip(v, 0, 255) / 255.0, 1.0 / gamma), channel)
+
+    def clip(self, low=0, high=255, channel=None):
+        """Clip intermediate values (the result is always clipped to 0..255)."""
+        return self._add(lambda v: np.clip(v, low, high), channel)
+
+    def invert(self, channel=None):
+        return self._add(lambda v: 255.0 - v, channel)
+
+    def lut(self):
+        """
+        The compiled table: (256,) uint8 for channels=1, else (256, 1, channels)
+        as expected by cv2.LUT for multi-channel images.
+
+        Values are clipped to 0..255 and truncated, like np.clip(...).astype(np.uint8)
+        on the float image.
+        """
+        if self._lut is None:
+            table = np.tile(np.arange(256, dtype=np.float64)[:, None], (1, self.channels))
+            for fn, channel in self.ops:
+                if channel is None:
+                    table = fn(table)
+                else:
+                    table[:, channel] = fn(table[:, channel])
+            table = np.clip(table, 0, 255).astype(np.uint8)
+            self._lut = table[:, 0].copy() if self.channels == 1 else table.reshape(256, 1, self.channels)
+        return self._lut
+
+    def apply(self, img, inplace=False):
+        """
+        Apply the chain to a uint8 image.
+
+        Args:
+            img (np.ndarray): uint8 image with 1 or `channels` channels
+            inplace (bool): Write the result into img
+
+        Returns:
+            np.ndarray: Result (img itself if inplace)
+        """
+        return cv2.LUT(img, self.lut(), dst=img if inplace else None)
+
+    def apply_batch(self, frames, inplace=True, workers=None):
+        """
+        Apply the chain to many frames on a thread pool (cv2.LUT releases the GIL).
+
+        Returns:
+            list: Results in input order
+        """
+        lut = self.lut()
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            return list(pool.map(lambda img: cv2.LUT(img, lut, dst=img if inplace else None), frames))
@@ -0,0 +1,242 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Raw data layout of the Raspberry Pi camera V2 (IMX219), as in bayer.ipynb.
+# The pattern names the top-left 2x2 block row by row: the first row alternates
+# green/blue, the second red/green.
+PI_CAMERA_V2 = dict(
+    offset=10270208,        # raw block size at the end of the JPEG
+    header=32768,           # 32kB "BRCM" header in front of the pixel data
+    shape=(2480, 4128),     # rows x bytes per row as stored (padded)
+    crop=(2464, 4100),      # valid rows x bytes (4100 bytes = 3280 pixels)
+    pattern="GBRG",
+)
+
+CHANNELS = {"R": 0, "G": 1, "B": 2}
+
+
+def extract_raw(source, offset, header, shape, crop, **_):
+    """
+    Packed RAW10 bytes of a JPEG+RAW capture as a (rows, bytes) uint8 view.
+
+    Args:
+        source (str or bytes): File name or file content
+        offset (int): Size of the raw block at the end of the file
+        header (int): Header bytes to skip at the start of the raw block
+        shape (tuple): (rows, bytes per row) as stored
+        crop (tuple): (rows, bytes per row) of valid data
+
+    Returns:
+        np.ndarray: (crop rows, crop bytes) uint8, no copy of the pixel data
+    """
+    if isinstance(source, (str, os.PathLike)):
+        data = np.memmap(source, dtype=np.uint8, mode="r")
+    else:
+        data = np.frombuffer(source, dtype=np.uint8)
+    data = data[len(data) - offset + header:]
+    data = data[:shape[0] * shape[1]].reshape(shape)
+    return data[:crop[0], :crop[1]]
+
+
+def unpack_raw10(packed, out=None):
+    """
+    Unpack RAW10 rows into 16-bit values.
+
+    Every 5 bytes hold four pixels: four high bytes and one byte with the
+    2 low bits of each (AABBCCDD). This is one vectorized gather over
+    (rows, groups, 5) instead of a loop over the four byte lanes.
+
+    Args:
+        packed (np.ndarray): (rows, 5*n) uint8
+        out (np.ndarray): Optional (rows, 4*n) uint16 output
+
+    Returns:
+        np.ndarray: (rows, 4*n) uint16 with values 0..1023
+    """
+    rows, nbytes = packed.shape
+    groups = np.asarray(packed).reshape(rows, nbytes // 5, 5)
+    if out is None:
+        out = np.empty((rows, (nbytes // 5) * 4), np.uint16)
+    view = out.reshape(rows, nbytes // 5, 4)
+    np.left_shift(groups[:, :, :4], 2, out=view, dtype=np.uint16)
+    low = groups[:, :, 4:5] >> np.array([6, 4, 2, 0], np.uint8)
+    view |= low & 0b11
+    return out
+
+
+def bayer_masks(pattern, rows, cols, row0=0):
+    """
+    0/1 masks per color for a band of the sensor starting at row row0.
+
+    Returns:
+        np.ndarray: (3, rows, cols) uint8
+    """
+    masks = np.zeros((3, rows, cols), np.uint8)
+    first = row0 % 2
+    for k, color in enumerate(pattern.upper()):
+        dy, dx = divmod(k, 2)
+        masks[CHANNELS[color], (dy - first) % 2::2, dx::2] = 1
+    return masks
+
+
+def _box3(a):
+    # 3x3 sum of a zero padded array, separable: rows first, then columns
+    s = a[:, :-2] + a[:, 1:-1] + a[:, 2:]
+    return s[:-2] + s[1:-1] + s[2:]
+
+
+def demosaic_band(raw, row0, row1, pattern, row_offset=0):
+    """
+    Demosaic rows [row0, row1) of a Bayer image.
+
+    Only rows row0-1 .. row1 (the one-row halo) of raw are read. The result is
+    the same weighted 3x3 average as the as_strided/einsum version in
+    bayer.ipynb: sum of the known samples of a color divided by their count.
+
+    Args:
+        raw (np.ndarray): (height, width) Bayer data, or a band of it
+        row0, row1 (int): Rows to compute, relative to raw
+        pattern (str): Top-left 2x2 block of the sensor
+        row_offset (int): Sensor row of raw[0] (for the pattern parity when raw is a band)
+
+    Returns:
+        np.ndarray: (row1 - row0, width, 3) uint32
+    """
+    height, width = raw.shape
+    top, bottom = max(0, row0 - 1), min(height, row1 + 1)
+
+    # Zero padded band with halo, like np.pad(..., 'constant') on the full image
+    band = np.zeros((row1 - row0 + 2, width + 2), np.uint32)
+    band[top - row0 + 1:bottom - row0 + 1, 1:-1] = raw[top:bottom]
+    masks = np.zeros((3,) + band.shape, np.uint32)
+    masks[:, top - row0 + 1:bottom - row0 + 1, 1:-1] = bayer_masks(pattern, bottom - top, width,
+                                                                   top + row_offset)
+
+    result = np.empty((row1 - row0, width, 3), np.uint32)
+    for plane in range(3):
+        psum = _box3(band * masks[plane])
+        bsum = _box3(masks[plane])
+        np.floor_divide(psum, bsum, out=result[:, :, plane])
+    return result
+
+
+def demosaic(raw, pattern=PI_CAMERA_V2["pattern"], band_rows=256, workers=None, out=None):
+    """
+    Naive 3x3 demosaic of a whole Bayer image, processed in row bands.
+
+    Temporary memory is a few band-sized arrays per worker instead of
+    full-frame rgb/bayer/padded copies.
+
+    Args:
+        raw (np.ndarray): (height, width) Bayer data
+        pattern (str): Top-left 2x2 block, e.g. "GBRG", "BGGR", "RGGB", "GRBG"
+        band_rows (int): Rows per band (should be even)
+        workers (int): Threads for the bands (None/1 = sequential)
+        out (np.ndarray): Optional (height, width, 3) output, same dtype as raw
+
+    Returns:
+        np.ndarray: (height, width, 3) RGB image
+    """
+    height, width = raw.shape
+    if out is None:
+        out = np.empty((height, width, 3), raw.dtype)
+    bands = [(r, min(r + band_rows, height)) for r in range(0, height, band_rows)]
+
+    def process(band):
+        row0, row1 = band
+        out[row0:row1] = demosaic_band(raw, row0, row1, pattern)
+
+    if workers and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(process, bands))
+    else:
+        for band in bands:
+            process(band)
+    return out
+
+
+def develop(source, layout=PI_CAMERA_V2, band_rows=256, workers=None, bits=8):
+    """
+    JPEG+RAW capture to RGB: extract, unpack and demosaic band by band.
+
+    Each band unpacks only its own rows plus the halo from the packed data, so
+    no full-size unpacked copy exists besides the result.
+
+    Args:
+        source (str or bytes): File name or file content
+        layout (dict): Raw layout, see PI_CAMERA_V2
+        band_rows (int): Rows per band (should be even)
+        workers (int): Threads for the bands (None/1 = sequential)
+        bits (int): 8 for uint8 output (values >> 2), 10 for uint16 output
+
+    Returns:
+        np.ndarray: (height, width, 3) RGB image
+    """
+    packed = extract_raw(source, **layout)
+    height, width = packed.shape[0], packed.shape[1] // 5 * 4
+    out = np.empty((height, width, 3), np.uint8 if bits == 8 else np.uint16)
+    pattern = layout["pattern"]
+
+    def process(band):
+        row0, row1 = band
+        top, bottom = max(0, row0 - 1), min(height, row1 + 1)
+        raw = unpack_raw10(packed[top:bottom])
+        rgb = demosaic_band(raw, row0 - top, row1 - top, pattern, row_offset=top)
+        out[row0:row1] = rgb >> 2 if bits == 8 else rgb
+
+    bands = [(r, min(r + band_rows, height)) for r in range(0, height, band_rows)]
+    if workers and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(process, bands))
+    else:
+        for band in bands:
+            process(band)
+    return out
+
+
+def develop_notebook(source, layout=PI_CAMERA_V2):
+    """
+    Reference implementation from bayer.ipynb (full-frame temporaries), uint16 output.
+    """
+    from numpy.lib.stride_tricks import as_strided
+    stream = io.BytesIO(np.fromfile(source, dtype='uint8')) if isinstance(source, str) else io.BytesIO(source)
+    data = stream.getvalue()[-layout["offset"]:]
+    data = data[layout["header"]:]
+    data = np.frombuffer(data, dtype=np.uint8)
+    data = data[:layout["shape"][0] * layout["shape"][1]].reshape(layout["shape"])
+    data = data[:layout["crop"][0], :layout["crop"][1]]
+    data = data.astype(np.uint16) << 2
+    for byte in range(4):
+        data[:, byte::5] |= ((data[:, 4::5] >> ((4 - byte) * 2)) & 0b11)
+    data = np.delete(data, np.s_[4::5], 1)
+
+    bayer = np.moveaxis(bayer_masks(layout["pattern"], *data.shape), 0, -1)
+    rgb = (bayer * data[:, :, None]).astype(np.uint16)
+    output = np.empty(rgb.shape, dtype=rgb.dtype)
+    window = (3, 3)
+    borders = (window[0] - 1, window[1] - 1)
+    rgb = np.pad(rgb, [(1, 1), (1, 1), (0, 0)], 'constant')
+    bayer = np.pad(bayer, [(1, 1), (1, 1), (0, 0)], 'constant')
+    for plane in range(3):
+        p = rgb[..., plane]
+        b = bayer[..., plane]
+        pview = as_strided(p, shape=(p.shape[0] - borders[0], p.shape[1] - borders[1]) + window,
+                           strides=p.strides * 2)
+        bview = as_strided(b, shape=(b.shape[0] - borders[0], b.shape[1] - borders[1]) + window,
+                           strides=b.strides * 2)
+        psum = np.einsum('ijkl->ij', pview)
+        bsum = np.einsum('ijkl->ij', bview)
+        output[..., plane] = psum // bsum
+    return output
+
+
+if __name__ == "__main__":
+    import time
+    import matplotlib.pyplot as plt
+    start = time.perf_counter()
+    output = develop("image.jpg", workers=os.cpu_count())
+    print(f"{output.shape} in {time.perf_counter() - start:.2f}s")
+    plt.imshow(output)
+    plt.show()
@@ -0,0 +1,188 @@
+import os
+import struct
+import sys
+import time
+import numpy as np
+from yuv420 import frame_geometry
+
+# File layout:
+#   header (64 bytes, little endian, see HEADER)
+#   frame data, every frame starts at its index offset
+#   frame index at index_offset: frame_count x (offset uint64, timestamp float64)
+#
+# The header is rewritten when the writer is closed, so a capture rig can append
+# frames without knowing the frame count up front.
+MAGIC = b"MMTRAW\x00\x01"
+HEADER = struct.Struct("<8sIII8sIQQ")   # magic, width, height, stride, format, frame size, count, index offset
+HEADER_SIZE = 64
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("timestamp", "<f8")])
+
+
+def format_layout(pixel_format, width, height, stride=None):
+    """
+    Stride, frame size and array shape of one frame for a pixel format.
+
+    Supported formats: GRAY8, RGB24, BGR24, I420 (padded Pi camera planes, see
+    yuv420.py) and RAW10 (packed Bayer rows, see raw10.py).
+
+    Returns:
+        tuple: (stride in bytes, frame size in bytes, shape of the frame view)
+    """
+    if pixel_format == "GRAY8":
+        stride = stride or width
+        return stride, stride * height, (height, width)
+    elif pixel_format in ("RGB24", "BGR24"):
+        stride = stride or 3 * width
+        return stride, stride * height, (height, width, 3)
+    elif pixel_format == "I420":
+        fwidth, _, frame_size = frame_geometry(width, height)
+        return fwidth, frame_size, (frame_size,)
+    elif pixel_format == "RAW10":
+        stride = stride or (width * 5 + 3) // 4
+        return stride, stride * height, (height, stride)
+    raise ValueError(f"Unknown pixel format: {pixel_format}")
+
+
+class RawWriter:
+    """
+    Append frames to a raw container file.
+
+    Usage:
+        with RawWriter("capture.mmtraw", 640, 480, "RGB24") as writer:
+            writer.write(frame)
+    """
+
+    def __init__(self, path, width, height, pixel_format, stride=None):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.stride, self.frame_size, self.shape = format_layout(pixel_format, width, height, stride)
+        self.index = []
+        self._file = open(path, "wb")
+        self._write_header(0, 0)
+        self._file.seek(HEADER_SIZE)
+
+    def _write_header(self, frame_count, index_offset):
+        header = HEADER.pack(MAGIC, self.width, self.height, self.stride,
+                             self.pixel_format.encode().ljust(8, b"\0"), self.frame_size,
+                             frame_count, index_offset)
+        self._file.seek(0)
+        self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def write(self, frame, timestamp=None):
+        """
+        Append one frame.
+
+        Args:
+            frame (np.ndarray or bytes): Frame data, frame_size bytes (rows padded to the stride)
+            timestamp (float): Capture time in seconds (default: now)
+        """
+        data = memoryview(np.ascontiguousarray(frame)).cast("B") if isinstance(frame, np.ndarray) else frame
+        if len(data) != self.frame_size:
+            raise ValueError(f"Frame has {len(data)} bytes, expected {self.frame_size}")
+        offset = self._file.tell()
+        self._file.write(data)
+        self.index.append((offset, time.time() if timestamp is None else timestamp))
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._file.tell()
+        self._file.write(np.array(self.index, INDEX_DTYPE).tobytes())
+        self._write_header(len(self.index), index_offset)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RawReader:
+    """
+    Random access to the frames of a raw container.
+
+    reader[i] returns a read-only np.memmap view of frame i without copying or
+    reading any other frame: (height, width) for GRAY8, (height, width, 3) for
+    RGB24/BGR24, (height, stride) packed rows for RAW10 and the flat padded
+    buffer for I420 (decode with yuv420.YUV420Decoder).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = HEADER.unpack(f.read(HEADER.size))
+        magic, self.width, self.height, self.stride, pixel_format, self.frame_size, \
+            self.frame_count, index_offset = header
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a raw container file")
+        self.pixel_format = pixel_format.rstrip(b"\0").decode()
+        _, _, self.shape = format_layout(self.pixel_format, self.width, self.height, self.stride)
+
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        self.index = np.frombuffer(self._data[index_offset:index_offset + self.frame_count * INDEX_DTYPE.itemsize],
+                                   INDEX_DTYPE)
+
+    @property
+    def timestamps(self):
+        return self.index["timestamp"]
+
+    def __len__(self):
+        return self.frame_count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.frame_count
+        if not 0 <= i < self.frame_count:
+            raise IndexError(f"Frame {i} out of range ({self.frame_count} frames)")
+        offset = int(self.index["offset"][i])
+        frame = self._data[offset:offset + self.frame_size]
+        if self.pixel_format in ("RGB24", "BGR24"):
+            rows = frame.reshape(self.height, self.stride)
+            return rows[:, :3 * self.width].reshape(self.height, self.width, 3)
+        elif self.pixel_format == "GRAY8":
+            return frame.reshape(self.height, self.stride)[:, :self.width]
+        return frame.reshape(self.shape)
+
+    def __iter__(self):
+        for i in range(self.frame_count):
+            yield self[i]
+
+
+def wrap_headerless(src, dst, width, height, pixel_format, fps=None):
+    """
+    Convert a headerless dump (e.g. rgb.data, yuv.data) into a raw container.
+
+    The dump may hold several frames back to back. Without fps all timestamps
+    are the file's modification time, otherwise frames are spaced by 1/fps.
+
+    Returns:
+        int: Number of frames written
+    """
+    _, frame_size, _ = format_layout(pixel_format, width, height)
+    data = np.memmap(src, dtype=np.uint8, mode="r")
+    count = len(data) // frame_size
+    if count == 0:
+        raise ValueError(f"{src} is smaller than one {width}x{height} {pixel_format} frame")
+    start = os.path.getmtime(src)
+    with RawWriter(dst, width, height, pixel_format) as writer:
+        for i in range(count):
+            writer.write(data[i * frame_size:(i + 1) * frame_size],
+                         timestamp=start + (i / fps if fps else 0.0))
+    return count
+
+
+if __name__ == "__main__":
+    # Example usage: wrap the headerless sample files and read them back
+    #   python rawframes.py rgb.data rgb.mmtraw 640 480 RGB24
+    if len(sys.argv) == 6:
+        src, dst, width, height, pixel_format = sys.argv[1:]
+        print(f"{wrap_headerless(src, dst, int(width), int(height), pixel_format)} frames written to {dst}")
+    else:
+        wrap_headerless("rgb.data", "rgb.mmtraw", 640, 480, "RGB24")
+        wrap_headerless("yuv.data", "yuv.mmtraw", 640, 480, "I420")
+        for path in ("rgb.mmtraw", "yuv.mmtraw"):
+            reader = RawReader(path)
+            print(path, reader.pixel_format, f"{reader.width}x{reader.height}", len(reader), reader[0].shape)
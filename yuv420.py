@@ -0,0 +1,187 @@
+import time
+import numpy as np
+
+# Fixed-point precision of the lookup tables (value * 2^SHIFT)
+SHIFT = 8
+
+# YUV conversion matrix from ITU-R BT.601 version (SDTV), as in YUV.ipynb
+#              Y       U       V
+BT601 = np.array([[1.164,  0.000,  1.596],    # R
+                  [1.164, -0.392, -0.813],    # G
+                  [1.164,  2.017,  0.000]])   # B
+
+
+def frame_geometry(width, height):
+    """
+    Padded plane sizes of a YUV420 frame as written by the Pi camera.
+
+    The stream stores the Y plane with the width rounded up to a multiple of 32
+    and the height to a multiple of 16; U and V follow at half that size.
+
+    Returns:
+        tuple: (fwidth, fheight, bytes per frame)
+    """
+    fwidth = (width + 31) // 32 * 32
+    fheight = (height + 15) // 16 * 16
+    return fwidth, fheight, fwidth * fheight + 2 * (fwidth // 2) * (fheight // 2)
+
+
+def split_planes(frame, width, height):
+    """
+    Y, U and V views (no copies) of one frame given as a flat uint8 buffer.
+    """
+    fwidth, fheight, _ = frame_geometry(width, height)
+    y_size = fwidth * fheight
+    c_size = (fwidth // 2) * (fheight // 2)
+    Y = frame[:y_size].reshape((fheight, fwidth))
+    U = frame[y_size:y_size + c_size].reshape((fheight // 2, fwidth // 2))
+    V = frame[y_size + c_size:y_size + 2 * c_size].reshape((fheight // 2, fwidth // 2))
+    return Y, U, V
+
+
+def decode_reference(frame, width, height, matrix=BT601):
+    """
+    Float64 conversion exactly as in YUV.ipynb, kept to check the fast decoder.
+    """
+    Y, U, V = split_planes(frame, width, height)
+    U = U.repeat(2, axis=0).repeat(2, axis=1)
+    V = V.repeat(2, axis=0).repeat(2, axis=1)
+    YUV = np.dstack((Y, U, V))[:height, :width, :].astype(float)
+    YUV[:, :, 0] = YUV[:, :, 0] - 16
+    YUV[:, :, 1:] = YUV[:, :, 1:] - 128
+    return YUV.dot(matrix.T).clip(0, 255).astype(np.uint8)
+
+
+class YUV420Decoder:
+    """
+    YUV420 (I420) to RGB decoder with integer fixed-point lookup tables.
+
+    Each matrix term is a 256-entry int32 table, so the conversion is only table
+    lookups, additions and a shift. The chroma terms are computed once per 2x2
+    block at quarter resolution and broadcast onto the luma, instead of upsampling
+    U and V with repeat(). All work buffers are allocated once per decoder, and
+    the result goes straight into a (preallocated) uint8 image.
+    """
+
+    def __init__(self, width, height, matrix=BT601, bgr=False):
+        """
+        Args:
+            width (int): Image width
+            height (int): Image height
+            matrix (np.ndarray): 3x3 YUV->RGB matrix (rows R, G, B)
+            bgr (bool): Write channels in BGR order (OpenCV) instead of RGB
+        """
+        self.width = width
+        self.height = height
+        self.fwidth, self.fheight, self.frame_size = frame_geometry(width, height)
+        self.channels = (2, 1, 0) if bgr else (0, 1, 2)
+
+        # Lookup tables; the final right shift floors like astype(np.uint8) truncates
+        scale = 1 << SHIFT
+        v = np.arange(256, dtype=np.float64)
+        self.lut_y = np.round(matrix[0, 0] * (v - 16) * scale).astype(np.int32)
+        self.lut_c = [[np.round(matrix[row, col] * (v - 128) * scale).astype(np.int32)
+                       for col in (1, 2)] for row in range(3)]
+
+        # Work on an even-sized region, crop at the end
+        self.ch = (height + 1) // 2
+        self.cw = (width + 1) // 2
+        self._luma = np.empty((self.ch, 2, self.cw, 2), np.int32)
+        self._chroma = np.empty((self.ch, 1, self.cw, 1), np.int32)
+        self._tmp = np.empty((self.ch, 1, self.cw, 1), np.int32)
+        self._sum = np.empty((self.ch, 2, self.cw, 2), np.int32)
+
+    def decode_planes(self, Y, U, V, out=None):
+        """
+        Convert Y, U, V planes (padded, as returned by split_planes) into RGB.
+
+        Args:
+            out (np.ndarray): Optional (height, width, 3) uint8 output array
+
+        Returns:
+            np.ndarray: (height, width, 3) uint8 image
+        """
+        if out is None:
+            out = np.empty((self.height, self.width, 3), np.uint8)
+        ch, cw = self.ch, self.cw
+        Y = Y[:2 * ch, :2 * cw].reshape(ch, 2, cw, 2)
+        U = U[:ch, :cw].reshape(ch, 1, cw, 1)
+        V = V[:ch, :cw].reshape(ch, 1, cw, 1)
+
+        np.take(self.lut_y, Y, out=self._luma)
+        for row, channel in enumerate(self.channels):
+            lut_u, lut_v = self.lut_c[row]
+            np.take(lut_u, U, out=self._chroma)
+            np.take(lut_v, V, out=self._tmp)
+            np.add(self._chroma, self._tmp, out=self._chroma)
+            np.add(self._luma, self._chroma, out=self._sum)
+            np.right_shift(self._sum, SHIFT, out=self._sum)
+            np.clip(self._sum, 0, 255, out=self._sum)
+            out[:, :, channel] = self._sum.reshape(2 * ch, 2 * cw)[:self.height, :self.width]
+        return out
+
+    def decode(self, frame, out=None):
+        """
+        Convert one frame given as a flat uint8 buffer (e.g. a memmap row).
+        """
+        return self.decode_planes(*split_planes(frame, self.width, self.height), out=out)
+
+
+def open_stream(path, width, height):
+    """
+    Memory-map a multi-frame .yuv file.
+
+    Returns:
+        np.memmap: (frame count, bytes per frame) uint8; a frame is only read from
+            disk when it is accessed
+    """
+    _, _, frame_size = frame_geometry(width, height)
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    count = len(data) // frame_size
+    return data[:count * frame_size].reshape(count, frame_size)
+
+
+def iter_frames(path, width, height, bgr=False, out=None):
+    """
+    Decode all frames of a .yuv file one after another.
+
+    The same output array is reused for every frame; copy it if you keep it.
+    """
+    decoder = YUV420Decoder(width, height, bgr=bgr)
+    if out is None:
+        out = np.empty((height, width, 3), np.uint8)
+    for frame in open_stream(path, width, height):
+        yield decoder.decode(frame, out=out)
+
+
+def benchmark(path="yuv.data", width=640, height=480, repeat=50):
+    """
+    Compare the fixed-point decoder with the notebook version and cv2.cvtColor.
+    """
+    import cv2
+    frame = np.asarray(open_stream(path, width, height)[0])
+    fwidth, fheight, _ = frame_geometry(width, height)
+    decoder = YUV420Decoder(width, height)
+    out = np.empty((height, width, 3), np.uint8)
+
+    reference = decode_reference(frame, width, height)
+    fast = decoder.decode(frame, out=out)
+    diff = np.abs(fast.astype(np.int16) - reference)
+    print(f"max |fixed point - notebook| = {diff.max()} ({np.count_nonzero(diff)} values differ)")
+
+    # cvtColor wants the padded I420 planes as one (1.5*fheight, fwidth) image
+    i420 = frame.reshape(fheight * 3 // 2, fwidth)
+    candidates = [
+        ("notebook float64", lambda: decode_reference(frame, width, height)),
+        ("fixed point", lambda: decoder.decode(frame, out=out)),
+        ("cv2.cvtColor I420", lambda: cv2.cvtColor(i420, cv2.COLOR_YUV2RGB_I420)[:height, :width]),
+    ]
+    for name, fn in candidates:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        print(f"{name:>18}: {1000 * (time.perf_counter() - start) / repeat:.2f} ms/frame")
+
+
+if __name__ == "__main__":
+    benchmark()